@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Status decode throughput, per object against the NumPy batch decoder
+
+Usage (from tools/rpi):
+    python3 benchmarks/batch.py [--capture example-logs/example.log] [--payloads 100000]
+
+Builds an archive by repeating the complete RealTimeRunData responses
+of the capture, decodes it once into one StatusResponse snapshot per
+payload and once with hoymiles.decoders.batch, and checks both agree.
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy
+from hoymiles.decoders import DECODERS
+from hoymiles.decoders.batch import decode_status_batch
+from hoymiles.simulator import load_capture
+
+STRINGS = [{'s_name': 'String 1', 's_maxpower': 400}, {'s_name': 'String 2', 's_maxpower': 400}]
+
+def load_payloads(filename, size):
+    """Payloads of all complete responses with size bytes"""
+    payloads = []
+    for recorded in load_capture(filename).values():
+        for fragments in recorded:
+            payload = b''.join(fragment[10:-1] for fragment in fragments)[:-2]
+            if len(payload) == size:
+                payloads.append(payload)
+    return payloads
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Status decode throughput benchmark')
+    parser.add_argument('--capture', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'example-logs', 'example.log'))
+    parser.add_argument('--model', default='Hm600')
+    parser.add_argument('--payloads', type=int, default=100000)
+    args = parser.parse_args()
+
+    decoder = DECODERS[(args.model, 0x0b)]
+    recorded = load_payloads(args.capture, decoder.layout.size)
+    if not recorded:
+        sys.exit(f'No {decoder.layout.size} byte {args.model} payloads in {args.capture}')
+    payloads = (recorded * (args.payloads // len(recorded) + 1))[:args.payloads]
+    archive = b''.join(payloads)
+    print(f'{len(payloads)} {args.model} payloads, {len(archive)} bytes, from {len(recorded)} recorded')
+
+    t_start = time.perf_counter()
+    snapshots = [decoder(payload, strings=STRINGS).snapshot() for payload in payloads]
+    t_object = time.perf_counter() - t_start
+
+    t_start = time.perf_counter()
+    columns = decode_status_batch(args.model, archive, strings=STRINGS)
+    t_batch = time.perf_counter() - t_start
+
+    for index in (0, len(snapshots) // 2, len(snapshots) - 1):
+        snapshot = snapshots[index]
+        assert columns['ac_power_0'][index] == snapshot.phases[0].power
+        assert columns['temperature'][index] == snapshot.temperature
+        for string_id, string in enumerate(snapshot.strings):
+            assert columns[f'dc_power_{string_id}'][index] == string.power
+            assert columns[f'dc_irradiation_{string_id}'][index] == string.irradiation
+        assert columns['yield_total'][index] == snapshot.yield_total
+        assert numpy.isclose(columns['efficiency'][index], snapshot.efficiency)
+
+    for label, elapsed in (('per object snapshot', t_object), ('numpy batch', t_batch)):
+        print(f'{label:20s} {elapsed:8.3f} s  {len(payloads) / elapsed:12.0f} payloads/s')
+    print(f'speedup {t_object / t_batch:.0f}x')
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+CRC micro-benchmark, hoymiles.crc against crcmod on recorded frames
+
+Usage (from tools/rpi):
+    python3 benchmarks/crc.py [--capture example-logs/example.log] [--rounds 2000]
+
+Checks every frame of the capture with CRC-8 and every complete response
+payload with the Modbus CRC-16, once over the whole buffer and once
+folded in fragment by fragment like ReassemblyBuffer does.
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import crcmod
+import crcmod._crcfunpy
+from hoymiles import crc
+from hoymiles.simulator import LOG_LINE, load_capture
+
+def load_frames(filename):
+    """All transmitted and received frames of a transaction log"""
+    frames = []
+    with open(filename, 'r') as fh_capture:
+        for line in fh_capture:
+            match = LOG_LINE.search(line.strip())
+            if match:
+                frames.append(bytes.fromhex(match.group(2)))
+    return frames
+
+def bench(label, func, rounds, count):
+    """Run func rounds times, print time per checksum"""
+    t_start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    elapsed = time.perf_counter() - t_start
+    print(f'{label:40s} {elapsed / rounds / count * 1e6:8.3f} us')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='CRC micro-benchmark')
+    parser.add_argument('--capture', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'example-logs', 'example.log'))
+    parser.add_argument('--rounds', type=int, default=2000)
+    args = parser.parse_args()
+
+    frames = [frame[:-1] for frame in load_frames(args.capture)]
+    responses = [[fragment[10:-1] for fragment in response]
+                 for recorded in load_capture(args.capture).values() for response in recorded]
+    payloads = [b''.join(fragments)[:-2] for fragments in responses]
+
+    crcmod_crc8 = crcmod.mkCrcFun(0x101, initCrc=0, xorOut=0)
+    crcmod_modbus = crcmod.predefined.mkPredefinedCrcFun('modbus')
+
+    # crcmod without its C extension, like on many Raspberry Pi images
+    crcmod_crc8_table = list(range(256))
+    crcmod_modbus_table = crc.MODBUS_TABLE
+    crcmod_py_crc8 = lambda data: crcmod._crcfunpy._crc8(data, 0, crcmod_crc8_table)
+    crcmod_py_modbus = lambda data: crcmod._crcfunpy._crc16r(data, 0xffff, crcmod_modbus_table)
+
+    if crc.MODBUS_TABLE16 is None:
+        crc.MODBUS_TABLE16 = crc._modbus_table16()
+
+    for frame in frames:
+        assert crc.crc8(frame) == crc.crc8_py(frame) == crcmod_crc8(frame)
+    for payload, fragments in zip(payloads, responses):
+        assert crc.crc16_modbus(payload) == crc.crc16_modbus_py(payload) == crcmod_modbus(payload)
+
+    print(f'{len(frames)} frames, {len(payloads)} payloads from {args.capture}')
+    print(f'hoymiles.crc uses crcmod C extension: {crc.C_EXTENSION}')
+
+    n_frames = len(frames)
+    n_payloads = len(payloads)
+    rounds = args.rounds
+
+    bench('crc8 crcmod', lambda: [crcmod_crc8(frame) for frame in frames], rounds, n_frames)
+    bench('crc8 crcmod pure python', lambda: [crcmod_py_crc8(frame) for frame in frames], rounds, n_frames)
+    bench('crc8 hoymiles.crc', lambda: [crc.crc8(frame) for frame in frames], rounds, n_frames)
+    bench('crc8 hoymiles.crc pure python', lambda: [crc.crc8_py(frame) for frame in frames], rounds, n_frames)
+
+    bench('modbus crcmod', lambda: [crcmod_modbus(payload) for payload in payloads], rounds, n_payloads)
+    bench('modbus crcmod pure python', lambda: [crcmod_py_modbus(payload) for payload in payloads], rounds, n_payloads)
+    bench('modbus hoymiles.crc', lambda: [crc.crc16_modbus(payload) for payload in payloads], rounds, n_payloads)
+    bench('modbus hoymiles.crc pure python', lambda: [crc.crc16_modbus_py(payload) for payload in payloads], rounds, n_payloads)
+
+    def streaming():
+        for fragments in responses:
+            stream = crc.Crc16Modbus()
+            for fragment in fragments:
+                stream.update(fragment)
+    bench('modbus hoymiles.crc streaming', streaming, rounds, n_payloads)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Decode throughput per response type with logging off
+
+Usage (from tools/rpi):
+    python3 benchmarks/decode.py [--rounds 20000] [--level WARNING]
+
+Decodes realtime data from the capture, a hardware info, an alarm log
+and an unknown payload through InverterSession.decode, like
+poll_inverter, including the debug representation of the result. The
+root logger level is WARNING by default, so no diagnostics are written
+and every formatted log line is wasted work.
+"""
+
+import os
+import sys
+import time
+import struct
+import logging
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import hoymiles
+from hoymiles import f_crc_m
+from hoymiles.simulator import load_capture
+
+DTU_SER = 99978563412
+INVERTER_SER = 114172220143
+STRINGS = [{'s_name': 'String 1', 's_maxpower': 400}, {'s_name': 'String 2', 's_maxpower': 400}]
+
+def framed(payload):
+    """Payload with Modbus CRC appended"""
+    return payload + struct.pack('>H', f_crc_m(payload))
+
+def realtime_payload(filename):
+    """First complete realtime data payload of the capture"""
+    for recorded in load_capture(filename).values():
+        for fragments in recorded:
+            payload = b''.join(fragment[10:-1] for fragment in fragments)
+            if len(payload) >= 44:
+                return payload
+    raise ValueError(f'No complete realtime data in {filename}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Decode throughput benchmark')
+    parser.add_argument('--capture', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'example-logs', 'example.log'))
+    parser.add_argument('--rounds', type=int, default=20000)
+    parser.add_argument('--level', default='WARNING', help='root logger level')
+    args = parser.parse_args()
+
+    logging.basicConfig(stream=sys.stderr, level=getattr(logging, args.level))
+
+    session = hoymiles.InverterSession({'serial': INVERTER_SER, 'strings': STRINGS}, DTU_SER)
+    alarms = struct.pack('>H', 1) + b''.join(struct.pack('>BBHHHHH', 1, code, 1, 300 + code, 3600, 3700, 0)
+                                             for code in (1, 130, 143, 147, 209, 210))
+    cases = [
+            ('realtime data 0x0b', 0x0b, realtime_payload(args.capture)),
+            ('hardware info 0x01', 0x01, framed(struct.pack('>7H', 10009, 2020, 1125, 1538, 1, 0, 0))),
+            ('alarm log 0x11', 0x11, framed(alarms)),
+            ('unknown 0x05', 0x05, framed(bytes(range(40)))),
+            ]
+
+    print(f'logging level {args.level}')
+    for label, command, payload in cases:
+        request = session.time_request(command)
+        t_start = time.perf_counter()
+        for _ in range(args.rounds):
+            result = session.decode(payload, request)
+            result.__dict__()
+        elapsed = time.perf_counter() - t_start
+        print(f'{label:20s} {elapsed / args.rounds * 1e6:8.2f} us  {args.rounds / elapsed:10.0f} decodes/s')
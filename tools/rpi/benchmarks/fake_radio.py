@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Fake RF24 driver and GPIO module to benchmark HoymilesNRF without hardware
+"""
+
+import time
+
+# Response to '80 0b' from example-logs/example.log, ~45 ms apart on air
+EXAMPLE_RESPONSE = [
+        bytes.fromhex('95 72 22 01 43 72 22 01 43 01 00 01 01 38 00 03 00 0a 01 39 00 04 00 0d 00 00 94'),
+        bytes.fromhex('95 72 22 01 43 72 22 01 43 02 8f ad 00 00 86 a6 06 29 06 37 08 dd 13 88 00 00 c5'),
+        bytes.fromhex('95 72 22 01 43 72 22 01 43 83 00 00 00 00 00 00 00 b8 0a b5 5f ff b1'),
+        ]
+
+class FakeRF24:
+    """
+    RF24 look-alike, plays a list of fragments after each write()
+
+    Every register access burns spi_cost seconds of CPU, like a spidev ioctl.
+    The channel is not modelled, each fragment is received on any channel.
+    """
+    def __init__(self, fragments=None, first=0.015, spacing=0.045, spi_cost=30e-6):
+        self.fragments = fragments or EXAMPLE_RESPONSE
+        self.first = first
+        self.spacing = spacing
+        self.spi_cost = spi_cost
+        self.spi_calls = 0
+        self.armed = False
+        self.schedule = []
+        self.arrivals = []
+
+    def spi(self):
+        """Busy wait to model one SPI transaction"""
+        self.spi_calls += 1
+        t_end = time.perf_counter() + self.spi_cost
+        while time.perf_counter() < t_end:
+            pass
+
+    def begin(self):
+        return True
+
+    def isChipConnected(self):
+        return True
+
+    def startListening(self):
+        self.spi()
+        if self.armed:
+            self.armed = False
+            now = time.perf_counter()
+            self.schedule = [
+                    (now + self.first + i * self.spacing, fragment)
+                    for i, fragment in enumerate(self.fragments)]
+
+    def pending(self):
+        """If a fragment has arrived in the rx fifo"""
+        return len(self.schedule) > 0 and self.schedule[0][0] <= time.perf_counter()
+
+    def next_arrival(self):
+        """Time of the next fragment, None if all played"""
+        return self.schedule[0][0] if self.schedule else None
+
+    def available_pipe(self):
+        self.spi()
+        return self.pending(), 1
+
+    def getDynamicPayloadSize(self):
+        self.spi()
+        return len(self.schedule[0][1])
+
+    def read(self, size):
+        self.spi()
+        t_arrival, fragment = self.schedule.pop(0)
+        self.arrivals.append(t_arrival)
+        return fragment[:size]
+
+    def write(self, packet):
+        self.spi()
+        self.armed = True
+        self.schedule = []
+        return True
+
+    def __getattr__(self, name):
+        # setChannel, stopListening, setPALevel, ...
+        def register_access(*args, **kwargs):
+            self.spi()
+        return register_access
+
+class FakeGPIO:
+    """RPi.GPIO look-alike, IRQ pin driven by a FakeRF24 rx fifo"""
+    FALLING = 'falling'
+
+    def __init__(self, radio):
+        self.radio = radio
+
+    def input(self, pin):
+        return 0 if self.radio.pending() else 1
+
+    def wait_for_edge(self, pin, edge, timeout=None):
+        t_arrival = self.radio.next_arrival()
+        t_timeout = time.perf_counter() + timeout / 1000
+        if t_arrival is None or t_arrival > t_timeout:
+            time.sleep(max(0, t_timeout - time.perf_counter()))
+            return None
+        time.sleep(max(0, t_arrival - time.perf_counter()))
+        return pin
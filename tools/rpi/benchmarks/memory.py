@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Memory and allocations of a simulated day of polling
+
+Usage (from tools/rpi):
+    python3 benchmarks/memory.py [--inverters 2] [--hours 12] [--interval 5] [--loss 0.1]
+
+Polls the inverters on a simulator radio every interval seconds of
+simulated daylight and keeps every received fragment and decoded
+response, like a capture for later backfilling. Reports the memory
+they retain and the allocations of the run: tracemalloc peak, memory
+blocks still allocated and time per poll with and without tracing.
+"""
+
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import hoymiles
+from hoymiles.simulator import SimulatorRadio
+
+DTU_SER = 99978563412
+STRINGS = [{'s_name': 'String 1', 's_maxpower': 400}, {'s_name': 'String 2', 's_maxpower': 400}]
+
+def poll_day(inverters, radio, polls, fragments, responses):
+    """Realtime data polls, keeps all fragments and decoded responses"""
+    for _ in range(polls):
+        for inverter in inverters:
+            request = inverter.time_request(0x0b)
+            com = hoymiles.InverterTransaction(radio=radio, session=inverter, request=request)
+            while com.rxtx():
+                try:
+                    response = com.get_payload()
+                except (BufferError, ValueError):
+                    continue
+                result = inverter.decode(response, request, time_rx=com.time_rx)
+                result.snapshot()
+                responses.append(result)
+                break
+            fragments.extend(com.scratch)
+
+def run(args, traced):
+    """One simulated day, returns fragments, responses and measurements"""
+    radio = SimulatorRadio(args.capture, loss=args.loss, realtime=False, seed=args.seed)
+    inverters = [hoymiles.InverterSession({'serial': 114172220000 + i, 'name': f'inv{i}', 'strings': STRINGS}, DTU_SER)
+                 for i in range(args.inverters)]
+    polls = int(args.hours * 3600 / args.interval)
+    fragments = []
+    responses = []
+
+    if traced:
+        tracemalloc.start()
+    blocks = sys.getallocatedblocks()
+    t_start = time.perf_counter()
+    poll_day(inverters, radio, polls, fragments, responses)
+    elapsed = time.perf_counter() - t_start
+    blocks = sys.getallocatedblocks() - blocks
+    current = peak = 0
+    if traced:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return fragments, responses, polls * len(inverters), elapsed, blocks, current, peak
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Memory benchmark of a simulated day of polling')
+    parser.add_argument('--capture', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'example-logs', 'example.log'))
+    parser.add_argument('--inverters', type=int, default=2)
+    parser.add_argument('--hours', type=float, default=12)
+    parser.add_argument('--interval', type=float, default=5)
+    parser.add_argument('--loss', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    fragments, responses, polls, t_plain, _, _, _ = run(args, traced=False)
+    del fragments, responses
+    fragments, responses, polls, t_traced, blocks, current, peak = run(args, traced=True)
+
+    print(f'{polls} polls, {len(fragments)} fragments, {len(responses)} responses kept')
+    print(f'retained        {current / 1e6:8.2f} MB, {current / len(fragments):6.0f} B per fragment incl. responses')
+    print(f'peak            {peak / 1e6:8.2f} MB')
+    print(f'blocks          {blocks:8d} still allocated, {blocks / len(fragments):5.1f} per fragment')
+    print(f'time per poll   {t_plain / polls * 1e6:8.1f} us, {t_traced / polls * 1e6:8.1f} us traced')
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Request packet building, concatenation against PacketBuilder, under tracemalloc
+
+Usage (from tools/rpi):
+    python3 benchmarks/packets.py [--requests 20000]
+
+tracemalloc hooks every allocation, so the time per request with tracing
+on grows with the number of allocations. The peak is the largest amount
+of transient memory one request needed. Blocks are the memory blocks
+still allocated per request, with the packets kept: the packet itself,
+plus anything the builder caches.
+"""
+
+import gc
+import os
+import sys
+import time
+import struct
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import hoymiles
+from hoymiles import f_crc8, f_crc_m, ser_to_hm_addr
+
+DTU_SER = 99978563412
+INVERTER_SER = 114172220143
+
+def legacy_frame_payload(payload):
+    """frame_payload before PacketBuilder"""
+    payload_crc = f_crc_m(payload)
+    payload = payload + struct.pack('>H', payload_crc)
+    return payload
+
+def legacy_compose_esb_fragment(fragment, seq=b'\x80', src=99999999, dst=1, **params):
+    """compose_esb_fragment before PacketBuilder"""
+    packet = b'\x15'
+    packet = packet + ser_to_hm_addr(dst)
+    packet = packet + ser_to_hm_addr(src)
+    packet = packet + seq
+    packet = packet + fragment
+    crc8 = f_crc8(packet)
+    packet = packet + struct.pack('B', crc8)
+    return packet
+
+def legacy_compose_send_time_payload(cmdId, alarm_id=0):
+    """compose_send_time_payload before PacketBuilder"""
+    timestamp = int(time.time())
+    payload = struct.pack('>B', cmdId)
+    payload = payload + b'\x00'
+    payload = payload + struct.pack('>L', timestamp)
+    payload = payload + b'\x00\x00'
+    payload = payload + struct.pack('>H', alarm_id)
+    payload = payload + b'\x00\x00\x00\x00'
+    return legacy_frame_payload(payload)
+
+def legacy_request():
+    return legacy_compose_esb_fragment(legacy_compose_send_time_payload(0x0b), seq=b'\x80', src=DTU_SER, dst=INVERTER_SER)
+
+def compose_request():
+    return hoymiles.compose_esb_fragment(hoymiles.compose_send_time_payload(0x0b), seq=b'\x80', src=DTU_SER, dst=INVERTER_SER)
+
+session = hoymiles.InverterSession({'serial': INVERTER_SER}, DTU_SER)
+
+def session_request():
+    return session.time_request(0x0b)
+
+def measure(label, build, requests):
+    """Print time per request without and with tracemalloc, peak memory and kept blocks"""
+    t_start = time.perf_counter()
+    for _ in range(requests):
+        build()
+    t_plain = (time.perf_counter() - t_start) / requests
+
+    packets = [None] * requests
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    for i_request in range(requests):
+        packets[i_request] = build()
+    blocks = (sys.getallocatedblocks() - blocks) / requests
+    del packets
+
+    tracemalloc.start()
+    build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    t_start = time.perf_counter()
+    for _ in range(requests):
+        build()
+    t_traced = (time.perf_counter() - t_start) / requests
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f'{label:40s} {t_plain * 1e6:7.2f} us  {t_traced * 1e6:7.2f} us traced  peak {peak - current:5d} B'
+            f'  {blocks:5.2f} blocks')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Request packet building benchmark')
+    parser.add_argument('--requests', type=int, default=20000)
+    args = parser.parse_args()
+
+    assert legacy_request() == compose_request() == session_request()
+
+    print(f'{"":40s} {"per request":>10s} {"with tracemalloc":>18s}')
+    measure('concatenation (before)', legacy_request, args.requests)
+    measure('compose_* on PacketBuilder', compose_request, args.requests)
+    measure('InverterSession.time_request', session_request, args.requests)
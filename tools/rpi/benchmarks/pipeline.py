@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Load test poll -> reassemble -> decode -> output on simulated radios
+
+Usage (from tools/rpi):
+    python3 benchmarks/pipeline.py [--inverters 30] [--radios 1] [--cycles 3]
+        [--loss 0.1] [--reorder 0.05] [--latency 0.045] [--fast]
+
+With --fast the simulator does not sleep, which measures the CPU bound
+throughput of the pipeline instead of the cycle time on air.
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import hoymiles
+from hoymiles.simulator import SimulatorRadio
+from hoymiles.outputs import OutputPluginFactory, status_snapshot
+
+DTU_SER = 99978563412
+STRINGS = [{'s_name': 'String 1', 's_maxpower': 400}, {'s_name': 'String 2', 's_maxpower': 400}]
+
+class NullOutputPlugin(OutputPluginFactory):
+    """Formats like an output plugin, but keeps nothing"""
+    stored = 0
+
+    def store_status(self, response, **params):
+        status_snapshot(response)
+        self.stored += 1
+
+def poll(inverter, radio, retries, output):
+    """Single realtime data poll, like __main__.poll_inverter"""
+    request = inverter.time_request(0x0b)
+    for _ in range(retries):
+        com = hoymiles.InverterTransaction(radio=radio, session=inverter, request=request)
+        while com.rxtx():
+            try:
+                response = com.get_payload()
+            except (BufferError, ValueError):
+                continue
+            output.store_status(inverter.decode(response, request, time_rx=com.time_rx))
+            return True
+    return False
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulated polling pipeline load test')
+    parser.add_argument('--capture', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'example-logs', 'example.log'))
+    parser.add_argument('--inverters', type=int, default=30)
+    parser.add_argument('--radios', type=int, default=1)
+    parser.add_argument('--cycles', type=int, default=3)
+    parser.add_argument('--retries', type=int, default=5)
+    parser.add_argument('--loss', type=float, default=0.0)
+    parser.add_argument('--reorder', type=float, default=0.0)
+    parser.add_argument('--latency', type=float, default=0.045)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--fast', action='store_true', help='do not sleep for latency and timeouts')
+    args = parser.parse_args()
+
+    radios = [SimulatorRadio(args.capture, loss=args.loss, reorder=args.reorder, latency=args.latency,
+                             realtime=not args.fast, seed=args.seed + i) for i in range(args.radios)]
+    inverters = [hoymiles.InverterSession({'serial': 114172220000 + i, 'name': f'inv{i}', 'strings': STRINGS}, DTU_SER)
+                 for i in range(args.inverters)]
+    output = NullOutputPlugin()
+    pool = hoymiles.RadioPool(radios, retries=args.retries)
+
+    cycle_times = []
+    cpu_start = time.process_time()
+    for _ in range(args.cycles):
+        t_start = time.perf_counter()
+        pool.poll(inverters, lambda inverter, radio: poll(inverter, radio, args.retries, output))
+        cycle_times.append(time.perf_counter() - t_start)
+    cpu = time.process_time() - cpu_start
+
+    polls = args.inverters * args.cycles
+    print(f'{args.inverters} inverters on {args.radios} radio(s), loss {args.loss} reorder {args.reorder}')
+    print(f'cycle time   mean {sum(cycle_times) / len(cycle_times):8.3f} s  max {max(cycle_times):8.3f} s')
+    print(f'answered     {output.stored}/{polls} polls, {sum(r.transmissions for r in radios)} transmissions')
+    print(f'cpu          {cpu:8.3f} s, {polls / cpu:8.1f} polls per cpu second')
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark HoymilesNRF.receive: 5 ms polling against 50 ms irq_pin edge waits
+
+Usage (from tools/rpi):
+    python3 benchmarks/receive_irq.py [--transactions 10] [--spi-cost 30]
+
+Reports process CPU time, SPI transactions and per-fragment latency
+(time from arrival in the fake rx fifo until receive() yields it).
+"""
+
+import os
+import sys
+import time
+import argparse
+from statistics import mean
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fake_radio import FakeRF24, FakeGPIO
+import hoymiles
+
+def run(mode, transactions, spi_cost):
+    radio = FakeRF24(spi_cost=spi_cost)
+    config = {}
+    gpio = None
+    if mode == 'irq':
+        config['irq_pin'] = 25
+        gpio = FakeGPIO(radio)
+    nrf = hoymiles.HoymilesNRF(radio=radio, gpio=gpio, **config)
+
+    latencies = []
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for _ in range(transactions):
+        radio.write(b'')
+        radio.spi_calls -= 1
+        for fragment in nrf.receive():
+            latencies.append(time.perf_counter() - radio.arrivals[-1])
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+
+    print(f'{mode:8} cpu {cpu * 1000:8.1f} ms ({cpu / wall * 100:5.1f}%)  '
+          f'spi {radio.spi_calls:6}  '
+          f'latency mean {mean(latencies) * 1000:6.2f} ms max {max(latencies) * 1000:6.2f} ms  '
+          f'fragments {len(latencies)}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='HoymilesNRF receive benchmark')
+    parser.add_argument('--transactions', type=int, default=10,
+        help='receive windows per mode')
+    parser.add_argument('--spi-cost', type=float, default=30,
+        help='CPU cost of one SPI transaction in microseconds')
+    args = parser.parse_args()
+
+    for mode in ['polling', 'irq']:
+        run(mode, args.transactions, args.spi_cost / 1e6)
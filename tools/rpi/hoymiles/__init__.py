@@ -7,10 +7,16 @@ Hoymiles micro-inverters python shared code
 
 import struct
 import time
-import re
+import math
+import os
+import json
+import threading
+import queue
+from collections import deque
+from enum import IntEnum
 from datetime import datetime
 import logging
-import crcmod
+from .crc import crc8, crc16_modbus, Crc16Modbus
 from .decoders import *
 from os import environ
 
@@ -31,15 +37,39 @@ except ModuleNotFoundError as e:
       print(f'{e} - Using python Module: pyrf24')
   except ModuleNotFoundError as e:
     if environ.get('TERM') is not None:
-      print(f'{e} - exit')
-    exit()
+      print(f'{e} - no NRF24 driver, only simulated radios available')
+    # register values as defined by RF24, only used with injected drivers
+    RF24 = None
+    RF24_PA_MIN, RF24_PA_LOW, RF24_PA_HIGH, RF24_PA_MAX = 0, 1, 2, 3
+    RF24_250KBPS = 2
+    RF24_CRC_DISABLED, RF24_CRC_8, RF24_CRC_16 = 0, 1, 2
 
-f_crc_m = crcmod.predefined.mkPredefinedCrcFun('modbus')
-f_crc8 = crcmod.mkCrcFun(0x101, initCrc=0, xorOut=0)
+f_crc_m = crc16_modbus
+f_crc8 = crc8
 
 HOYMILES_TRANSACTION_LOGGING=False
 HOYMILES_DEBUG_LOGGING=False
 
+class InfoCommands(IntEnum):
+    InverterDevInform_Simple = 0  # 0x00
+    InverterDevInform_All = 1     # 0x01
+    GridOnProFilePara = 2         # 0x02
+    HardWareConfig = 3            # 0x03
+    SimpleCalibrationPara = 4     # 0x04
+    SystemConfigPara = 5          # 0x05
+    RealTimeRunData_Debug = 11    # 0x0b
+    RealTimeRunData_Reality = 12  # 0x0c
+    RealTimeRunData_A_Phase = 13  # 0x0d
+    RealTimeRunData_B_Phase = 14  # 0x0e
+    RealTimeRunData_C_Phase = 15  # 0x0f
+    AlarmData = 17                # 0x11, Alarm data - all unsent alarms
+    AlarmUpdate = 18              # 0x12, Alarm data - all pending alarms
+    RecordData = 19               # 0x13
+    InternalData = 20             # 0x14
+    GetLossRate = 21              # 0x15
+    GetSelfCheckState = 30        # 0x1e
+    InitDataState = 0xff
+
 def ser_to_hm_addr(inverter_ser):
     """
     Calculate the 4 bytes that the HM devices use in their internal messages to
@@ -71,6 +101,53 @@ def ser_to_esb_addr(inverter_ser):
     air_order = ser_to_hm_addr(inverter_ser)[::-1] + b'\x01'
     return air_order[::-1]
 
+# Decoder model by the first four digits of the inverter serial
+SERIAL_PREFIXES = {
+        '1121': 'Hm300',
+        '1141': 'Hm600',
+        '1161': 'Hm1200',
+        }
+
+_models = {}
+
+def ser_to_model(inverter_ser):
+    """
+    Find decoder model prefix for an inverter serial, cached per serial
+
+    :param inverter_ser: inverter serial
+    :type inverter_ser: str or int
+    :return: suitable decoder model string
+    :rtype: str
+    :raises ValueError: on invalid inverter serial
+    :raises NotImplementedError: if inverter model can not be determined
+    """
+    try:
+        return _models[inverter_ser]
+    except KeyError:
+        pass
+
+    if not inverter_ser:
+        raise ValueError('Inverter serial while decoding response')
+
+    ser_str = str(inverter_ser)
+    model = SERIAL_PREFIXES.get(ser_str[:4], None) if len(ser_str) >= 12 else None
+    if not model:
+        raise NotImplementedError(f'Model lookup failed for serial {ser_str}')
+
+    _models[inverter_ser] = model
+    return model
+
+def find_decoder(model, command):
+    """
+    Find decoder class for a model and request command
+
+    :param str model: decoder model string, see ser_to_model
+    :param int command: request command byte
+    :return: decoder class, DebugDecodeAny if there is no specific one
+    :rtype: type
+    """
+    return DECODERS.get((model, command), DebugDecodeAny)
+
 class ResponseDecoderFactory:
     """
     Prepare payload decoder
@@ -124,25 +201,7 @@ class ResponseDecoderFactory:
         :raises ValueError: on invalid inverter serial
         :raises NotImplementedError: if inverter model can not be determined
         """
-        if not self.inverter_ser:
-            raise ValueError('Inverter serial while decoding response')
-
-        ser_db = [
-                ('Hm300', r'^1121........'),
-                ('Hm600', r'^1141........'),
-                ('Hm1200', r'^1161........'),
-                ]
-        ser_str = str(self.inverter_ser)
-
-        model = None
-        for s_model, r_match in ser_db:
-            if re.match(r_match, ser_str):
-                model = s_model
-                break
-
-        if len(model):
-            return model
-        raise NotImplementedError('Model lookup failed for serial {ser_str}')
+        return ser_to_model(self.inverter_ser)
 
     @property
     def request_command(self):
@@ -175,56 +234,13 @@ class ResponseDecoder(ResponseDecoderFactory):
         :return: payload decoder instance
         :rtype: object
         """
-        model = self.inverter_model
-        command = self.request_command
+        model = self.model if self.model else self.inverter_model
+        command = self.request[10]
 
+        device = find_decoder(model, command)
         if HOYMILES_DEBUG_LOGGING:
-            if   command.upper() == '00':
-                model_desc = "Inverter Dev Inform Simple"
-            elif command.upper() == '01':
-                model_desc = "Firmware version / date"
-            elif command.upper() == '02':
-                model_desc = "Inverter generic events log"
-            elif command.upper() == '03':                         ## HardWareConfig
-                model_desc = "Hardware configuration"
-            elif command.upper() == '04':                         ## SimpleCalibrationPara
-                model_desc = "Simple Calibration Parameter"
-            elif command.upper() == '05':                         ## SystemConfigPara
-                model_desc = "Inverter generic SystemConfigPara"
-            elif command.upper() == '0B':                         ## 11 - RealTimeRunData_Debug
-                model_desc = "mirco-inverters status data"
-            elif command.upper() == '0C':                         ## 12 - RealTimeRunData_Reality
-                model_desc = "mirco-inverters status data"
-            elif command.upper() == '0D':                         ## 13 - RealTimeRunData_A_Phase
-                model_desc = "Real-Time Run Data A Phase "
-            elif command.upper() == '0E':                         ## 14 - RealTimeRunData_B_Phase
-                model_desc = "Real-Time Run Data B Phase "
-            elif command.upper() == '0F':                         ## 15 - RealTimeRunData_C_Phase
-                model_desc = "Real-Time Run Data C Phase "
-            elif command.upper() == '11':                         ## 17 - AlarmData
-                model_desc = "Inverter generic events log"
-            elif command.upper() == '12':                         ## 18 - AlarmUpdate
-                model_desc = "Inverter major events log"
-            elif command.upper() == '13':                         ## 19 - RecordData
-                model_desc = "Record Data"
-            elif command.upper() == '14':                         ## 20 - InternalData
-                model_desc = "Internal Data"
-            elif command.upper() == '15':                         ## 21 - GetLossRate
-                model_desc = "Get Loss Rate"
-            elif command.upper() == '1E':                         ## 30 - GetSelfCheckState
-                model_desc = "Get Self Check State"
-            elif command.upper() == 'FF':                         ## 255 - InitDataState
-                model_desc = "Initi Data State"
-
-            else:
-                model_desc = "event not configured - check ahoy script"
-            logging.info(f'model_decoder: {model}Decode{command.upper()} - {model_desc}')
-
-        model_decoders = __import__('hoymiles.decoders')
-        if hasattr(model_decoders, f'{model}Decode{command.upper()}'):
-            device = getattr(model_decoders, f'{model}Decode{command.upper()}')
-        else:
-            device = getattr(model_decoders, 'DebugDecodeAny')
+            model_desc = COMMAND_DESCRIPTIONS.get(command, 'event not configured - check ahoy script')
+            logging.info(f'model_decoder: {model}Decode{command:02X} - {model_desc}')
 
         return device(self.response,
                 time_rx=self.time_rx,
@@ -234,12 +250,23 @@ class ResponseDecoder(ResponseDecoderFactory):
                 strings=self.strings
                 )
 
+# mid, src, dst, seq
+FRAGMENT_HEADER = struct.Struct('>BLLB')
+
+# one int object per address, shared by all fragments from and to it
+_addresses = {}
+
 class InverterPacketFragment:
     """ESB Frame"""
+    __slots__ = ('time_rx', 'frame', 'ch_rx', 'ch_tx', 'mid', 'src', 'dst', 'seq')
+
     def __init__(self, time_rx=None, payload=None, ch_rx=None, ch_tx=None, **params):
         """
         Callback: get's invoked whenever a Nordic ESB packet has been received.
 
+        Header fields are unpacked once, data is a view into the frame
+        created on access, so kept fragments do not hold a view each.
+
         :param time_rx: datetime when frame was received
         :type time_rx: datetime
         :param payload: payload bytes
@@ -259,56 +286,26 @@ class InverterPacketFragment:
         self.frame = payload
 
         # check crc8
-        if f_crc8(payload[:-1]) != payload[-1]:
+        if len(payload) <= FRAGMENT_HEADER.size or f_crc8(payload[:-1]) != payload[-1]:
             raise BufferError('Frame corrupted - crc8 check failed')
 
         self.ch_rx = ch_rx
         self.ch_tx = ch_tx
 
-    @property
-    def mid(self):
-        """Transaction counter"""
-        return self.frame[0]
-
-    @property
-    def src(self):
-        """
-        Sender adddress
-
-        :return: sender address
-        :rtype: int
-        """
-        src = struct.unpack('>L', self.frame[1:5])
-        return src[0]
-    @property
-    def dst(self):
-        """
-        Receiver adddress
-
-        :return: receiver address
-        :rtype: int
-        """
-        dst = struct.unpack('>L', self.frame[5:8])
-        return dst[0]
-    @property
-    def seq(self):
-        """
-        Framne sequence number
+        # transaction counter, sender and receiver address, sequence number
+        self.mid, src, dst, self.seq = FRAGMENT_HEADER.unpack_from(payload)
+        self.src = _addresses.setdefault(src, src)
+        self.dst = _addresses.setdefault(dst, dst)
 
-        :return: sequence number
-        :rtype: int
-        """
-        result = struct.unpack('>B', self.frame[9:10])
-        return result[0]
     @property
     def data(self):
         """
         Data without protocol framing
 
         :return: payload chunk
-        :rtype: bytes
+        :rtype: memoryview
         """
-        return self.frame[10:-1]
+        return memoryview(self.frame)[FRAGMENT_HEADER.size:-1]
 
     def __str__(self):
         """
@@ -321,7 +318,314 @@ class InverterPacketFragment:
         channel = f' channel {self.ch_rx}' if self.ch_rx else ''
         return f"Received {size} bytes{channel}: {hexify_payload(self.frame)}"
 
-class HoymilesNRF:
+class StateStore:
+    """
+    JSON file keeping learned state across restarts
+
+    Each consumer registers a section with a callable returning its current
+    state, :meth:`save` collects all sections and replaces the file.
+    """
+    def __init__(self, filename=None, interval=300):
+        """
+        :param filename: state file, no persistence if None
+        :type filename: str or None
+        :param interval: minimum seconds between two writes of the file
+        :type interval: int
+        """
+        self.filename = filename
+        self.interval = interval
+        self.providers = {}
+        self.data = {}
+        self.t_saved = time.monotonic()
+
+        if not filename:
+            return
+        try:
+            with open(filename, 'r') as fh_state:
+                self.data = json.load(fh_state)
+        except FileNotFoundError:
+            pass
+        except (ValueError, OSError) as e:
+            logging.warning(f'Could not load state file {filename}: {e}')
+
+    def get(self, section):
+        """
+        Load state of a section
+
+        :param str section: section name
+        :return: state of the section as saved last time
+        :rtype: dict
+        """
+        return self.data.get(section, {})
+
+    def register(self, section, provider):
+        """
+        Register section to save
+
+        :param str section: section name
+        :param provider: returns JSON serializable state of the section
+        :type provider: callable
+        """
+        self.providers[section] = provider
+
+    def save(self, force=False):
+        """
+        Write state of all sections, at most once per interval
+
+        :param bool force: write regardless of interval
+        """
+        if not self.filename:
+            return
+        if not force and time.monotonic() - self.t_saved < self.interval:
+            return
+        self.t_saved = time.monotonic()
+
+        for section, provider in self.providers.items():
+            self.data[section] = provider()
+
+        try:
+            with open(f'{self.filename}.tmp', 'w') as fh_state:
+                json.dump(self.data, fh_state)
+            os.replace(f'{self.filename}.tmp', self.filename)
+        except OSError as e:
+            logging.warning(f'Could not save state file {self.filename}: {e}')
+
+class ChannelStats:
+    """
+    Per inverter channel statistics, ranks tx and rx channels by success
+
+    Tracked per inverter address and channel: tx requests and answers,
+    rx fragments and latency of the first fragment after transmission.
+    The rx channel paired with a tx channel follows the ESP firmware
+    (rx channel index = tx channel index + 3 for HM inverters).
+    """
+    channels = [3,23,40,61,75]
+    rx_offset = 3
+    max_misses = 3
+    max_count = 100
+
+    def __init__(self, state=None):
+        """
+        :param state: statistics as returned by :meth:`dump`
+        :type state: dict or None
+        """
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.misses = {}
+        self.blind_id = {}
+
+        for inverter, i_stats in (state or {}).items():
+            stats = self.__inverter(inverter)
+            for s_dir in ['tx', 'rx']:
+                for channel, values in i_stats.get(s_dir, {}).items():
+                    if int(channel) in stats[s_dir]:
+                        stats[s_dir][int(channel)] = list(values)
+
+    def __inverter(self, inverter):
+        """Statistics of one inverter, tx: [sent, answered], rx: [fragments, latency ms]"""
+        if inverter not in self.stats:
+            self.stats[inverter] = {
+                    'tx': {channel: [0, 0] for channel in self.channels},
+                    'rx': {channel: [0, None] for channel in self.channels}}
+        return self.stats[inverter]
+
+    def dump(self):
+        """
+        :return: JSON serializable statistics
+        :rtype: dict
+        """
+        with self.lock:
+            return {inverter: {s_dir: {str(channel): values for channel, values in stats[s_dir].items()}
+                               for s_dir in ['tx', 'rx']}
+                    for inverter, stats in self.stats.items()}
+
+    def success_rate(self, inverter, channel):
+        """
+        :param str inverter: inverter hm address (hex)
+        :param int channel: tx channel
+        :return: estimated answer probability on this tx channel
+        :rtype: float
+        """
+        with self.lock:
+            sent, answered = self.__inverter(inverter)['tx'][channel]
+        return (answered + 1) / (sent + 2)
+
+    def is_blind(self, inverter):
+        """If channel selection fell back to blind hopping after repeated misses"""
+        return self.misses.get(inverter, 0) >= self.max_misses
+
+    def tx_channel(self, inverter):
+        """
+        Select tx channel for next request
+
+        :param str inverter: inverter hm address (hex)
+        :return: channel most likely to be answered or next one while hopping blind
+        :rtype: int
+        """
+        if self.is_blind(inverter):
+            with self.lock:
+                self.blind_id[inverter] = (self.blind_id.get(inverter, 0) + 1) % len(self.channels)
+                return self.channels[self.blind_id[inverter]]
+
+        return max(self.channels, key=lambda channel: self.success_rate(inverter, channel))
+
+    def rx_channels(self, inverter, tx_channel):
+        """
+        Order rx channels to listen on after a request
+
+        :param str inverter: inverter hm address (hex)
+        :param int tx_channel: channel the request was sent on
+        :return: rx hop list, paired channel first, then most fragments received
+        :rtype: list
+        """
+        paired_id = (self.channels.index(tx_channel) + self.rx_offset) % len(self.channels)
+        hop_list = self.channels[paired_id:] + self.channels[:paired_id]
+        if self.is_blind(inverter):
+            return hop_list
+
+        with self.lock:
+            rx_stats = self.__inverter(inverter)['rx']
+            return hop_list[:1] + sorted(hop_list[1:], key=lambda channel: rx_stats[channel][0], reverse=True)
+
+    def tx_result(self, inverter, channel, answered):
+        """
+        Record if a request got answered
+
+        :param str inverter: inverter hm address (hex)
+        :param int channel: tx channel
+        :param bool answered: if any fragment was received
+        """
+        with self.lock:
+            tx_stats = self.__inverter(inverter)['tx'][channel]
+            tx_stats[0] += 1
+            if answered:
+                tx_stats[1] += 1
+                self.misses[inverter] = 0
+            else:
+                self.misses[inverter] = self.misses.get(inverter, 0) + 1
+            if tx_stats[0] > self.max_count:
+                tx_stats[0] //= 2
+                tx_stats[1] //= 2
+
+    def rx_fragment(self, inverter, channel, latency=None):
+        """
+        Record received fragment
+
+        :param str inverter: inverter hm address (hex)
+        :param int channel: rx channel
+        :param latency: ms since end of transmission, first fragment only
+        :type latency: float or None
+        """
+        with self.lock:
+            rx_stats = self.__inverter(inverter)['rx']
+            rx_stats[channel][0] += 1
+            if latency is not None:
+                if rx_stats[channel][1] is None:
+                    rx_stats[channel][1] = latency
+                else:
+                    rx_stats[channel][1] = round(0.8 * rx_stats[channel][1] + 0.2 * latency, 2)
+            if rx_stats[channel][0] > self.max_count:
+                for values in rx_stats.values():
+                    values[0] //= 2
+
+class ShadowRF24:
+    """
+    RF24 driver wrapper with a shadow copy of the radio configuration
+
+    Configuration calls are only forwarded over SPI if their arguments differ
+    from what was last written to the chip, all other calls pass through.
+    """
+    cached = {
+            'setDataRate': 0,
+            'openReadingPipe': 1,    # keyed by pipe number
+            'openWritingPipe': 0,
+            'setChannel': 0,
+            'setAutoAck': 0,
+            'setRetries': 0,
+            'setCRCLength': 0,
+            'enableDynamicPayloads': 0,
+            'setPALevel': 0,
+            }
+
+    def __init__(self, radio):
+        """
+        :param radio: RF24 compatible driver instance
+        """
+        self.radio = radio
+        self.shadow = {}
+        self.writes = 0
+        self.skipped = 0
+
+    def invalidate(self):
+        """Forget the shadow state, next configuration calls all go to the chip"""
+        self.shadow = {}
+
+    def begin(self):
+        """(Re-)initialize the chip, resets its configuration"""
+        self.invalidate()
+        return self.radio.begin()
+
+    def __getattr__(self, name):
+        """Wrap driver method on first use, later lookups hit the instance"""
+        driver_method = getattr(self.radio, name)
+        if name not in self.cached:
+            setattr(self, name, driver_method)
+            return driver_method
+
+        key_args = self.cached[name]
+
+        def shadowed(*args):
+            key = (name,) + args[:key_args]
+            if self.shadow.get(key, None) == args:
+                self.skipped += 1
+                return None
+            self.writes += 1
+            result = driver_method(*args)
+            self.shadow[key] = args
+            return result
+
+        setattr(self, name, shadowed)
+        return shadowed
+
+class RadioTransport:
+    """
+    Radio transport interface used by InverterTransaction
+
+    A transport puts ESB packets on air and yields the fragments received
+    in answer. Implemented by HoymilesNRF for nRF24 hardware and by
+    hoymiles.simulator.SimulatorRadio to replay recorded traffic.
+    """
+    def transmit(self, packet, txpower=None):
+        """
+        Transmit Packet
+
+        :param bytes packet: ESB packet to send
+        :param txpower: transmit power (min, low, high, max)
+        :type txpower: str or None
+        :return: if ACK received of ACK disabled
+        :rtype: bool
+        :raises NotImplementedError: when the transport does not implement transmit
+        """
+        raise NotImplementedError('The current radio transport does not implement transmit')
+
+    def receive(self, timeout=None, frame_timeout=None):
+        """
+        Receive Packets answering the last transmission
+
+        The consumer may stop iterating as soon as it got all fragments,
+        which ends listening right away.
+
+        :param timeout: timeout for the first fragment in nanoseconds (default: 5e8)
+        :type timeout: int
+        :param frame_timeout: timeout after each fragment in nanoseconds (default: 5e8)
+        :type frame_timeout: int
+        :yields: InverterPacketFragment
+        :raises TimeoutError: if nothing was received
+        :raises NotImplementedError: when the transport does not implement receive
+        """
+        raise NotImplementedError('The current radio transport does not implement receive')
+
+class HoymilesNRF(RadioTransport):
     """Hoymiles NRF24 Interface"""
     tx_channel_id = 2
     tx_channel_list = [3,23,40,61,75]
@@ -329,18 +633,41 @@ class HoymilesNRF:
     rx_channel_list = [3,23,40,61,75]
     rx_channel_ack = False
     rx_error = 0
+    rx_count = 0
+    rx_dwell = 5e6          # ns on an rx channel while polling
+    irq_rx_dwell = 50e6     # ns on an rx channel while waiting for the IRQ pin
     txpower = 'max'
-
-    def __init__(self, **radio_config):
+    irq_pin = None
+    gpio = None
+    pa_levels = {
+            'min': RF24_PA_MIN,
+            'low': RF24_PA_LOW,
+            'high': RF24_PA_HIGH,
+            'max': RF24_PA_MAX,
+            }
+
+    def __init__(self, radio=None, gpio=None, channel_stats=None, **radio_config):
         """
         Claim radio device
 
-        :param NRF24 device: instance of NRF24
+        :param radio: RF24 compatible driver instance (default: claim RF24 on ce_pin/cs_pin)
+        :param gpio: RPi.GPIO compatible module to wait for irq_pin edges (default: RPi.GPIO)
+        :param channel_stats: learned channel ranking, round robin hopping if None
+        :type channel_stats: ChannelStats
+        :param radio_config: nrf section of ahoy.yml
+        :type radio_config: dict
         """
-        radio = RF24(
-                radio_config.get('ce_pin', 22),
-                radio_config.get('cs_pin', 0),
-                radio_config.get('spispeed', 1000000))
+        self.channel_stats = channel_stats
+        self.inverter = None
+        self.t_tx = 0
+
+        if not radio:
+            if not RF24:
+                raise RuntimeError('Neither python module RF24 nor pyrf24 available')
+            radio = RF24(
+                    radio_config.get('ce_pin', 22),
+                    radio_config.get('cs_pin', 0),
+                    radio_config.get('spispeed', 1000000))
 
         if not radio.begin():
             raise RuntimeError('Can\'t open radio')
@@ -350,7 +677,24 @@ class HoymilesNRF:
 
         self.txpower = radio_config.get('txpower', 'max')
 
-        self.radio = radio
+        self.radio = ShadowRF24(radio)
+
+        self.irq_pin = radio_config.get('irq_pin', None)
+        if self.irq_pin is not None:
+            self.gpio = gpio
+            if not self.gpio:
+                try:
+                    import RPi.GPIO
+                    self.gpio = RPi.GPIO
+                    self.gpio.setmode(self.gpio.BCM)
+                    self.gpio.setup(self.irq_pin, self.gpio.IN, pull_up_down=self.gpio.PUD_UP)
+                except (ModuleNotFoundError, RuntimeError) as e:
+                    logging.warning(f'IRQ pin {self.irq_pin} not usable ({e}) - falling back to polling')
+                    self.gpio = None
+
+        if self.gpio:
+            # IRQ pin goes low on RX_DR only, TX_DS and MAX_RT stay masked
+            radio.maskIRQ(True, True, False)
 
     def transmit(self, packet, txpower=None):
         """
@@ -361,9 +705,15 @@ class HoymilesNRF:
         :rtype: bool
         """
 
-        self.next_tx_channel()
+        self.inverter = packet[1:5].hex()
+        if self.channel_stats:
+            self.tx_channel_id = self.tx_channel_list.index(self.channel_stats.tx_channel(self.inverter))
+            self.rx_channel_list = self.channel_stats.rx_channels(self.inverter, self.tx_channel)
+            self.rx_channel_id = 0
+        else:
+            self.next_tx_channel()
 
-        if HOYMILES_TRANSACTION_LOGGING:
+        if HOYMILES_TRANSACTION_LOGGING and debug_enabled():
             c_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
             logging.debug(f'{c_datetime} Transmit {len(packet)} bytes channel {self.tx_channel}: {hexify_payload(packet)}')
 
@@ -373,6 +723,7 @@ class HoymilesNRF:
         inv_esb_addr = b'\01' + packet[1:5]
         dtu_esb_addr = b'\01' + packet[5:9]
 
+        # only settings which differ from the last transaction reach the chip
         self.radio.stopListening()  # put radio in TX mode
         self.radio.setDataRate(RF24_250KBPS)
         self.radio.openReadingPipe(1,dtu_esb_addr)
@@ -382,29 +733,27 @@ class HoymilesNRF:
         self.radio.setRetries(3, 15)
         self.radio.setCRCLength(RF24_CRC_16)
         self.radio.enableDynamicPayloads()
+        self.radio.setPALevel(self.pa_levels.get(txpower, RF24_PA_MAX))
 
-        if txpower == 'min':
-            self.radio.setPALevel(RF24_PA_MIN)
-        elif txpower == 'low':
-            self.radio.setPALevel(RF24_PA_LOW)
-        elif txpower == 'high':
-            self.radio.setPALevel(RF24_PA_HIGH)
-        else:
-            self.radio.setPALevel(RF24_PA_MAX)
-
-        return self.radio.write(packet)
+        result = self.radio.write(packet)
+        self.t_tx = time.monotonic_ns()
+        return result
 
-    def receive(self, timeout=None):
+    def receive(self, timeout=None, frame_timeout=None):
         """
         Receive Packets
 
-        :param timeout: receive timeout in nanoseconds (default: 5e8)
+        :param timeout: timeout for the first fragment in nanoseconds (default: 5e8)
         :type timeout: int
+        :param frame_timeout: timeout after each fragment in nanoseconds (default: 5e8)
+        :type frame_timeout: int
         :yields: fragment
         """
 
         if not timeout:
             timeout=5e8
+        if not frame_timeout:
+            frame_timeout=5e8
 
         self.radio.setChannel(self.rx_channel)
         self.radio.setAutoAck(False)
@@ -413,20 +762,39 @@ class HoymilesNRF:
         self.radio.setCRCLength(RF24_CRC_16)
         self.radio.startListening()
 
-        fragments = []
+        try:
+            yield from self.__receive_loop(timeout, frame_timeout)
+        finally:
+            if self.channel_stats and self.inverter:
+                self.channel_stats.tx_result(self.inverter, self.tx_channel, self.rx_count > 0)
+
+    def __receive_loop(self, timeout, frame_timeout):
+        """
+        Receive Packets until timeout after the last fragment
+
+        :param int timeout: timeout for the first fragment in nanoseconds
+        :param int frame_timeout: timeout after each fragment in nanoseconds
+        :yields: fragment
+        :raises TimeoutError: if nothing was received
+        """
+        self.rx_count = 0
         received_sth=False
+        rx_ready = True
         # Receive: Loop
         t_end = time.monotonic_ns()+timeout
         while time.monotonic_ns() < t_end:
 
-            has_payload, pipe_number = self.radio.available_pipe()
+            has_payload = False
+            if rx_ready:
+                has_payload, pipe_number = self.radio.available_pipe()
             if has_payload:
 
                 # Data in nRF24 buffer, read it
                 self.rx_error = 0
                 self.rx_channel_ack = True
-                t_end = time.monotonic_ns()+5e8
+                t_end = time.monotonic_ns()+frame_timeout
 
+                # read() clears RX_DR, which releases the IRQ pin
                 size = self.radio.getDynamicPayloadSize()
                 payload = self.radio.read(size)
                 fragment = InverterPacketFragment(
@@ -434,9 +802,19 @@ class HoymilesNRF:
                         ch_rx=self.rx_channel, ch_tx=self.tx_channel,
                         time_rx=datetime.now()
                         )
+                if self.channel_stats and self.inverter:
+                    latency = None
+                    if self.rx_count == 0:
+                        latency = round((time.monotonic_ns() - self.t_tx) / 1e6, 2)
+                    self.channel_stats.rx_fragment(self.inverter, self.rx_channel, latency)
+                self.rx_count += 1
                 received_sth=True
                 yield fragment
 
+                if self.gpio:
+                    # drain rx fifo before waiting for the next interrupt
+                    continue
+
             else:
 
                 # No data in nRF rx buffer, search and wait
@@ -450,11 +828,37 @@ class HoymilesNRF:
                     self.radio.setChannel(self.rx_channel)
                     self.radio.startListening()
 
-            time.sleep(0.005)
+            rx_ready = self.wait_rx(t_end)
         
         if not received_sth:
             raise TimeoutError
-        
+
+    def wait_rx(self, t_end):
+        """
+        Wait for the next fragment on the current rx channel
+
+        Blocks on the IRQ pin falling edge for up to irq_rx_dwell if
+        irq_pin is configured, sleeps for rx_dwell otherwise. Waiting on
+        the edge, channels are hopped ten times less often, so the CPU
+        sleeps through most of the receive window.
+
+        :param t_end: end of receive window (time.monotonic_ns)
+        :type t_end: int
+        :return: if the rx fifo may hold data and needs to be checked
+        :rtype: bool
+        """
+        if not self.gpio:
+            time.sleep(self.rx_dwell / 1e9)
+            return True
+
+        # IRQ pin is active low, an already pending RX_DR has no edge left
+        if not self.gpio.input(self.irq_pin):
+            return True
+
+        timeout_ms = int(min(self.irq_rx_dwell, t_end - time.monotonic_ns()) / 1e6)
+        if timeout_ms <= 0:
+            return False
+        return self.gpio.wait_for_edge(self.irq_pin, self.gpio.FALLING, timeout=timeout_ms) is not None
 
     def next_rx_channel(self):
         """
@@ -504,6 +908,288 @@ class HoymilesNRF:
     def __del__(self):
         self.radio.powerDown()
 
+def weighted_retries(retries, success_rate):
+    """
+    Send retries of an inverter, fewer for inverters that rarely answer
+
+    :param int retries: configured transmit retries
+    :param float success_rate: recent poll success rate 0.0..1.0
+    :return: retries, at least 1
+    :rtype: int
+    """
+    return max(1, math.ceil(retries * success_rate))
+
+class RadioPool:
+    """
+    Pool of radio transceivers, each one served by its own worker thread
+
+    Inverter sessions are either pinned to a radio (inverter config ``radio: <index>``)
+    or balanced across all radios by their recent poll success rate.
+    """
+    history = 10
+
+    def __init__(self, radios, retries=1):
+        """
+        :param radios: transceivers to poll inverters with
+        :type radios: list of RadioTransport
+        :param retries: tx retry count, airtime cost of an unresponsive inverter
+        :type retries: int
+        """
+        if len(radios) == 0:
+            raise ValueError('Radio pool needs at least one radio')
+
+        self.radios = radios
+        self.retries = retries
+        self.results = {}
+        self.lock = threading.Lock()
+        self.jobs = []
+
+        for radio_id, radio in enumerate(radios):
+            jobs = queue.Queue()
+            worker = threading.Thread(
+                    target=self.__worker,
+                    args=(radio, jobs),
+                    name=f'radio{radio_id}',
+                    daemon=True)
+            worker.start()
+            self.jobs.append(jobs)
+
+    def __worker(self, radio, jobs):
+        """
+        Poll jobs on one radio, runs in the radio worker thread
+
+        :param RadioTransport radio: radio owned by this worker
+        :param queue.Queue jobs: (callback, inverter, errors) tuples
+        """
+        while True:
+            poll, inverter, errors = jobs.get()
+            try:
+                success = poll(inverter, radio)
+                # None: inverter was not polled, e.g. offline backoff
+                if success is not None:
+                    self.report(inverter.serial, success)
+            except Exception as e_all:
+                errors.append(e_all)
+            finally:
+                jobs.task_done()
+
+    def report(self, inverter_ser, success):
+        """
+        Record poll result of an inverter
+
+        :param inverter_ser: inverter serial
+        :type inverter_ser: str
+        :param bool success: if the inverter did answer
+        """
+        with self.lock:
+            if inverter_ser not in self.results:
+                self.results[inverter_ser] = deque(maxlen=self.history)
+            self.results[inverter_ser].append(bool(success))
+
+    def success_rate(self, inverter_ser):
+        """
+        Recent poll success rate of an inverter
+
+        :param inverter_ser: inverter serial
+        :type inverter_ser: str
+        :return: success rate 0.0..1.0, 1.0 if never polled
+        :rtype: float
+        """
+        with self.lock:
+            results = self.results.get(inverter_ser)
+            if not results:
+                return 1.0
+            return sum(results) / len(results)
+
+    def cost(self, inverter_ser):
+        """
+        Expected number of transmissions for one poll of an inverter,
+        with send retries weighted like AirtimeBudget.retries
+
+        :param inverter_ser: inverter serial
+        :type inverter_ser: str
+        :rtype: float
+        """
+        success_rate = self.success_rate(inverter_ser)
+        return 1 + (1 - success_rate) * (weighted_retries(self.retries, success_rate) - 1)
+
+    def assign(self, inverters):
+        """
+        Distribute inverters across radios
+
+        Pinned inverters go to their radio, all others are spread greedily,
+        most expensive first, onto the radio with the lowest expected load.
+
+        :param list inverters: inverter sessions
+        :return: inverter sessions per radio index
+        :rtype: list of lists
+        """
+        assigned = [[] for _ in self.radios]
+        load = [0.0 for _ in self.radios]
+
+        balanced = []
+        for inverter in inverters:
+            radio_id = inverter.radio_id
+            if radio_id is None:
+                balanced.append(inverter)
+                continue
+            if not isinstance(radio_id, int) or not 0 <= radio_id < len(self.radios):
+                logging.error(f'Inverter {inverter.serial}: radio {radio_id} not configured in nrf section')
+                balanced.append(inverter)
+                continue
+            assigned[radio_id].append(inverter)
+            load[radio_id] += self.cost(inverter.serial)
+
+        balanced.sort(key=lambda inverter: self.cost(inverter.serial), reverse=True)
+        for inverter in balanced:
+            radio_id = load.index(min(load))
+            assigned[radio_id].append(inverter)
+            load[radio_id] += self.cost(inverter.serial)
+
+        return assigned
+
+    def poll(self, inverters, callback):
+        """
+        Poll inverters on all radios in parallel, returns when all are done
+
+        :param list inverters: inverter sessions
+        :param callback: called as callback(inverter, radio) in the radio
+                         worker thread, returns if the inverter did answer
+                         or None if it was skipped
+        :type callback: callable
+        :raises Exception: first exception raised by a callback
+        """
+        errors = []
+        for radio_id, radio_inverters in enumerate(self.assign(inverters)):
+            if HOYMILES_DEBUG_LOGGING and len(radio_inverters):
+                logging.info(f'Radio {radio_id}: ' + ', '.join(str(inverter.serial) for inverter in radio_inverters))
+            for inverter in radio_inverters:
+                self.jobs[radio_id].put((callback, inverter, errors))
+
+        for jobs in self.jobs:
+            jobs.join()
+
+        if len(errors):
+            raise errors[0]
+
+TIME_PAYLOAD = struct.Struct('>BxL2xH4x')
+CRC16 = struct.Struct('>H')
+
+def request_header(src, dst):
+    """
+    Header bytes of requests from a DTU to an inverter
+
+    :param src: dtu serial
+    :type src: str or int
+    :param dst: inverter serial
+    :type dst: str or int
+    :return: request type, inverter and DTU hm address
+    :rtype: bytes
+    """
+    return b'\x15' + ser_to_hm_addr(dst) + ser_to_hm_addr(src)
+
+class PacketBuilder:
+    """
+    Builds request packets in a reusable bytearray
+
+    Layouts are precompiled structs, InverterSession passes the header
+    bytes it computed once. Not thread safe, use one builder per thread,
+    see packet_builder().
+    """
+    mtu = 17
+
+    def __init__(self):
+        self.buffer = bytearray(10 + self.mtu + 1)
+        self.view = memoryview(self.buffer)
+
+    def fragment(self, fragment, seq=0x80, src=99999999, dst=1, header=None):
+        """
+        Build ESB request fragment
+
+        :param bytes fragment: up to 17 bytes payload chunk
+        :param int seq: frame sequence number
+        :param src: dtu serial
+        :type src: str or int
+        :param dst: inverter serial
+        :type dst: str or int
+        :param header: request_header(src, dst), replaces src and dst
+        :type header: bytes or None
+        :return: esb frame fragment
+        :rtype: bytes
+        :raises ValueError: if fragment size larger 17 byte
+        """
+        size = len(fragment)
+        if size > self.mtu:
+            raise ValueError(f'ESB fragment exeeds mtu: Fragment size {size} bytes')
+
+        buffer = self.buffer
+        buffer[0:9] = header or request_header(src, dst)
+        buffer[9] = seq
+        buffer[10:10 + size] = fragment
+        buffer[10 + size] = crc8(self.view[:10 + size])
+        return bytes(self.view[:11 + size])
+
+    def time_request(self, cmdId, alarm_id=0, src=99999999, dst=1, timestamp=None, header=None):
+        """
+        Build set time request packet, compose_send_time_payload in one fragment
+
+        :param int cmdId: command to request
+        :param int alarm_id: last known alarm id
+        :param src: dtu serial
+        :type src: str or int
+        :param dst: inverter serial
+        :type dst: str or int
+        :param timestamp: unix time (default now)
+        :type timestamp: int or None
+        :param header: request_header(src, dst), replaces src and dst
+        :type header: bytes or None
+        :return: esb packet
+        :rtype: bytes
+        """
+        if timestamp is None:
+            timestamp = int(time.time())
+
+        buffer = self.buffer
+        buffer[0:9] = header or request_header(src, dst)
+        buffer[9] = 0x80
+        # indices from esp8266 hmRadio.h / sendTimePacket()
+        TIME_PAYLOAD.pack_into(buffer, 10, cmdId, timestamp, alarm_id)
+        CRC16.pack_into(buffer, 24, crc16_modbus(self.view[10:24]))
+        buffer[26] = crc8(self.view[:26])
+        return bytes(self.view[:27])
+
+    def time_payload(self, cmdId, alarm_id=0, timestamp=None):
+        """
+        Build set time request payload with Modbus CRC16
+
+        :param int cmdId: command to request
+        :param int alarm_id: last known alarm id
+        :param timestamp: unix time (default now)
+        :type timestamp: int or None
+        :return: payload
+        :rtype: bytes
+        """
+        if timestamp is None:
+            timestamp = int(time.time())
+
+        buffer = self.buffer
+        TIME_PAYLOAD.pack_into(buffer, 0, cmdId, timestamp, alarm_id)
+        CRC16.pack_into(buffer, 14, crc16_modbus(self.view[:14]))
+        return bytes(self.view[:16])
+
+_builders = threading.local()
+
+def packet_builder():
+    """
+    :return: packet builder of the calling thread
+    :rtype: PacketBuilder
+    """
+    try:
+        return _builders.builder
+    except AttributeError:
+        _builders.builder = PacketBuilder()
+        return _builders.builder
+
 def frame_payload(payload):
     """
     Prepare payload for transmission, append Modbus CRC16
@@ -512,10 +1198,7 @@ def frame_payload(payload):
     :return: payload + crc
     :rtype: bytes
     """
-    payload_crc = f_crc_m(payload)
-    payload = payload + struct.pack('>H', payload_crc)
-
-    return payload
+    return payload + CRC16.pack(crc16_modbus(payload))
 
 def compose_esb_fragment(fragment, seq=b'\x80', src=99999999, dst=1, **params):
     """
@@ -532,20 +1215,7 @@ def compose_esb_fragment(fragment, seq=b'\x80', src=99999999, dst=1, **params):
     :rtype: bytes
     :raises ValueError: if fragment size larger 16 byte
     """
-    if len(fragment) > 17:
-        raise ValueError(f'ESB fragment exeeds mtu: Fragment size {len(fragment)} bytes')
-
-    packet = b'\x15'
-    packet = packet + ser_to_hm_addr(dst)
-    packet = packet + ser_to_hm_addr(src)
-    packet = packet + seq
-
-    packet = packet + fragment
-
-    crc8 = f_crc8(packet)
-    packet = packet + struct.pack('B', crc8)
-
-    return packet
+    return packet_builder().fragment(fragment, seq=seq[0], src=src, dst=dst)
 
 def compose_esb_packet(packet, mtu=17, **params):
     """
@@ -569,25 +1239,996 @@ def compose_send_time_payload(cmdId, alarm_id=0):
     :return: payload
     :rtype: bytes
     """
-    timestamp = int(time.time())
+    return packet_builder().time_payload(cmdId, alarm_id=alarm_id)
+
+class ReassemblyBuffer:
+    """
+    Reassembly buffer of one fragmented response
+
+    One slot per sequence number, filled as fragments arrive. Completion is
+    tracked incrementally and the Modbus CRC is folded over the contiguous
+    run of fragments from the start, so a complete payload needs no rescan.
+    Fragments numbered after the end frame are stray and not kept.
+    """
+    max_frame_id = 0x7e     # 0x80 + frame id is a retransmit request
+
+    def __init__(self):
+        self.slots = [None] * 0x80
+        self.count = 0
+        self.end_id = None
+        self.max_id = 0
+        self.end_frame = None
+        self.crc = Crc16Modbus()
+        self.crc_id = 1
+        self.crc_tail = b''
+
+    def add(self, frame):
+        """
+        Put fragment into its slot
+
+        :param InverterPacketFragment frame: received fragment
+        :return: if the fragment was new
+        :rtype: bool
+        """
+        seq = frame.seq
+        frame_id = seq & 0x7f
+        if frame_id == 0 or self.slots[frame_id] is not None:
+            return False
+        if self.end_id is not None and frame_id > self.end_id:
+            return False
+
+        self.slots[frame_id] = frame.data
+        self.count += 1
+        self.max_id = max(self.max_id, frame_id)
+        if seq > 0x80:
+            self.end_id = frame_id
+            self.end_frame = frame
+            # drop stray fragments received before the end frame
+            for stray_id in range(frame_id + 1, self.max_id + 1):
+                if self.slots[stray_id] is not None:
+                    self.slots[stray_id] = None
+                    self.count -= 1
+            self.max_id = frame_id
+
+        # fold newly contiguous fragments into the crc, hold back the
+        # last two bytes seen, they are the crc itself once complete
+        while self.crc_id < 0x80 and self.slots[self.crc_id] is not None:
+            data = self.crc_tail + self.slots[self.crc_id]
+            self.crc.update(data[:-2])
+            self.crc_tail = data[-2:]
+            self.crc_id += 1
+
+        return True
+
+    @property
+    def complete(self):
+        """If the end frame is known and slots 1..end_id are all filled"""
+        # only slots up to end_id are kept once it is known
+        return self.end_id is not None and self.count == self.end_id
+
+    def missing(self):
+        """
+        :return: missing frame ids before the end frame, or after the
+                 last received frame while the end frame is missing,
+                 at most max_frame_id
+        :rtype: list
+        """
+        if self.end_id is None:
+            last_id = min(self.max_id + 1, self.max_frame_id)
+        else:
+            last_id = self.end_id - 1
+        return [frame_id for frame_id in range(1, last_id + 1) if self.slots[frame_id] is None]
+
+    def crc_valid(self):
+        """
+        :return: if the payload of a complete buffer passes the Modbus CRC
+        :rtype: bool
+        """
+        return self.complete and len(self.crc_tail) == 2 \
+                and self.crc.value == struct.unpack('>H', self.crc_tail)[0]
+
+    def payload(self):
+        """
+        :return: payload joined in a single copy
+        :rtype: bytes
+        """
+        return b''.join(self.slots[1:self.end_id + 1])
+
+class ResponseTimer:
+    """
+    Adaptive receive timeouts from the observed response latency of an inverter
+
+    Keeps smoothed mean and deviation, like TCP retransmission timers, of
+    the delay until the first fragment and of the gap between fragments.
+    """
+    min_timeout = 1e8
+    max_timeout = 5e8
+
+    def __init__(self):
+        self.first = None
+        self.gap = None
+
+    @staticmethod
+    def estimate(estimate, sample):
+        """
+        Fold a sample into [mean, deviation]
+
+        :param estimate: previous estimate or None
+        :type estimate: list or None
+        :param float sample: measured delay in nanoseconds
+        :return: new estimate
+        :rtype: list
+        """
+        if estimate is None:
+            return [sample, sample / 2]
+        mean, dev = estimate
+        dev = 0.75 * dev + 0.25 * abs(sample - mean)
+        mean = 0.875 * mean + 0.125 * sample
+        return [mean, dev]
+
+    def timeout(self, estimate):
+        """
+        :return: timeout in nanoseconds, max_timeout without samples
+        :rtype: float
+        """
+        if estimate is None:
+            return self.max_timeout
+        mean, dev = estimate
+        return min(self.max_timeout, max(self.min_timeout, mean + 4 * dev))
+
+    @property
+    def first_timeout(self):
+        """Timeout for the first fragment after transmission"""
+        return self.timeout(self.first)
+
+    @property
+    def frame_timeout(self):
+        """Timeout after each received fragment"""
+        return self.timeout(self.gap)
+
+    def observe(self, t_tx, t_fragments):
+        """
+        Learn from a transaction
+
+        :param int t_tx: time.monotonic_ns after transmission
+        :param list t_fragments: time.monotonic_ns of each received fragment
+        """
+        if not t_fragments:
+            return
+        self.first = self.estimate(self.first, t_fragments[0] - t_tx)
+        for t_prev, t_next in zip(t_fragments, t_fragments[1:]):
+            self.gap = self.estimate(self.gap, t_next - t_prev)
+
+class InverterHealth:
+    """
+    Online / degraded / offline state of an inverter
+
+    A failed poll degrades an inverter, ``offline_after`` failed polls in
+    a row take it offline. Offline inverters are only probed, with
+    exponential backoff between probes, until they answer again.
+    """
+    ONLINE = 'online'
+    DEGRADED = 'degraded'
+    OFFLINE = 'offline'
+
+    offline_after = 3
+    min_backoff = 10
+    max_backoff = 600
+
+    def __init__(self, name=None):
+        """
+        :param name: inverter name for log messages
+        :type name: str or None
+        """
+        self.name = name
+        self.state = self.ONLINE
+        self.failures = 0
+        self.backoff = 0
+        self.next_probe = 0.0
+
+    @property
+    def offline(self):
+        """If the inverter is only probed"""
+        return self.state == self.OFFLINE
+
+    def due(self, now=None):
+        """
+        :param now: time.monotonic() (default now)
+        :type now: float or None
+        :return: if the inverter should be polled or probed now
+        :rtype: bool
+        """
+        if self.state != self.OFFLINE:
+            return True
+        if now is None:
+            now = time.monotonic()
+        return now >= self.next_probe
+
+    def record(self, answered, now=None):
+        """
+        Update state from a poll or probe result
+
+        :param bool answered: if the inverter did answer
+        :param now: time.monotonic() (default now)
+        :type now: float or None
+        :return: new state on a transition, else None
+        :rtype: str or None
+        """
+        if now is None:
+            now = time.monotonic()
+        state = self.state
+
+        if answered:
+            self.failures = 0
+            self.backoff = 0
+            self.state = self.ONLINE
+        else:
+            self.failures += 1
+            if self.state == self.OFFLINE:
+                self.backoff = min(self.backoff * 2, self.max_backoff)
+            elif self.failures >= self.offline_after:
+                self.state = self.OFFLINE
+                self.backoff = self.min_backoff
+            else:
+                self.state = self.DEGRADED
+            if self.state == self.OFFLINE:
+                self.next_probe = now + self.backoff
+
+        if self.state == state:
+            return None
+
+        if self.state == self.OFFLINE:
+            logging.warning(f'Inverter {self.name}: offline after {self.failures} failed polls, next probe in {self.backoff}s')
+        else:
+            logging.info(f'Inverter {self.name}: {state} -> {self.state}')
+        return self.state
+
+    def reset_backoff(self):
+        """Probe an offline inverter right away, backoff starts over from min_backoff"""
+        if self.state == self.OFFLINE:
+            self.backoff = self.min_backoff
+            self.next_probe = 0.0
+
+class ScheduledCommand:
+    """Pending request of a CommandScheduler"""
+    def __init__(self, command=None, alarm_id=0, request=None, priority=0):
+        """
+        :param command: set time request command, see InfoCommands
+        :type command: int or None
+        :param int alarm_id: alarm id for set time requests
+        :param request: prebuilt request packet, e.g. injected via mqtt
+        :type request: bytes or None
+        :param int priority: queue priority, lower goes first
+        """
+        self.command = command
+        self.alarm_id = alarm_id
+        self.request = request
+        self.priority = priority
+        self.t_queued = time.monotonic()
+
+    @property
+    def key(self):
+        """Identity for merging pending duplicates"""
+        return self.request if self.request is not None else self.command
+
+class CommandScheduler:
+    """
+    Thread safe per inverter command queues with priorities
+
+    Control and injected requests go before realtime data, realtime data
+    before alarms and hardware info. A request already pending for an
+    inverter is merged instead of queued twice; merged alarm requests
+    keep the highest alarm id.
+    """
+    CONTROL = 0
+    REALTIME = 1
+    INFO = 2
+
+    realtime_commands = (
+            InfoCommands.RealTimeRunData_Debug,
+            InfoCommands.RealTimeRunData_Reality,
+            InfoCommands.RealTimeRunData_A_Phase,
+            InfoCommands.RealTimeRunData_B_Phase,
+            InfoCommands.RealTimeRunData_C_Phase,
+            )
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queues = {}
+        self.pending = {}
+        self.stats = {}
+
+    def priority(self, command=None, request=None):
+        """
+        Default priority of a request
+
+        :param command: set time request command
+        :type command: int or None
+        :param request: prebuilt request packet
+        :type request: bytes or None
+        :rtype: int
+        """
+        if request is not None:
+            return self.CONTROL
+        if command in self.realtime_commands:
+            return self.REALTIME
+        return self.INFO
+
+    def __queues(self, inverter_ser):
+        """Deques per priority of an inverter, call with lock held"""
+        if inverter_ser not in self.queues:
+            self.queues[inverter_ser] = (deque(), deque(), deque())
+            self.pending[inverter_ser] = {}
+            self.stats[inverter_ser] = {'queued': 0, 'merged': 0, 'sent': 0, 'wait_avg': 0.0, 'wait_max': 0.0}
+        return self.queues[inverter_ser]
+
+    def put(self, inverter_ser, command=None, alarm_id=0, request=None, priority=None):
+        """
+        Queue a request for an inverter
+
+        :param inverter_ser: inverter serial
+        :type inverter_ser: str or int
+        :param command: set time request command, see InfoCommands
+        :type command: int or None
+        :param int alarm_id: alarm id for set time requests
+        :param request: prebuilt request packet, e.g. injected via mqtt
+        :type request: bytes or None
+        :param priority: override default priority
+        :type priority: int or None
+        :return: if queued, False if merged into a pending request
+        :rtype: bool
+        """
+        if priority is None:
+            priority = self.priority(command, request)
+        entry = ScheduledCommand(command=command, alarm_id=alarm_id, request=request, priority=priority)
+
+        with self.lock:
+            queues = self.__queues(inverter_ser)
+            pending = self.pending[inverter_ser]
+            stats = self.stats[inverter_ser]
+
+            queued = pending.get(entry.key, None)
+            if queued is not None:
+                queued.alarm_id = max(queued.alarm_id, alarm_id)
+                stats['merged'] += 1
+                return False
+
+            pending[entry.key] = entry
+            queues[priority].append(entry)
+            stats['queued'] += 1
+        return True
+
+    def get(self, inverter_ser, priorities=None):
+        """
+        Next request for an inverter
+
+        :param inverter_ser: inverter serial
+        :type inverter_ser: str or int
+        :param priorities: only take requests of these priorities, default all
+        :type priorities: list or None
+        :return: highest priority pending request or None
+        :rtype: ScheduledCommand or None
+        """
+        with self.lock:
+            queues = self.queues.get(inverter_ser, ())
+            for priority, prio_queue in enumerate(queues):
+                if prio_queue and (priorities is None or priority in priorities):
+                    entry = prio_queue.popleft()
+                    break
+            else:
+                return None
+
+            del self.pending[inverter_ser][entry.key]
+
+            stats = self.stats[inverter_ser]
+            wait = time.monotonic() - entry.t_queued
+            stats['sent'] += 1
+            stats['wait_avg'] = wait if stats['sent'] == 1 else 0.875 * stats['wait_avg'] + 0.125 * wait
+            stats['wait_max'] = max(stats['wait_max'], wait)
+        return entry
+
+    def depth(self, inverter_ser=None):
+        """
+        Number of pending requests
+
+        :param inverter_ser: inverter serial, all inverters if None
+        :type inverter_ser: str or int or None
+        :rtype: int
+        """
+        with self.lock:
+            if inverter_ser is not None:
+                return len(self.pending.get(inverter_ser, ()))
+            return sum(len(pending) for pending in self.pending.values())
+
+    def report(self):
+        """
+        Queue statistics per inverter
+
+        :return: depth, queued/merged/sent counts and wait times in seconds
+        :rtype: dict
+        """
+        with self.lock:
+            return {inverter_ser: dict(stats, depth=len(self.pending[inverter_ser]))
+                    for inverter_ser, stats in self.stats.items()}
+
+class PollDeadline:
+    """Cadence, deadline and statistics of one periodic command of an inverter"""
+    def __init__(self, inverter_ser, command, period, priority, now):
+        """
+        :param inverter_ser: inverter serial
+        :type inverter_ser: str or int
+        :param int command: set time request command, see InfoCommands
+        :param float period: configured cadence in seconds, 0 for every wakeup
+        :param int priority: CommandScheduler priority of the command
+        :param float now: time.monotonic() of the first deadline
+        """
+        self.inverter_ser = inverter_ser
+        self.command = command
+        self.period = period
+        self.priority = priority
+        self.stretch = 1            # cadence multiplier while over budget
+        self.deadline = now
+        self.runs = 0
+        self.missed = 0
+        self.jitter_avg = 0.0
+        self.jitter_max = 0.0
+        self.last_sample = None     # time.monotonic() of the last response
+
+    @property
+    def cadence(self):
+        """Current cadence in seconds"""
+        return self.period * self.stretch
+
+class PollSchedule:
+    """
+    Drift free per inverter, per command poll deadlines
+
+    Each periodic command of an inverter has its own cadence, e.g.
+    realtime data every interval seconds and hardware info hourly; alarms
+    are requested on event count changes, not on a cadence. The next
+    deadline is the last deadline plus the cadence, so a slow poll cycle
+    delays one sample instead of shifting all later ones. Deadlines that
+    passed during an overrun are skipped and counted as missed.
+
+    The radios are over budget when poll cycles keep them busy for more
+    than ``budget`` of the time, measured over windows of the shortest
+    realtime cadence. Then the cadence of low priority commands doubles,
+    up to ``max_stretch`` times the configured one, and halves again once
+    the radios are busy for less than half the budget.
+    """
+    budget = 0.8
+    max_stretch = 16
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tasks = {}
+        self.stretch = 1
+        self.overruns = 0
+        self.window_start = None
+        self.window_busy = 0.0
+
+    def add(self, inverter_ser, command, period, now=None):
+        """
+        Poll a command periodically, first deadline is now
+
+        :param inverter_ser: inverter serial
+        :type inverter_ser: str or int
+        :param int command: set time request command, see InfoCommands
+        :param float period: cadence in seconds, 0 for every wakeup
+        :param now: time.monotonic() (default now)
+        :type now: float or None
+        """
+        if now is None:
+            now = time.monotonic()
+        priority = CommandScheduler.REALTIME if command in CommandScheduler.realtime_commands else CommandScheduler.INFO
+        task = PollDeadline(inverter_ser, command, period, priority, now)
+        if priority == CommandScheduler.INFO:
+            task.stretch = self.stretch
+        with self.lock:
+            self.tasks[(inverter_ser, command)] = task
+
+    def wait(self, now=None):
+        """
+        :param now: time.monotonic() (default now)
+        :type now: float or None
+        :return: seconds until the next deadline, 0 if one is due
+        :rtype: float
+        """
+        if now is None:
+            now = time.monotonic()
+        with self.lock:
+            if not self.tasks:
+                return 0.0
+            return max(0.0, min(task.deadline for task in self.tasks.values()) - now)
+
+    def due(self, now=None):
+        """
+        Take all due commands and advance their deadlines
+
+        :param now: time.monotonic() (default now)
+        :type now: float or None
+        :return: due deadlines, realtime data first
+        :rtype: list of PollDeadline
+        """
+        if now is None:
+            now = time.monotonic()
+        due = []
+        with self.lock:
+            for task in self.tasks.values():
+                if task.deadline > now:
+                    continue
+                late = now - task.deadline
+                cadence = task.cadence
+                if cadence > 0:
+                    missed = int(late // cadence)
+                    task.missed += missed
+                    task.deadline += (missed + 1) * cadence
+                    late -= missed * cadence
+                else:
+                    task.deadline = now
+                task.runs += 1
+                task.jitter_avg = late if task.runs == 1 else 0.875 * task.jitter_avg + 0.125 * late
+                task.jitter_max = max(task.jitter_max, late)
+                due.append(task)
+        due.sort(key=lambda task: task.priority)
+        return due
+
+    def sampled(self, inverter_ser, command, now=None):
+        """
+        Record a response to a scheduled command
+
+        :param inverter_ser: inverter serial
+        :type inverter_ser: str or int
+        :param int command: requested command
+        :param now: time.monotonic() (default now)
+        :type now: float or None
+        """
+        if now is None:
+            now = time.monotonic()
+        with self.lock:
+            task = self.tasks.get((inverter_ser, command))
+            if task is not None:
+                task.last_sample = now
+
+    def cycle(self, busy, now=None):
+        """
+        Adapt low priority cadence to the radio load, call after each poll cycle
+
+        :param float busy: seconds the poll cycle took
+        :param now: time.monotonic() at the end of the cycle (default now)
+        :type now: float or None
+        :return: new cadence multiplier of low priority commands on a change, else None
+        :rtype: int or None
+        """
+        if now is None:
+            now = time.monotonic()
+        with self.lock:
+            if self.window_start is None:
+                self.window_start = now - busy
+            self.window_busy += busy
+
+            periods = [task.period for task in self.tasks.values()
+                       if task.priority == CommandScheduler.REALTIME and task.period > 0]
+            elapsed = now - self.window_start
+            if not periods or elapsed < min(periods):
+                return None
+            load = self.window_busy / elapsed
+            self.window_start = now
+            self.window_busy = 0.0
+
+            stretch = self.stretch
+            if load > self.budget:
+                self.overruns += 1
+                stretch = min(stretch * 2, self.max_stretch)
+            elif load < self.budget / 2:
+                stretch = max(stretch // 2, 1)
+            if stretch == self.stretch:
+                return None
+
+            self.stretch = stretch
+            for task in self.tasks.values():
+                if task.priority == CommandScheduler.INFO:
+                    task.stretch = stretch
+
+        logging.info(f'Radios busy {load:.0%} of the time, budget {self.budget:.0%}, low priority cadence x{stretch}')
+        return stretch
+
+    def restart(self, now=None):
+        """
+        Make all commands due now without counting missed deadlines, e.g.
+        after sleeping through the night
+
+        :param now: time.monotonic() (default now)
+        :type now: float or None
+        """
+        if now is None:
+            now = time.monotonic()
+        with self.lock:
+            for task in self.tasks.values():
+                task.deadline = now
+
+    def report(self, now=None):
+        """
+        Deadline statistics per inverter and command
+
+        :param now: time.monotonic() (default now)
+        :type now: float or None
+        :return: {inverter_ser: {command: stats}} with cadence, runs, missed
+                 deadlines, jitter avg/max and sample age in seconds, age None
+                 if never answered
+        :rtype: dict
+        """
+        if now is None:
+            now = time.monotonic()
+        report = {}
+        with self.lock:
+            for task in self.tasks.values():
+                report.setdefault(task.inverter_ser, {})[task.command] = {
+                        'cadence': task.cadence,
+                        'runs': task.runs,
+                        'missed': task.missed,
+                        'jitter_avg': task.jitter_avg,
+                        'jitter_max': task.jitter_max,
+                        'age': now - task.last_sample if task.last_sample is not None else None,
+                        }
+        return report
+
+class AirtimeAccount:
+    """Airtime allowance of one inverter and command class in a poll cycle"""
+    def __init__(self, budget, inverter_ser, priority, packets=None, seconds=None):
+        """
+        :param AirtimeBudget budget: budget the account reports to
+        :param inverter_ser: inverter serial
+        :type inverter_ser: str or int
+        :param int priority: CommandScheduler priority of the command class
+        :param packets: transmissions allowed, None for no limit
+        :type packets: float or None
+        :param seconds: radio time allowed, None for no limit
+        :type seconds: float or None
+        """
+        self.budget = budget
+        self.inverter_ser = inverter_ser
+        self.priority = priority
+        self.packets = packets
+        self.seconds = seconds
+        self.packets_used = 0
+        self.seconds_used = 0.0
+
+    def remaining(self):
+        """
+        :return: whole transmissions left, None for no limit, 0 when the time is used up
+        :rtype: int or None
+        """
+        if self.seconds is not None and self.seconds_used >= self.seconds:
+            return 0
+        if self.packets is None:
+            return None
+        return max(int(self.packets - self.packets_used), 0)
+
+    def grant(self, packets):
+        """
+        Number of packets that may be transmitted, counts a refusal if not all
+
+        :param int packets: transmissions wanted
+        :return: transmissions allowed, at most packets
+        :rtype: int
+        """
+        remaining = self.remaining()
+        if remaining is None or remaining >= packets:
+            return packets
+        self.budget.exhausted(self)
+        return remaining
+
+    def spend(self, packets, seconds):
+        """
+        Charge transmissions and their receive window
+
+        :param int packets: packets transmitted
+        :param float seconds: radio time from first transmission to end of receive window
+        """
+        self.packets_used += packets
+        self.seconds_used += seconds
+        self.budget.spent(self, packets, seconds)
+
+class AirtimeBudget:
+    """
+    Airtime and time budget of a poll cycle, split across inverters and
+    command classes
+
+    Each polled inverter gets an equal part of the cycle's transmissions
+    and radio time, split by ``shares`` among realtime data and low
+    priority commands. Control and injected requests are counted, but
+    not limited. A transaction stops transmitting when its account is
+    used up, so one unresponsive inverter cannot use the whole cycle.
+    Send retries are weighted by the inverter's recent success rate.
+    """
+    shares = {
+            CommandScheduler.REALTIME: 0.75,
+            CommandScheduler.INFO: 0.25,
+            }
+
+    def __init__(self, packets=None, seconds=None, success_rate=None):
+        """
+        :param packets: transmissions per poll cycle, None for no limit
+        :type packets: int or None
+        :param seconds: radio time per poll cycle (summed over radios), None for no limit
+        :type seconds: float or None
+        :param success_rate: callable(inverter_ser) -> recent poll success rate 0.0..1.0
+        :type success_rate: callable or None
+        """
+        self.lock = threading.Lock()
+        self.packets = packets
+        self.seconds = seconds
+        self.success_rate = success_rate
+        self.accounts = {}
+        self.usage = {}
+        self.cycles = 0
+
+    def start_cycle(self, inverter_sers):
+        """
+        Split the budget among the inverters polled in the next cycle
+
+        :param list inverter_sers: serials of the polled inverters
+        """
+        share = 1 / len(inverter_sers) if inverter_sers else 0
+        with self.lock:
+            self.cycles += 1
+            self.accounts = {}
+            for inverter_ser in inverter_sers:
+                usage = self.__usage(inverter_ser)
+                usage['cycles'] += 1
+                usage['packets_budget'] += self.packets * share if self.packets is not None else 0
+                usage['seconds_budget'] += self.seconds * share if self.seconds is not None else 0
+                for priority, class_share in self.shares.items():
+                    self.accounts[(inverter_ser, priority)] = AirtimeAccount(self, inverter_ser, priority,
+                            packets=self.packets * share * class_share if self.packets is not None else None,
+                            seconds=self.seconds * share * class_share if self.seconds is not None else None)
+
+    def account(self, inverter_ser, priority):
+        """
+        Account of an inverter and command class in the current cycle
+
+        :param inverter_ser: inverter serial
+        :type inverter_ser: str or int
+        :param int priority: CommandScheduler priority of the command
+        :return: account, unlimited for control requests and inverters not in the cycle
+        :rtype: AirtimeAccount
+        """
+        with self.lock:
+            account = self.accounts.get((inverter_ser, priority))
+            if account is None:
+                account = self.accounts[(inverter_ser, priority)] = AirtimeAccount(self, inverter_ser, priority)
+            return account
+
+    def priorities(self, inverter_ser):
+        """
+        Command classes of an inverter with allowance left
+
+        :param inverter_ser: inverter serial
+        :type inverter_ser: str or int
+        :return: CommandScheduler priorities
+        :rtype: list
+        """
+        return [priority for priority in (CommandScheduler.CONTROL, CommandScheduler.REALTIME, CommandScheduler.INFO)
+                if self.account(inverter_ser, priority).remaining() != 0]
+
+    def retries(self, inverter_ser, retries):
+        """
+        Send retries weighted by the inverter's recent success rate
+
+        :param inverter_ser: inverter serial
+        :type inverter_ser: str or int
+        :param int retries: configured transmit retries
+        :return: retries, at least 1
+        :rtype: int
+        """
+        if self.success_rate is None:
+            return retries
+        return weighted_retries(retries, self.success_rate(inverter_ser))
+
+    def __usage(self, inverter_ser):
+        """Usage counters of an inverter, call with lock held"""
+        if inverter_ser not in self.usage:
+            self.usage[inverter_ser] = {'cycles': 0, 'packets': 0, 'seconds': 0.0,
+                    'packets_budget': 0.0, 'seconds_budget': 0.0, 'exhausted': 0}
+        return self.usage[inverter_ser]
+
+    def spent(self, account, packets, seconds):
+        """Add a charge of an account to the usage of its inverter"""
+        with self.lock:
+            usage = self.__usage(account.inverter_ser)
+            usage['packets'] += packets
+            usage['seconds'] += seconds
+
+    def exhausted(self, account):
+        """Count a refused transmission of an account"""
+        with self.lock:
+            self.__usage(account.inverter_ser)['exhausted'] += 1
+        if HOYMILES_TRANSACTION_LOGGING:
+            logging.debug(f'Inverter {account.inverter_ser}: airtime budget of priority {account.priority} used up'
+                    f' ({account.packets_used} packets, {account.seconds_used:.3f}s)')
+
+    def report(self):
+        """
+        Budget usage per inverter since start
+
+        :return: {inverter_ser: usage} with cycles, packets and seconds used
+                 and budgeted, refused transmissions, per cycle averages and
+                 the larger used share of packet and time budget, None if unlimited
+        :rtype: dict
+        """
+        with self.lock:
+            report = {}
+            for inverter_ser, usage in self.usage.items():
+                cycles = max(usage['cycles'], 1)
+                used = [usage[key] / usage[f'{key}_budget'] for key in ('packets', 'seconds') if usage[f'{key}_budget']]
+                report[inverter_ser] = dict(usage,
+                        packets_per_cycle=usage['packets'] / cycles,
+                        seconds_per_cycle=usage['seconds'] / cycles,
+                        used=max(used) if used else None)
+            return report
+
+class InverterSession:
+    """
+    Long lived state of one configured inverter
+
+    Resolves the inverter config and addresses once, keeps its own
+    response timer and health, so polling needs neither config lookups nor
+    address math. Requests are built with the packet builder of the
+    calling thread, so the radio workers and the mqtt thread can build
+    them concurrently.
+    """
+    def __init__(self, inverter, dtu_ser):
+        """
+        :param dict inverter: inverter config from ahoy.yml
+        :param dtu_ser: DTU serial
+        :type dtu_ser: str or int
+        """
+        self.config = inverter
+        self.serial = inverter.get('serial')
+        self.name = inverter.get('name', 'hoymiles')
+        self.strings = inverter.get('strings', None)
+        self.txpower = inverter.get('txpower', None)
+        self.retransmit_budget = inverter.get('retransmit_budget', None)
+        self.radio_id = inverter.get('radio', None)
+        self.mqtt_topic = inverter.get('mqtt', {}).get('topic', None)
+        self.send_raw_enabled = inverter.get('mqtt', {}).get('send_raw_enabled', False)
+        self.max_silence = inverter.get('max_silence', 0)
+        self.dtu_ser = dtu_ser
+
+        # hm addresses as in InverterPacketFragment src / dst
+        self.inverter_addr = struct.unpack('>L', ser_to_hm_addr(self.serial))[0]
+        self.dtu_addr = struct.unpack('>L', ser_to_hm_addr(dtu_ser))[0]
+        self.header = request_header(dtu_ser, self.serial)
+
+        try:
+            self.model = ser_to_model(self.serial)
+        except NotImplementedError as e:
+            logging.warning(f'Inverter {self.serial}: {e} - using generic decoder')
+            self.model = None
+        self.decoders = {}
+
+        self.timer = ResponseTimer()
+        self.health = InverterHealth(f'{self.name}/{self.serial}')
+        self.event_message_index = 0    # last alarm id fetched
+        self.event_count = None         # alarm count of the last status data
+        self.last_payloads = {}         # command: (payload, monotonic time of output)
+        self.unchanged_count = 0
+        self.fields = None              # status fields the outputs store, None for all
+
+    def unchanged(self, command, payload, now=None):
+        """
+        Check if a payload repeats the last one passed on for its command
+
+        Payloads are compared byte for byte, crc included. A repeated
+        payload counts as unchanged until max_silence seconds passed since
+        the last one passed on, then it is passed on as heartbeat. With
+        max_silence 0 nothing is unchanged.
+
+        :param int command: requested command
+        :param bytes payload: response payload
+        :param now: monotonic time in seconds, default time.monotonic()
+        :type now: float or None
+        :return: if decoding and output can be skipped
+        :rtype: bool
+        """
+        if not self.max_silence:
+            return False
+        if now is None:
+            now = time.monotonic()
+
+        last = self.last_payloads.get(command)
+        if last is not None and last[0] == payload and now - last[1] < self.max_silence:
+            self.unchanged_count += 1
+            return True
+        self.last_payloads[command] = (payload, now)
+        return False
+
+    def request(self, payload):
+        """
+        Build request packet from framed payload
+
+        :param bytes payload: payload with Modbus CRC16, up to 17 bytes
+        :return: esb packet
+        :rtype: bytes
+        :raises ValueError: if payload exceeds the mtu
+        """
+        return packet_builder().fragment(payload, header=self.header)
+
+    def time_request(self, cmdId, alarm_id=0):
+        """
+        Build set time request packet, like compose_send_time_payload
+
+        :param int cmdId: command to request
+        :param int alarm_id: last known alarm id
+        :return: esb packet
+        :rtype: bytes
+        """
+        return packet_builder().time_request(cmdId, alarm_id=alarm_id, header=self.header)
+
+    def scheduled_request(self, entry):
+        """
+        Build request packet for a scheduled command
+
+        :param ScheduledCommand entry: entry from CommandScheduler.get
+        :return: esb packet
+        :rtype: bytes
+        """
+        if entry.request is not None:
+            return entry.request
+        return self.time_request(entry.command, alarm_id=entry.alarm_id)
+
+    def retransmit_request(self, frame_id):
+        """
+        Build retransmit request packet
+
+        :param int frame_id: frame id to request again
+        :return: esb packet
+        :rtype: bytes
+        """
+        return packet_builder().fragment(b'', seq=0x80 + frame_id, header=self.header)
 
-    # indices from esp8266 hmRadio.h / sendTimePacket()
-    payload = struct.pack('>B', cmdId)                # 10
-    payload = payload + b'\x00'                       # 11
-    payload = payload + struct.pack('>L', timestamp)  # 12..15 big-endian: msb at low address
-    payload = payload + b'\x00\x00'                   # 16..17
-    payload = payload + struct.pack('>H', alarm_id)   # 18..19
-    payload = payload + b'\x00\x00\x00\x00'           # 20..23
+    def decoder(self, command):
+        """
+        Decoder class for a request command
 
-    return frame_payload(payload)
+        :param int command: request command byte
+        :return: decoder class
+        :rtype: type
+        """
+        try:
+            return self.decoders[command]
+        except KeyError:
+            device = find_decoder(self.model, command) if self.model else DebugDecodeAny
+            self.decoders[command] = device
+            return device
+
+    def decode(self, payload, request, time_rx=None):
+        """
+        Decode a reassembled response payload
+
+        :param bytes payload: response payload
+        :param bytes request: request packet the payload answers
+        :param time_rx: datetime when payload was received
+        :type time_rx: datetime
+        :return: payload decoder instance
+        :rtype: object
+        """
+        return self.decoder(request[10])(payload,
+                time_rx=time_rx if time_rx else datetime.now(),
+                inverter_ser=self.serial,
+                inverter_name=self.name,
+                dtu_ser=self.dtu_ser,
+                strings=self.strings,
+                fields=self.fields)
 
 class InverterTransaction:
     """
     Inverter transaction buffer, implements transport-layer functions while
     communicating with Hoymiles inverters
     """
-    tx_queue = []
-    scratch = []
+    tx_queue = None
+    scratch = None
     inverter_ser = None
     inverter_addr = None
     dtu_ser = None
@@ -596,6 +2237,10 @@ class InverterTransaction:
 
     radio = None
     txpower = None
+    timer = None
+    airtime = None
+    retransmit_budget = 10
+    retransmits = 0
 
     def __init__(self,
             request_time=None,
@@ -612,22 +2257,45 @@ class InverterTransaction:
         :type inverter_ser: str
         :param dtu_ser: DTU serial
         :type dtu_ser: str
-        :param radio: HoymilesNRF instance to use
-        :type radio: HoymilesNRF or None
+        :param radio: radio transport to use
+        :type radio: RadioTransport or None
+        :param timer: adaptive receive timeouts of the inverter
+        :type timer: ResponseTimer or None
+        :param retransmit_budget: max fragments to request again in this transaction (default 10)
+        :type retransmit_budget: int or None
+        :param airtime: cycle allowance all transmissions are charged to
+        :type airtime: AirtimeAccount or None
+        :param session: inverter session, provides addresses, timer and transmit settings
+        :type session: InverterSession or None
         """
 
+        self.session = params.get('session', None)
+        if self.session:
+            params.setdefault('txpower', self.session.txpower)
+            params.setdefault('timer', self.session.timer)
+            params.setdefault('retransmit_budget', self.session.retransmit_budget)
+
         if radio:
             self.radio = radio
 
             if 'txpower' in params:
                 self.txpower = params['txpower']
 
+        self.timer = params.get('timer', None)
+        self.airtime = params.get('airtime', None)
+
+        if params.get('retransmit_budget', None) is not None:
+            self.retransmit_budget = params['retransmit_budget']
+        self.retransmits = 0
+
         if not request_time:
             request_time=datetime.now()
 
+        self.tx_queue = []
         self.scratch = []
-        if 'scratch' in params:
-            self.scratch = params['scratch']
+        self.buffers = {}
+        for frame in params.get('scratch', []):
+            self.frame_append(frame)
 
         self.inverter_ser = inverter_ser
         if inverter_ser:
@@ -641,13 +2309,18 @@ class InverterTransaction:
         if 'request' in params:
             self.request = params['request']
             self.queue_tx(self.request)
-            self.inverter_addr, self.dtu_addr, seq, self.req_type = struct.unpack('>LLBB', params['request'][1:11])
+            if self.session:
+                self.inverter_addr = self.session.inverter_addr
+                self.dtu_addr = self.session.dtu_addr
+                self.req_type = self.request[10]
+            else:
+                self.inverter_addr, self.dtu_addr, seq, self.req_type = struct.unpack('>LLBB', self.request[1:11])
         self.request_time = request_time
 
     def rxtx(self):
         """
-        Transmit next packet from tx_queue if available
-        and wait for responses
+        Transmit all packets from tx_queue, each one followed by its
+        receive window, inverters only answer the latest request
 
         :return: if we got contact
         :rtype: bool
@@ -658,35 +2331,98 @@ class InverterTransaction:
         if len(self.tx_queue) == 0:
             return False
 
-        packet = self.tx_queue.pop(0)
+        packets = self.tx_queue
+        self.tx_queue = []
 
-        self.radio.transmit(packet, txpower=self.txpower)
+        if self.airtime is not None:
+            packets = packets[:self.airtime.grant(len(packets))]
+            if not packets:
+                return False
 
+        t_start = time.monotonic_ns()
         wait = False
+        sent = 0
+        for packet in packets:
+            self.radio.transmit(packet, txpower=self.txpower)
+            sent += 1
+            if self.__receive():
+                wait = True
+
+            # skip retransmit requests of fragments that arrived meanwhile
+            if self.is_complete():
+                break
+
+        if self.airtime is not None:
+            self.airtime.spend(sent, (time.monotonic_ns() - t_start) / 1e9)
+
+        return wait
+
+    def __receive(self):
+        """
+        Receive fragments until timeout or until the payload is complete
+
+        :return: if anything was received
+        :rtype: bool
+        """
+        t_tx = time.monotonic_ns()
+
+        timeouts = {}
+        if self.timer:
+            timeouts = {'timeout': self.timer.first_timeout, 'frame_timeout': self.timer.frame_timeout}
+
+        t_fragments = []
         try:
-            for response in self.radio.receive():
+            for response in self.radio.receive(**timeouts):
+                t_fragments.append(time.monotonic_ns())
                 if HOYMILES_TRANSACTION_LOGGING:
                     logging.debug(response)
 
                 self.frame_append(response)
-                wait = True
+
+                # stop listening as soon as the payload is complete
+                if self.is_complete():
+                    break
         except TimeoutError:
             pass
         except BufferError as e:
             logging.warning(f'Buffer error {e}')
             pass
 
-        return wait
+        if self.timer:
+            self.timer.observe(t_tx, t_fragments)
+
+        return len(t_fragments) > 0
 
     def frame_append(self, frame):
         """
         Append received raw frame to local scratch buffer
+        and the reassembly buffer of its sender
 
-        :param bytes frame: Received ESB frame
+        :param InverterPacketFragment frame: Received ESB frame
         :return None
         """
         self.scratch.append(frame)
 
+        src = frame.src
+        if src not in self.buffers:
+            self.buffers[src] = ReassemblyBuffer()
+        self.buffers[src].add(frame)
+
+    def is_complete(self, src=None):
+        """
+        Check if the end frame and all frames before it have been received
+
+        :param src: filter frames by inverter hm_address (default self.inverter_address)
+        :type src: int
+        :return: if get_payload can reassemble the payload
+        :rtype: bool
+        """
+        if not src:
+            src = self.inverter_addr
+
+        buffer = self.buffers.get(src, None)
+        return buffer is not None and buffer.complete
+
     def queue_tx(self, frame):
         """
         Enqueue packet for transmission if radio is available
@@ -717,57 +2453,60 @@ class InverterTransaction:
         if not src:
             src = self.inverter_addr
 
-        # Collect all frames from source_address src
-        frames = [frame for frame in self.scratch if frame.src == src]
+        buffer = self.buffers.get(src, None)
+        if buffer is None:
+            buffer = ReassemblyBuffer()
 
-        tr_len = 0
-        # Find end frame and extract message frame count
-        try:
-            end_frame = next(frame for frame in frames if frame.seq > 0x80)
-            self.time_rx = end_frame.time_rx
-            tr_len = end_frame.seq - 0x80
-        except StopIteration:
-            seq_last = max(frames, key=lambda frame:frame.seq).seq if len(frames) else 0
-            self.__retransmit_frame(seq_last + 1)
-            raise BufferError(f'Missing packet: Last packet {seq_last + 1}')
-
-        # Rebuild payload from unordered frames
-        payload = b''
-        for frame_id in range(1, tr_len):
-            try:
-                data_frame = next(item for item in frames if item.seq == frame_id)
-                payload = payload + data_frame.data
-            except StopIteration:
-                self.__retransmit_frame(frame_id)
-                raise BufferError(f'Frame {frame_id} missing: Request Retransmit')
+        # Find end frame and extract message frame count,
+        # request all missing frames at once
+        if buffer.end_id is None:
+            self.__retransmit_frames(buffer.missing())
+            raise BufferError(f'Missing packet: Last packet {buffer.max_id + 1}')
+        self.time_rx = buffer.end_frame.time_rx
 
-        payload = payload + end_frame.data
+        if not buffer.complete:
+            missing = buffer.missing()
+            self.__retransmit_frames(missing)
+            raise BufferError(f'Frames {missing} missing: Request Retransmit')
 
         # check crc
-        pcrc = struct.unpack('>H', payload[-2:])[0]
-        if f_crc_m(payload[:-2]) != pcrc:
+        if not buffer.crc_valid():
             raise ValueError('Payload failed CRC check.')
 
-        return payload
+        return buffer.payload()
 
-    def __retransmit_frame(self, frame_id):
+    def __retransmit_frames(self, frame_ids):
         """
-        Build and queue retransmit request
+        Build and queue retransmit requests within the retransmit budget
 
-        :param int frame_id: frame id to re-schedule
-        :return: if successful scheduled
+        :param list frame_ids: frame ids to re-schedule
+        :return: if at least one request was scheduled
         :rtype: bool
         """
 
         if not self.radio:
-            return
+            return False
 
-        packet = compose_esb_fragment(b'',
-                seq=int(0x80 + frame_id).to_bytes(1, 'big'),
-                src=self.dtu_ser,
-                dst=self.inverter_ser)
+        frame_ids = frame_ids[:max(self.retransmit_budget - self.retransmits, 0)]
+        if frame_ids and self.airtime is not None:
+            frame_ids = frame_ids[:self.airtime.grant(len(frame_ids))]
+        if not frame_ids:
+            if HOYMILES_TRANSACTION_LOGGING:
+                logging.debug(f'Retransmit budget of {self.retransmit_budget} fragments used up')
+            return False
 
-        return self.queue_tx(packet)
+        for frame_id in frame_ids:
+            if self.session:
+                packet = self.session.retransmit_request(frame_id)
+            else:
+                packet = compose_esb_fragment(b'',
+                        seq=int(0x80 + frame_id).to_bytes(1, 'big'),
+                        src=self.dtu_ser,
+                        dst=self.inverter_ser)
+            self.queue_tx(packet)
+        self.retransmits += len(frame_ids)
+
+        return True
 
     def __str__(self):
         """
@@ -787,4 +2526,4 @@ def hexify_payload(byte_var):
     :return: two-byte while-space padded byte representation
     :rtype: str
     """
-    return ' '.join([f"{b:02x}" for b in byte_var])
+    return hexify(byte_var)
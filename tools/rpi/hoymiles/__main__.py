@@ -7,9 +7,9 @@ Hoymiles micro-inverters main application
 
 import sys
 import struct
-from enum import IntEnum
 import re
 import time
+import threading
 import traceback
 from datetime import datetime
 from datetime import timedelta
@@ -18,6 +18,7 @@ import argparse
 import yaml
 from yaml.loader import SafeLoader
 import hoymiles
+from hoymiles import InfoCommands
 import logging
 from logging.handlers import RotatingFileHandler
 
@@ -40,74 +41,187 @@ def signal_handler(sig_num, frame):
   if volkszaehler_client:
      volkszaehler_client.disco()
 
+  if state_store:
+     state_store.save(force=True)
+
   sys.exit(0)
 
-signal(SIGINT,  signal_handler)   # Interrupt from keyboard (CTRL + C)
-signal(SIGTERM, signal_handler)   # Signal Handler from terminating processes
-signal(SIGHUP,  signal_handler)   # Hangup detected on controlling terminal or death of controlling process
-# signal(SIGKILL, signal_handler)   # Signal Handler SIGKILL and SIGSTOP cannot be caught, blocked, or ignored!!
+# only when run as the gateway, not when imported, e.g. by the tests
+if __name__ == '__main__':
+    signal(SIGINT,  signal_handler)   # Interrupt from keyboard (CTRL + C)
+    signal(SIGTERM, signal_handler)   # Signal Handler from terminating processes
+    signal(SIGHUP,  signal_handler)   # Hangup detected on controlling terminal or death of controlling process
+    # signal(SIGKILL, signal_handler)   # Signal Handler SIGKILL and SIGSTOP cannot be caught, blocked, or ignored!!
 ################################################################################
 ################################################################################
 
-class InfoCommands(IntEnum):
-    InverterDevInform_Simple = 0  # 0x00
-    InverterDevInform_All = 1     # 0x01
-    GridOnProFilePara = 2         # 0x02
-    HardWareConfig = 3            # 0x03
-    SimpleCalibrationPara = 4     # 0x04
-    SystemConfigPara = 5          # 0x05
-    RealTimeRunData_Debug = 11    # 0x0b
-    RealTimeRunData_Reality = 12  # 0x0c
-    RealTimeRunData_A_Phase = 13  # 0x0d
-    RealTimeRunData_B_Phase = 14  # 0x0e
-    RealTimeRunData_C_Phase = 15  # 0x0f
-    AlarmData = 17                # 0x11, Alarm data - all unsent alarms
-    AlarmUpdate = 18              # 0x12, Alarm data - all pending alarms
-    RecordData = 19               # 0x13
-    InternalData = 20             # 0x14
-    GetLossRate = 21              # 0x15
-    GetSelfCheckState = 30        # 0x1e
-    InitDataState = 0xff
-
 class SunsetHandler:
+    """
+    Night mode from precomputed sun times
+
+    From dusk to dawn there is no radio traffic, the main loop wakes up
+    every ``wakeup`` seconds at most. Within ``twilight`` seconds around
+    sunrise, while no inverter is online, inverters get a single probe
+    request every ``probe_interval`` seconds and full polling starts with
+    the first answer. Within twilight seconds around sunset polling goes
+    on until every inverter is offline, then the night starts. On polar
+    days polling goes on, days without sunrise are night, with wakeups
+    every ``probe_interval`` seconds.
+    """
+    DAY = 'day'
+    DAWN = 'dawn'
+    DUSK = 'dusk'
+    NIGHT = 'night'
+
+    days_ahead = 7
+
     def __init__(self, sunset_config):
         self.suntimes = None
+        self.sun_days = {}
+        self.polar_days = set()
+        self.no_sunrise = False
+        self.state = self.DAY
         if sunset_config and sunset_config.get('disabled', True) == False:
             latitude = sunset_config.get('latitude')
             longitude = sunset_config.get('longitude')
             altitude = sunset_config.get('altitude')
             self.suntimes = SunTimes(longitude=longitude, latitude=latitude, altitude=altitude)
-            self.nextSunset = self.suntimes.setutc(datetime.utcnow())
-            logging.info (f'Todays sunset is at {self.nextSunset} UTC')
+            self.twilight = timedelta(seconds=sunset_config.get('twilight', 1800))
+            self.probe_interval = sunset_config.get('probe_interval', 60)
+            self.wakeup = sunset_config.get('wakeup', 300)
+            sunrise, sunset = self.sun_times(datetime.utcnow().date())
+            logging.info (f'Todays sunrise is at {sunrise} UTC, sunset is at {sunset} UTC')
         else:
             logging.info('Sunset disabled.')
 
-    def checkWaitForSunrise(self):
+    def sun_times(self, day):
+        """
+        Sunrise and sunset of a day, computed for the coming days at once
+
+        :param date day: UTC date
+        :return: sunrise and sunset in UTC, None for both on polar days and
+                 nights, see polar_days
+        :rtype: tuple
+        """
+        if day not in self.sun_days:
+            self.sun_days = {}
+            self.polar_days = set()
+            for offset in range(self.days_ahead):
+                coming = day + timedelta(days=offset)
+                sunrise = self.suntimes.riseutc(coming)
+                sunset = self.suntimes.setutc(coming)
+                if isinstance(sunrise, datetime) and isinstance(sunset, datetime):
+                    self.sun_days[coming] = (sunrise, sunset)
+                else:
+                    # suntimes returns 'PD' on polar days, 'PN' on polar nights
+                    self.sun_days[coming] = (None, None)
+                    if sunrise == 'PD' or sunset == 'PD':
+                        self.polar_days.add(coming)
+        return self.sun_days[day]
+
+    def next_dawn(self, now):
+        """
+        :param datetime now: UTC time
+        :return: start of the next twilight before sunrise in UTC, None
+                 without sunrise in the coming days
+        :rtype: datetime or None
+        """
+        for offset in range(self.days_ahead):
+            sunrise, sunset = self.sun_times(now.date() + timedelta(days=offset))
+            if sunrise is not None and sunrise - self.twilight > now:
+                return sunrise - self.twilight
+        return None
+
+    def phase(self, now):
+        """
+        :param datetime now: UTC time
+        :return: DAY, DAWN, DUSK or NIGHT by the sun alone
+        :rtype: str
+        """
+        sunrise, sunset = self.sun_times(now.date())
+        if sunrise is None:
+            if now.date() in self.polar_days:
+                self.no_sunrise = False
+                return self.DAY
+            if not self.no_sunrise:
+                logging.warning(f'No sunrise on {now.date()} UTC, night mode with wakeups every {self.probe_interval} seconds')
+                self.no_sunrise = True
+            return self.NIGHT
+        self.no_sunrise = False
+        if now < sunrise - self.twilight:
+            return self.NIGHT
+        if now < sunrise + self.twilight:
+            return self.DAWN
+        if now < sunset - self.twilight:
+            return self.DAY
+        if now < sunset + self.twilight:
+            return self.DUSK
+        return self.NIGHT
+
+    def mode(self, online, now=None):
+        """
+        Polling mode, logs changes
+
+        :param bool online: if any inverter is not offline
+        :param now: UTC time (default now)
+        :type now: datetime or None
+        :return: DAY for full polling, DAWN for probing, NIGHT for no radio traffic
+        :rtype: str
+        """
         if not self.suntimes:
-            return
-        # if the sunset already happened for today
-        now = datetime.utcnow()
-        if self.nextSunset < now:
-            # wait until the sun rises again. if it's already after midnight, this will be today
-            nextSunrise = self.suntimes.riseutc(now)
-            if nextSunrise < now:
-                tomorrow = now + timedelta(days=1)
-                nextSunrise = self.suntimes.riseutc(tomorrow)
-            self.nextSunset = self.suntimes.setutc(nextSunrise)
-            time_to_sleep = int((nextSunrise - datetime.utcnow()).total_seconds())
-            logging.info (f'Next sunrise is at {nextSunrise} UTC, next sunset is at {self.nextSunset} UTC, sleeping for {time_to_sleep} seconds.')
-            if time_to_sleep > 0:
-                time.sleep(time_to_sleep)
-                logging.info (f'Woke up...')
+            return self.DAY
+        if now is None:
+            now = datetime.utcnow()
+
+        phase = self.phase(now)
+        if phase == self.DAWN:
+            state = self.DAY if online else self.DAWN
+        elif phase == self.DUSK:
+            state = self.DAY if online and self.state != self.NIGHT else self.NIGHT
+        else:
+            state = phase
+
+        if state != self.state:
+            if state == self.NIGHT:
+                dawn = self.next_dawn(now)
+                logging.info (f'Night mode until {dawn} UTC' if dawn else 'Night mode, no sunrise in the coming days')
+            elif state == self.DAWN:
+                logging.info (f'Probing inverters every {self.probe_interval} seconds until one answers')
+            else:
+                logging.info (f'Full polling')
+            self.state = state
+        return state
+
+    def wait(self, now=None):
+        """
+        Seconds until the main loop should wake up again in night or probe mode
+
+        :param now: UTC time (default now)
+        :type now: datetime or None
+        :rtype: float
+        """
+        if now is None:
+            now = datetime.utcnow()
+        dawn = self.next_dawn(now)
+        if self.state == self.DAWN or dawn is None:
+            return self.probe_interval
+        return max(0.0, min(self.wakeup, (dawn - now).total_seconds()))
 
     def sun_status2mqtt(self, dtu_ser, dtu_name):
         if not mqtt_client or not self.suntimes:
             return
 
         if self.suntimes:
-            local_sunrise = self.suntimes.riselocal(datetime.now()).strftime("%d.%m.%YT%H:%M")
-            local_sunset = self.suntimes.setlocal(datetime.now()).strftime("%d.%m.%YT%H:%M")
-            local_zone = self.suntimes.setlocal(datetime.now()).tzinfo.key
+            sunrise = self.suntimes.riselocal(datetime.now())
+            sunset = self.suntimes.setlocal(datetime.now())
+            if isinstance(sunrise, datetime) and isinstance(sunset, datetime):
+                local_sunrise = sunrise.strftime("%d.%m.%YT%H:%M")
+                local_sunset = sunset.strftime("%d.%m.%YT%H:%M")
+                local_zone = sunset.tzinfo.key
+            else:
+                # 'PD' or 'PN' on polar days and nights
+                local_sunrise = local_sunset = str(sunrise)
+                local_zone = None
             mqtt_client.info2mqtt({'topic' : f'{dtu_name}/{dtu_ser}'}, \
                          {'dis_night_comm' : 'True', \
                            'local_sunrise' : local_sunrise, \
@@ -129,6 +243,7 @@ def main_loop(ahoy_config):
     dtu_name = ahoy_config.get('dtu', {}).get('name', 'hoymiles-dtu')
     sunset.sun_status2mqtt(dtu_ser, dtu_name)
     loop_interval = ahoy_config.get('interval', 1)
+    info_interval = ahoy_config.get('info_interval', 3600)
     transmit_retries = ahoy_config.get('transmit_retries', 5)
     if (transmit_retries <= 0):
         logging.critical('Parameter "transmit_retries" must be >0 - please check ahoy.yml.')
@@ -136,28 +251,84 @@ def main_loop(ahoy_config):
         print('Parameter "transmit_retries" must be >0 - please check ahoy.yml - STOP(0)x')
         sys.exit(0)
 
+    for inverter in inverters:
+        if not 'name' in inverter:
+            inverter['name'] = 'hoymiles'
+        if not 'serial' in inverter:
+           logging.error("No inverter serial number found in ahoy.yml - exit")
+           sys.exit(999)
+    inverters = [inverter_sessions[str(inverter['serial'])] for inverter in inverters]
+
+    # per inverter cadence, alarms are requested on event count changes
+    for inverter in inverters:
+        poll_schedule.add(inverter.serial, InfoCommands.RealTimeRunData_Debug, inverter.config.get('interval', loop_interval))
+        poll_schedule.add(inverter.serial, InfoCommands.InverterDevInform_All, inverter.config.get('info_interval', info_interval))
+
+    radio_pool = hoymiles.RadioPool(hmradios, retries=transmit_retries)
+    airtime_budget.success_rate = radio_pool.success_rate
+
     try:
-        do_init = True
+        state = None
         while True:
-            sunset.checkWaitForSunrise()
+            mode = sunset.mode(any(not inverter.health.offline for inverter in inverters))
+            if mode != state:
+                if mqtt_client and sunset.suntimes:
+                    mqtt_client.info2mqtt({'topic': f'{dtu_name}/{dtu_ser}'}, {'night_mode': mode})
+                if state in (SunsetHandler.NIGHT, SunsetHandler.DAWN):
+                    sunset.sun_status2mqtt(dtu_ser, dtu_name)
+                    poll_schedule.restart()
+                    # the backoff of last evening or of polls before sunrise is void
+                    for inverter in inverters:
+                        inverter.health.reset_backoff()
+                state = mode
+
+            # no radio traffic at night, wake up on a timer
+            if mode == SunsetHandler.NIGHT:
+                state_store.save()
+                time.sleep(sunset.wait())
+                continue
+
+            # single probe requests until an inverter answers
+            if mode == SunsetHandler.DAWN:
+                airtime_budget.start_cycle([inverter.serial for inverter in inverters])
+                radio_pool.poll(inverters, lambda inverter, radio: probe_inverter(inverter, radio, dawn=True))
+                if not any(not inverter.health.offline for inverter in inverters):
+                    time.sleep(sunset.wait())
+                continue
+
+            time_to_sleep = poll_schedule.wait()
+            if time_to_sleep > 0:
+                time.sleep(time_to_sleep)
 
-            t_loop_start = time.time()
+            t_loop_start = time.monotonic()
 
-            for inverter in inverters:
-                if not 'name' in inverter:
-                    inverter['name'] = 'hoymiles'
-                if not 'serial' in inverter:
-                   logging.error("No inverter serial number found in ahoy.yml - exit")
-                   sys.exit(999)
-                if hoymiles.HOYMILES_DEBUG_LOGGING:
-                    logging.info(f'Poll inverter name={inverter["name"]} ser={inverter["serial"]}')
-                poll_inverter(inverter, dtu_ser, do_init, transmit_retries)
-            do_init = False
+            for task in poll_schedule.due(t_loop_start):
+                command_scheduler.put(task.inverter_ser, task.command)
+
+            # injected commands are sent along with the next due ones
+            polled = [inverter for inverter in inverters if command_scheduler.depth(inverter.serial)]
+            airtime_budget.start_cycle([inverter.serial for inverter in polled])
+            radio_pool.poll(polled, lambda inverter, radio: poll_inverter(inverter, transmit_retries, radio))
+
+            busy = time.monotonic() - t_loop_start
+            poll_schedule.cycle(busy)
 
-            if loop_interval > 0:
-                time_to_sleep = loop_interval - (time.time() - t_loop_start)
-                if time_to_sleep > 0:
-                    time.sleep(time_to_sleep)
+            state_store.save()
+
+            if hoymiles.HOYMILES_DEBUG_LOGGING:
+                logging.info(f'Poll cycle took {busy:.3f}s on {len(hmradios)} radio(s)')
+                for inverter_ser, stats in command_scheduler.report().items():
+                    logging.info(f'Commands {inverter_ser}: depth {stats["depth"]} sent {stats["sent"]} merged {stats["merged"]}'
+                            f' wait avg {stats["wait_avg"]:.3f}s max {stats["wait_max"]:.3f}s')
+                for inverter_ser, usage in airtime_budget.report().items():
+                    used = f'{usage["used"]:.0%}' if usage['used'] is not None else 'unlimited'
+                    logging.info(f'Airtime {inverter_ser}: {usage["packets_per_cycle"]:.1f} packets {usage["seconds_per_cycle"]:.3f}s per cycle,'
+                            f' {used} of budget, refused {usage["exhausted"]} in {usage["cycles"]} cycles')
+                for inverter_ser, commands in poll_schedule.report().items():
+                    for command, stats in commands.items():
+                        age = f'{stats["age"]:.1f}s' if stats['age'] is not None else 'none'
+                        logging.info(f'Schedule {inverter_ser} {InfoCommands(command).name}: every {stats["cadence"]}s runs {stats["runs"]}'
+                                f' missed {stats["missed"]} jitter avg {stats["jitter_avg"]:.3f}s max {stats["jitter_max"]:.3f}s sample age {age}')
 
     except Exception as e:
         logging.fatal('Exception catched: %s' % e)
@@ -165,45 +336,55 @@ def main_loop(ahoy_config):
         raise
 
 
-def poll_inverter(inverter, dtu_ser, do_init, retries):
+def poll_inverter(inverter, retries, radio):
     """
-    Send/Receive command_queue, initiate status poll on inverter
+    Send/Receive scheduled commands, initiate status poll on inverter
+
+    Runs in the worker thread of the radio the inverter is assigned to.
 
-    :param str inverter: inverter serial
+    :param inverter: inverter session
+    :type inverter: hoymiles.InverterSession
     :param retries: tx retry count if no inverter contact
     :type retries: int
+    :param radio: radio to poll the inverter with
+    :type radio: hoymiles.RadioTransport
+    :return: if the inverter did answer, None if it was not polled
+    :rtype: bool or None
     """
-    inverter_ser = inverter.get('serial')
-    inverter_name = inverter.get('name')
-    inverter_strings = inverter.get('strings')
+    health = inverter.health
 
-    # Queue at least status data request
-    inv_str = str(inverter_ser)
-    if do_init:
-      command_queue[inv_str].append(hoymiles.compose_send_time_payload(InfoCommands.InverterDevInform_All))
-      #command_queue[inv_str].append(hoymiles.compose_send_time_payload(InfoCommands.SystemConfigPara))
-    command_queue[inv_str].append(hoymiles.compose_send_time_payload(InfoCommands.RealTimeRunData_Debug))
+    # Offline inverters wait for their next probe, the queued commands stay pending
+    if not health.due():
+        return None
 
-    # Put all queued commands for current inverter on air
-    while len(command_queue[inv_str]) > 0:
-        payload = command_queue[inv_str].pop(0)    ## Sub.Cmd
+    if hoymiles.HOYMILES_DEBUG_LOGGING:
+        logging.info(f'Poll inverter name={inverter.name} ser={inverter.serial} {health.state} on {threading.current_thread().name}')
+
+    # Offline inverters are probed first, a single request
+    if health.offline and not probe_inverter(inverter, radio):
+        return False
 
-        # Send payload {ttl}-times until we get at least one reponse
-        payload_ttl = retries
+    # Put all queued commands for current inverter on air
+    answered = False
+    while True:
+        # commands without airtime left in this cycle stay pending
+        entry = command_scheduler.get(inverter.serial, airtime_budget.priorities(inverter.serial))
+        if entry is None:
+            break
+        request = inverter.scheduled_request(entry)    ## Sub.Cmd
+        airtime = airtime_budget.account(inverter.serial, entry.priority)
+
+        # Send request {ttl}-times until we get at least one reponse,
+        # fewer times to inverters that rarely answer
+        payload_ttl = airtime_budget.retries(inverter.serial, retries)
         response = None
-        while payload_ttl > 0:
+        while payload_ttl > 0 and airtime.remaining() != 0:
             payload_ttl = payload_ttl - 1
             com = hoymiles.InverterTransaction(
-                    radio=hmradio,
-                    txpower=inverter.get('txpower', None),
-                    dtu_ser=dtu_ser,
-                    inverter_ser=inverter_ser,
-                    request=next(hoymiles.compose_esb_packet(
-                        payload,
-                        seq=b'\x80',
-                        src=dtu_ser,
-                        dst=inverter_ser
-                        )))
+                    radio=radio,
+                    session=inverter,
+                    airtime=airtime,
+                    request=request)
             while com.rxtx():
                 try:
                     response = com.get_payload()
@@ -215,52 +396,137 @@ def poll_inverter(inverter, dtu_ser, do_init, retries):
 
         # Handle the response data if any
         if response:
+            answered = True
+            poll_schedule.sampled(inverter.serial, entry.command)
             if hoymiles.HOYMILES_TRANSACTION_LOGGING:
-                logging.debug(f'Payload: ' + hoymiles.hexify_payload(response))
-
-            # prepare decoder object
-            decoder = hoymiles.ResponseDecoder(response,
-                    request=com.request,
-                    inverter_ser=inverter_ser,
-                    inverter_name=inverter_name,
-                    dtu_ser=dtu_ser,
-                    strings=inverter_strings
-                    )
+                logging.debug('Payload: %s', hoymiles.HexBytes(response))
+
+            # repeated realtime data is skipped until max_silence passed
+            if entry.command in command_scheduler.realtime_commands and inverter.unchanged(entry.command, response):
+                if hoymiles.HOYMILES_DEBUG_LOGGING:
+                    logging.info(f'Inverter {inverter.serial}: payload unchanged, skipped ({inverter.unchanged_count} so far)')
+                continue
 
             # get decoder object
-            result = decoder.decode()
-            if hoymiles.HOYMILES_DEBUG_LOGGING:
-               logging.info(f'Decoded: {result.__dict__()}')
+            result = inverter.decode(response, request, time_rx=com.time_rx)
 
             # check decoder object for output
             if isinstance(result, hoymiles.decoders.StatusResponse):
 
-                data = result.__dict__()
-                if data is not None and 'event_count' in data:
-                    if event_message_index[inv_str] < data['event_count']:
-                        event_message_index[inv_str] = data['event_count']
-                        command_queue[inv_str].append(hoymiles.compose_send_time_payload(InfoCommands.AlarmData, alarm_id=event_message_index[inv_str]))
-
-                if mqtt_client:
-                   mqtt_client.store_status(result, topic=inverter.get('mqtt', {}).get('topic', None))
-
-                if influx_client:
-                   influx_client.store_status(result)
+                # decoded once, all outputs share the snapshot
+                snapshot = result.snapshot()
+                if hoymiles.HOYMILES_DEBUG_LOGGING:
+                   logging.info(f'Decoded: {snapshot}')
+
+                if snapshot is not None:
+                    if snapshot.event_count is not None:
+                        if snapshot.event_count < inverter.event_message_index:
+                            # alarm ids start over when the inverter restarts
+                            logging.info(f'Inverter {inverter.serial} alarm count {snapshot.event_count} below last alarm id {inverter.event_message_index}, fetching all alarms')
+                            inverter.event_message_index = 0
+                        inverter.event_count = snapshot.event_count
+                        if inverter.event_message_index < snapshot.event_count:
+                            # fetch only alarms after the last one seen
+                            command_scheduler.put(inverter.serial, InfoCommands.AlarmData, alarm_id=inverter.event_message_index)
+
+                    # output plugins are shared by all radio worker threads
+                    with output_lock:
+                        if mqtt_client:
+                           mqtt_client.store_status(snapshot, topic=inverter.mqtt_topic)
+
+                        if influx_client:
+                           influx_client.store_status(snapshot)
+
+                        if volkszaehler_client:
+                           volkszaehler_client.store_status(snapshot)
+
+            elif hoymiles.HOYMILES_DEBUG_LOGGING:
+               logging.info(f'Decoded: {result.__dict__()}')
 
-                if volkszaehler_client:
-                   volkszaehler_client.store_status(result)
+            if isinstance(result, hoymiles.decoders.EventsResponse) and entry.command == InfoCommands.AlarmData:
+                for event in result.events:
+                    logging.info(f'Inverter {inverter.serial} alarm: {event.text} ({event.code}) count={event.count}'
+                            f' start={timedelta(seconds=event.start)} end={timedelta(seconds=event.end)}')
+                if inverter.event_count is not None:
+                    inverter.event_message_index = max(inverter.event_message_index, inverter.event_count)
 
             # check decoder object for output
             if isinstance(result, hoymiles.decoders.HardwareInfoResponse):
-                if mqtt_client:
-                   mqtt_client.store_status(result, topic=inverter.get('mqtt', {}).get('topic', None))
+                with output_lock:
+                    if mqtt_client:
+                       mqtt_client.store_status(result, topic=inverter.mqtt_topic)
+
+    report_health(inverter, health.record(answered))
+    return answered
+
+def required_fields(inverter_ser, outputs):
+    """
+    Status fields any output stores for an inverter
+
+    Only limits decoding, each output still publishes just its own fields.
+
+    :param inverter_ser: inverter serial
+    :param list outputs: output plugins, None for disabled ones
+    :return: field names to decode, None for all
+    :rtype: frozenset or None
+    """
+    fields = {'event_count'}    # alarm fetching needs the alarm count
+    for output in outputs:
+        if output is None:
+            continue
+        output_fields = output.required_fields(inverter_ser)
+        if output_fields is None:
+            return None
+        fields.update(output_fields)
+    return frozenset(fields)
+
+def probe_inverter(inverter, radio, dawn=False):
+    """
+    Probe an inverter with a single request, any fragment is contact
+
+    Silence before sunrise is expected, dawn probes only record answers.
+
+    :param inverter: inverter session
+    :type inverter: hoymiles.InverterSession
+    :param radio: radio to probe the inverter with
+    :type radio: hoymiles.RadioTransport
+    :param bool dawn: if the probe is one of the dawn probes
+    :return: if the inverter did answer, None for a silent dawn probe
+    :rtype: bool or None
+    """
+    com = hoymiles.InverterTransaction(
+            radio=radio,
+            session=inverter,
+            retransmit_budget=0,
+            airtime=airtime_budget.account(inverter.serial, command_scheduler.REALTIME),
+            request=inverter.time_request(InfoCommands.RealTimeRunData_Debug))
+    contact = com.rxtx()
+    if dawn and not contact:
+        return None
+    report_health(inverter, inverter.health.record(contact))
+    return contact
+
+def report_health(inverter, state):
+    """
+    Publish inverter health transitions
+
+    :param inverter: inverter session
+    :type inverter: hoymiles.InverterSession
+    :param state: new state, None if unchanged
+    :type state: str or None
+    """
+    if not state or not mqtt_client:
+        return
+    topic = inverter.mqtt_topic if inverter.mqtt_topic else f'{inverter.name}/{inverter.serial}'
+    with output_lock:
+        mqtt_client.info2mqtt({'topic': topic}, {'health': state})
 
 
 def mqtt_on_command(client, userdata, message):
     """
     Handle commands to topic
         hoymiles/{inverter_ser}/command
-    frame a payload and put onto command_queue
+    frame a payload and put onto the command scheduler
 
     Inverters must have mqtt.send_raw_enabled: true configured
 
@@ -283,7 +549,8 @@ def mqtt_on_command(client, userdata, message):
         inverter_ser = next(
                 item[0] for item in mqtt_command_topic_subs if item[1] == message.topic)
     except StopIteration:
-        logging.warning('Unexpedtedly received mqtt message for {message.topic}')
+        logging.warning(f'Unexpedtedly received mqtt message for {message.topic}')
+        inverter_ser = None
 
     if inverter_ser:
         p_message = message.payload.decode('utf-8').lower()
@@ -298,8 +565,39 @@ def mqtt_on_command(client, userdata, message):
             payload = bytes.fromhex(p_message)
             # commands must start with \x80
             if payload[0] == 0x80:
-                command_queue[str(inverter_ser)].append(
-                    hoymiles.frame_payload(payload[1:]))
+                # requests are sent in a single fragment, Modbus CRC included
+                framed = hoymiles.frame_payload(payload[1:])
+                if len(framed) > hoymiles.PacketBuilder.mtu:
+                    logging.warning(f'Inverter {inverter_ser}: mqtt command of {len(payload)} bytes rejected,'
+                            f' at most {hoymiles.PacketBuilder.mtu - 1} bytes fit into one fragment')
+                    return
+                inverter = inverter_sessions[str(inverter_ser)]
+                command_scheduler.put(inverter.serial, request=inverter.request(framed))
+        else:
+            logging.warning(f'Inverter {inverter_ser}: mqtt command is no hexlified payload: {p_message[:64]}')
+
+def create_airtime_budget(ahoy_config, inverters, radio_count):
+    """
+    Airtime budget per poll cycle from the airtime config section
+
+    Without the section transmissions are not limited. With it, the radio
+    time defaults to the budget of the shortest realtime interval.
+
+    :param dict ahoy_config: ahoy section of ahoy.yml
+    :param inverters: inverter sessions
+    :type inverters: list of hoymiles.InverterSession
+    :param int radio_count: number of radios
+    :rtype: hoymiles.AirtimeBudget
+    """
+    airtime_config = ahoy_config.get('airtime', None)
+    if not airtime_config:
+        return hoymiles.AirtimeBudget()
+
+    realtime_intervals = [inverter.config.get('interval', ahoy_config.get('interval', 1)) for inverter in inverters]
+    airtime_seconds = hoymiles.PollSchedule.budget * min(realtime_intervals, default=0) * radio_count
+    return hoymiles.AirtimeBudget(
+            packets=airtime_config.get('packets', None),
+            seconds=airtime_config.get('seconds', airtime_seconds or None))
 
 def init_logging(ahoy_config):
     log_config = ahoy_config.get('logging')
@@ -364,16 +662,29 @@ if __name__ == '__main__':
     ahoy_config = dict(cfg.get('ahoy', {}))
     init_logging(ahoy_config)
 
+    # Learned state, kept across restarts
+    state_store = hoymiles.StateStore(ahoy_config.get('state_file', 'hoymiles_state.json'))
+    channel_stats = hoymiles.ChannelStats(state_store.get('channels'))
+    state_store.register('channels', channel_stats.dump)
+
     # Prepare for multiple transceivers, makes them configurable
-    for radio_config in ahoy_config.get('nrf', [{}]):
-        hmradio = hoymiles.HoymilesNRF(**radio_config)
+    hmradios = []
+    simulator_config = ahoy_config.get('simulator', None)
+    if simulator_config:
+        # replay recorded responses instead of using nrf transceivers
+        from .simulator import SimulatorRadio
+        for radio_config in simulator_config:
+            hmradios.append(SimulatorRadio(**radio_config))
+    else:
+        for radio_config in ahoy_config.get('nrf', [{}]):
+            hmradios.append(hoymiles.HoymilesNRF(channel_stats=channel_stats, **radio_config))
 
     # create MQTT - client object
     mqtt_client = None
     mqtt_config = ahoy_config.get('mqtt', None)
     if mqtt_config and not mqtt_config.get('disabled', False):
        from .outputs import MqttOutputPlugin
-       mqtt_client = MqttOutputPlugin(mqtt_config)
+       mqtt_client = MqttOutputPlugin(mqtt_config, fields=mqtt_config.get('fields', None))
 
     # create INFLUX - client object
     influx_client = None
@@ -385,7 +696,8 @@ if __name__ == '__main__':
                 influx_config.get('token'),
                 org=influx_config.get('org', ''),
                 bucket=influx_config.get('bucket', None),
-                measurement=influx_config.get('measurement', 'hoymiles'))
+                measurement=influx_config.get('measurement', 'hoymiles'),
+                fields=influx_config.get('fields', None))
 
     # create VOLKSZAEHLER - client object
     volkszaehler_client = None
@@ -394,25 +706,38 @@ if __name__ == '__main__':
         from .outputs import VolkszaehlerOutputPlugin
         volkszaehler_client = VolkszaehlerOutputPlugin(volkszaehler_config)
 
-    event_message_index = {}
-    command_queue = {}
+    inverter_sessions = {}
+    alarm_state = state_store.get('alarms')
+    state_store.register('alarms', lambda: {serial: inverter.event_message_index for serial, inverter in inverter_sessions.items()})
+    command_scheduler = hoymiles.CommandScheduler()
+    poll_schedule = hoymiles.PollSchedule()
+    output_lock = threading.Lock()
     mqtt_command_topic_subs = []
+    dtu_ser = ahoy_config.get('dtu', {}).get('serial', None)
 
     for g_inverter in ahoy_config.get('inverters', []):
         g_inverter_ser = g_inverter.get('serial')
-        inv_str = str(g_inverter_ser)
-        command_queue[inv_str] = []
-        event_message_index[inv_str] = 0
+        if not g_inverter_ser:
+            continue
+        g_session = hoymiles.InverterSession(g_inverter, dtu_ser)
+        g_session.event_message_index = alarm_state.get(str(g_inverter_ser), 0)
+        inverter_sessions[str(g_inverter_ser)] = g_session
+
+        # decode only what the outputs store, all for the decoded data debug log
+        if not hoymiles.HOYMILES_DEBUG_LOGGING:
+            g_session.fields = required_fields(g_inverter_ser, [mqtt_client, influx_client, volkszaehler_client])
 
         # Enables and subscribe inverter to mqtt /command-Topic
-        if mqtt_client and g_inverter.get('mqtt', {}).get('send_raw_enabled', False):
+        if mqtt_client and g_session.send_raw_enabled:
             topic_item = (
                     str(g_inverter_ser),
-                    g_inverter.get('mqtt', {}).get('topic', f'hoymiles/{g_inverter_ser}') + '/command'
+                    (g_session.mqtt_topic or f'hoymiles/{g_inverter_ser}') + '/command'
                     )
             mqtt_client.client.subscribe(topic_item[1])
             mqtt_command_topic_subs.append(topic_item)
 
+    airtime_budget = create_airtime_budget(ahoy_config, inverter_sessions.values(), len(hmradios))
+
     # start main-loop
     main_loop(ahoy_config)
 
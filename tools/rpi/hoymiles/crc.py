@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Hoymiles CRC-8 and Modbus CRC-16
+
+The ESB fragment checksum is crcmod's CRC-8 with polynomial 0x101. Its
+table is the identity, so it degenerates into an XOR over all bytes.
+The payload checksum is the reflected Modbus CRC-16 (0x8005, init 0xffff).
+
+Both use the crcmod C extension when it is installed, otherwise pure
+Python: the CRC-8 as plain XOR and the CRC-16 with a table for two bytes
+per step, both faster than crcmod's own Python fallback. Crc16Modbus
+folds in a payload as its fragments arrive.
+"""
+
+import sys
+import array
+import struct
+
+def _modbus_table():
+    """
+    :return: reflected CRC-16 lookup table for polynomial 0x8005
+    :rtype: list
+    """
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xa001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+MODBUS_TABLE = _modbus_table()
+MODBUS_TABLE16 = None
+
+def _modbus_table16():
+    """
+    :return: CRC-16 lookup table for two bytes at a time, 128 kB
+    :rtype: array.array
+    """
+    table = MODBUS_TABLE
+    table16 = array.array('H', bytes(2 * 65536))
+    for word in range(65536):
+        crc = table[word & 0xff] ^ (word >> 8)
+        table16[word] = table[crc & 0xff] ^ (crc >> 8)
+    return table16
+
+def crc8_py(data, crc=0):
+    """
+    Pure Python CRC-8, polynomial 0x101
+
+    :param bytes data: data to checksum
+    :param int crc: crc of preceding data
+    :return: crc
+    :rtype: int
+    """
+    for byte in data:
+        crc ^= byte
+    return crc
+
+def crc16_modbus_py(data, crc=0xffff):
+    """
+    Pure Python Modbus CRC-16
+
+    Works on little endian 16 bit words if the word table is built,
+    see crc16_modbus, a trailing odd byte goes through the byte table.
+
+    :param bytes data: data to checksum
+    :param int crc: crc of preceding data
+    :return: crc
+    :rtype: int
+    """
+    table = MODBUS_TABLE
+    table16 = MODBUS_TABLE16
+    if table16 is None:
+        for byte in data:
+            crc = table[(crc ^ byte) & 0xff] ^ (crc >> 8)
+        return crc
+
+    size = len(data) & ~1
+    for word in memoryview(data)[:size].cast('H'):
+        crc = table16[crc ^ word]
+    if size != len(data):
+        crc = table[(crc ^ data[-1]) & 0xff] ^ (crc >> 8)
+    return crc
+
+try:
+    from crcmod._crcfunext import _crc8, _crc16r
+
+    _crc8_table = bytes(range(256))
+    _modbus_table_c = struct.pack('256H', *MODBUS_TABLE)
+
+    def crc8(data, crc=0):
+        """
+        CRC-8, polynomial 0x101, crcmod C extension
+
+        :param bytes data: data to checksum
+        :param int crc: crc of preceding data
+        :return: crc
+        :rtype: int
+        """
+        return _crc8(data, crc, _crc8_table)
+
+    def crc16_modbus(data, crc=0xffff):
+        """
+        Modbus CRC-16, crcmod C extension
+
+        :param bytes data: data to checksum
+        :param int crc: crc of preceding data
+        :return: crc
+        :rtype: int
+        """
+        return _crc16r(data, crc, _modbus_table_c)
+
+    C_EXTENSION = True
+except ImportError:
+    # words are read in native byte order
+    if sys.byteorder == 'little':
+        MODBUS_TABLE16 = _modbus_table16()
+    crc8 = crc8_py
+    crc16_modbus = crc16_modbus_py
+    C_EXTENSION = False
+
+class Crc16Modbus:
+    """Streaming Modbus CRC-16"""
+    def __init__(self, crc=0xffff):
+        """
+        :param int crc: initial crc
+        """
+        self.value = crc
+
+    def update(self, data):
+        """
+        Fold data into the crc
+
+        :param bytes data: next chunk
+        :return: self
+        :rtype: Crc16Modbus
+        """
+        self.value = crc16_modbus(data, self.value)
+        return self
@@ -5,13 +5,13 @@
 Hoymiles Micro-Inverters decoder library
 """
 
+import re
 import struct
+import threading
+from collections import namedtuple
 from datetime import datetime, timedelta
-import crcmod
 import logging
-
-f_crc_m = crcmod.predefined.mkPredefinedCrcFun('modbus')
-f_crc8 = crcmod.mkCrcFun(0x101, initCrc=0, xorOut=0)
+from ..crc import crc8 as f_crc8, crc16_modbus as f_crc_m
 
 def g_unpack(s_fmt, s_buf):
     """Chunk unpack helper
@@ -29,6 +29,41 @@ def g_unpack(s_fmt, s_buf):
 
     return struct.iter_unpack(s_fmt, s_buf[:len(s_buf) - s_exc])
 
+def hexify(data):
+    """
+    Represent bytes as white-space separated hex
+
+    :param bytes data: bytes, bytearray or memoryview
+    :return: two-digit lower case hex per byte
+    :rtype: str
+    """
+    return bytes(data).hex(' ')
+
+class HexBytes:
+    """
+    Log argument formatting bytes as hex only when the record is emitted
+
+    ``logging.debug('Payload: %s', HexBytes(payload))`` costs one small
+    object if debug logging is off.
+    """
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        """
+        :param bytes data: bytes to represent
+        """
+        self.data = data
+
+    def __str__(self):
+        return hexify(self.data)
+
+def debug_enabled():
+    """
+    :return: if debug records are emitted by the root logger
+    :rtype: bool
+    """
+    return logging.root.isEnabledFor(logging.DEBUG)
+
 def print_table_unpack(s_fmt, payload, cw=6):
     """
     Print table of decoded numbers with different offsets
@@ -42,8 +77,10 @@ def print_table_unpack(s_fmt, payload, cw=6):
     :type cw: int
     :return: None
     """
+    if not debug_enabled():
+        return
 
-    l_hexlified = [f'{byte:02x}' for byte in payload]
+    l_hexlified = hexify(payload).split()
 
     dbg  = f'{"Pos": <{cw}}'
     dbg += ''.join([f'{num: >{cw}}' for num in range(0, len(payload))])
@@ -62,10 +99,7 @@ def print_table_unpack(s_fmt, payload, cw=6):
 
 class Response:
     """ All Response Shared methods """
-    inverter_ser = None
-    inverter_name = None
-    dtu_ser = None
-    response = None
+    __slots__ = ('inverter_ser', 'inverter_name', 'dtu_ser', 'response', 'inv_strings', 'time_rx')
 
     def __init__(self, *args, **params):
         """
@@ -91,15 +125,220 @@ class Response:
                 'inverter_name': self.inverter_name,
                 'dtu_ser': self.dtu_ser}
 
+Phase = namedtuple('Phase', ['voltage', 'current', 'power', 'reactive_power', 'frequency'])
+Phase.__doc__ = 'AC phase of a StatusSnapshot'
+String = namedtuple('String', ['name', 'voltage', 'current', 'power', 'energy_total', 'energy_daily', 'irradiation'])
+String.__doc__ = 'DC PV-string of a StatusSnapshot'
+
+class StatusSnapshot:
+    """
+    Immutable status data of one response
+
+    Built once per StatusResponse and handed to every output. Outputs
+    keep their formatted representation in the snapshot with view(),
+    so a snapshot stored twice is formatted only once per output.
+    """
+    __slots__ = ('inverter_ser', 'inverter_name', 'dtu_ser', 'phases', 'strings',
+            'temperature', 'powerfactor', 'yield_total', 'yield_today',
+            'efficiency', 'event_count', 'time', '_views')
+
+    def __init__(self, **values):
+        """
+        :param values: field values, missing fields are None
+        """
+        for name in self.__slots__[:-1]:
+            object.__setattr__(self, name, values.get(name))
+        object.__setattr__(self, '_views', None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.as_dict()})'
+
+    def view(self, key, build):
+        """
+        Formatted representation of this snapshot, built on first use
+
+        :param key: hashable key naming the representation, e.g. output and topic
+        :param build: callable taking the snapshot, returns the representation
+        :return: cached result of build(self)
+        """
+        views = self._views
+        if views is None:
+            views = {}
+            object.__setattr__(self, '_views', views)
+        elif key in views:
+            return views[key]
+        view = views[key] = build(self)
+        return view
+
+    def as_dict(self):
+        """
+        Snapshot in the layout of StatusResponse.__dict__()
+
+        :return: new dict of all values
+        :rtype: dict
+        """
+        return {
+                'inverter_ser': self.inverter_ser,
+                'inverter_name': self.inverter_name,
+                'dtu_ser': self.dtu_ser,
+                'phases': [phase._asdict() for phase in self.phases],
+                'strings': [string._asdict() for string in self.strings],
+                'temperature': self.temperature,
+                'powerfactor': self.powerfactor,
+                'yield_total': self.yield_total,
+                'yield_today': self.yield_today,
+                'efficiency': self.efficiency,
+                'event_count': self.event_count,
+                'time': self.time}
+
 class StatusResponse(Response):
     """Inverter StatusResponse object"""
     phase_keys  = ['voltage','current','power','reactive_power','frequency']
     string_keys  = ['voltage','current','power','energy_total','energy_daily', 'irradiation']
+    __slots__ = ('values', 'stored_fields', 'unpack_error', '_snapshot')
     temperature = None
     frequency = None
     powerfactor = None
     event_count = None
-    unpack_error = False
+
+    # set by compile_status_decoder
+    layout = None
+    slots = ()
+    fields = ()
+    field_index = None
+    phase_fields = None
+    string_fields = None
+    projections = None
+    projections_lock = threading.Lock()    # radio workers decode concurrently
+
+    def __init__(self, *args, **params):
+        """
+        :param bytes response: response payload bytes
+        :param fields: names of the fields to store, see required_fields, default all
+        :type fields: frozenset or None
+        """
+        super().__init__(*args, **params)
+        self.unpack_error = False
+        self.stored_fields = params.get('fields', None)
+        if self.layout:
+            self.values = self.decode_fields(self.stored_fields)
+
+    @classmethod
+    def required_fields(cls, names):
+        """
+        Decoder fields needed for snapshot values
+
+        Names are decoder properties (ac_power_0, temperature, ...) or the
+        derived dc_irradiation_N, yield_total, yield_today and efficiency.
+        Names the model does not have are ignored.
+
+        :param names: requested snapshot values
+        :type names: iterable
+        :return: property names of the field table
+        :rtype: set
+        """
+        index = cls.field_index
+        props = set()
+        for name in names:
+            if name in index:
+                props.add(name)
+            elif name.startswith('dc_irradiation_'):
+                props.add(f'dc_power_{name[15:]}')
+            elif name == 'yield_total':
+                props.update(string[3] for string in cls.string_fields)
+            elif name == 'yield_today':
+                props.update(string[4] for string in cls.string_fields)
+            elif name == 'efficiency':
+                props.update(phase[2] for phase in cls.phase_fields)
+                props.update(string[2] for string in cls.string_fields)
+        return props & set(index)
+
+    @classmethod
+    def projection(cls, fields):
+        """
+        Struct and slots decoding only some fields, compiled once per set
+
+        :param fields: requested names, see required_fields, None for all
+        :type fields: frozenset or None
+        :return: layout, slots, (value index, slot, div) per decoded field and
+                 value indexes only decoded to derive other values
+        :rtype: tuple
+        """
+        if fields is None:
+            return cls.layout, cls.slots, tuple(
+                    (index, slot, div) for index, (prop, slot, div) in enumerate(cls.fields)), ()
+        try:
+            return cls.projections[fields]
+        except KeyError:
+            pass
+
+        with cls.projections_lock:
+            # another thread may have compiled it meanwhile
+            if fields in cls.projections:
+                return cls.projections[fields]
+
+            props = cls.required_fields(fields)
+            used = sorted(set(slot for prop, slot, div in cls.fields if prop in props))
+            slots = tuple(cls.slots[slot] for slot in used)
+            layout = _compile_layout(cls.__name__, [(start, slot.format[1:]) for start, slot in slots])
+            entries = tuple((index, used.index(slot), div)
+                    for index, (prop, slot, div) in enumerate(cls.fields) if prop in props)
+            hidden = tuple(index for index, (prop, slot, div) in enumerate(cls.fields) if prop in props and prop not in fields)
+            projection = cls.projections[fields] = (layout, slots, entries, hidden)
+            return projection
+
+    def decode_fields(self, fields=None):
+        """
+        Decode the fields of the model table with one unpack
+
+        :param fields: names of the fields to store, see required_fields, default all
+        :type fields: frozenset or None
+        :return: scaled values in field table order, see field_index,
+                 None for fields not decoded
+        :rtype: tuple
+        """
+        if fields is None:
+            layout = self.layout
+        else:
+            layout, slots, entries, hidden = self.projection(fields)
+
+        if len(self.response) >= layout.size:
+            raw = layout.unpack_from(self.response)
+        else:
+            # short payload, decode what is there
+            self.unpack_error = True
+            logging.error(f'size: {layout.size} len: {len(self.response)} fmt: {layout.format} rep: {self.response}')
+            raw = [slot.unpack_from(self.response, start)[0] if start + slot.size <= len(self.response) else 0
+                   for start, slot in (self.slots if fields is None else slots)]
+
+        if fields is None:
+            return tuple([raw[slot] / div if div != 1 else raw[slot] for name, slot, div in self.fields])
+
+        values = [None] * len(self.fields)
+        for index, slot, div in entries:
+            values[index] = raw[slot] / div if div != 1 else raw[slot]
+        return tuple(values)
+
+    def irradiation(self, string_id, power):
+        """
+        String power in percent of its configured maximum
+
+        :param int string_id: string index into inverter strings config
+        :param float power: string watts
+        :return: irradiation in percent, None without strings config
+        :rtype: float or None
+        """
+        if self.inv_strings is None or string_id >= len(self.inv_strings):
+            return None
+        if self.inv_strings[string_id]['s_maxpower'] == 0:
+            return 0.00
+        return round(power/self.inv_strings[string_id]['s_maxpower']*100, 3)
 
     def unpack(self, fmt, base):
         """
@@ -167,6 +406,89 @@ class StatusResponse(Response):
 
         return strings
 
+    def snapshot(self):
+        """
+        Decoded data as immutable snapshot, built on first call
+
+        :return: snapshot, None if the payload was too short
+        :rtype: StatusSnapshot or None
+        """
+        if self.unpack_error:
+            return None
+        try:
+            return self._snapshot
+        except AttributeError:
+            pass
+
+        if self.phase_fields is None:
+            phases = tuple(Phase._make(phase.get(key) for key in Phase._fields) for phase in self.phases)
+            strings = tuple(String._make(string.get(key) for key in String._fields)
+                    for string in self.strings) if self.inv_strings else ()
+            ac_power = [phase.power for phase in phases]
+            dc_power = [string.power for string in strings]
+            energy_total = [string.energy_total for string in strings]
+            energy_daily = [string.energy_daily for string in strings]
+        else:
+            values = self.values
+            index = self.field_index
+            string_fields = self.string_fields[:len(self.inv_strings or ())]
+
+            # derived values from all decoded fields
+            ac_power = [values[index[props[2]]] for props in self.phase_fields]
+            dc_power = [values[index[props[2]]] for props in string_fields]
+            energy_total = [values[index[props[3]]] for props in string_fields]
+            energy_daily = [values[index[props[4]]] for props in string_fields]
+            irradiation = [self.irradiation(string_id, power) if power is not None else None
+                    for string_id, power in enumerate(dc_power)]
+
+            # fields decoded only to derive others are not stored
+            fields = self.stored_fields
+            if fields is not None:
+                hidden = self.projection(fields)[3]
+                if hidden:
+                    values = list(values)
+                    for value_index in hidden:
+                        values[value_index] = None
+                irradiation = [value if f'dc_irradiation_{string_id}' in fields else None
+                        for string_id, value in enumerate(irradiation)]
+
+            phases = tuple(Phase._make([values[index[prop]] if prop else None for prop in props])
+                    for props in self.phase_fields)
+            strings = tuple(String(self.inv_strings[string_id]['s_name'],
+                        *[values[index[prop]] if prop else None for prop in props], irradiation[string_id])
+                    for string_id, props in enumerate(string_fields))
+
+        # derived values only if all their fields were decoded
+        if None in ac_power or None in dc_power:
+            efficiency = None
+        elif sum(dc_power) != 0:
+            efficiency = round(sum(ac_power) * 100 / sum(dc_power), 2)
+        else:
+            efficiency = 0.0
+        yield_total = sum(energy_total) + 0.0 if None not in energy_total else None
+        yield_today = sum(energy_daily) + 0.0 if None not in energy_daily else None
+
+        fields = self.stored_fields
+        if fields is not None:
+            yield_total = yield_total if 'yield_total' in fields else None
+            yield_today = yield_today if 'yield_today' in fields else None
+            efficiency = efficiency if 'efficiency' in fields else None
+
+        self._snapshot = StatusSnapshot(
+                inverter_ser=self.inverter_ser,
+                inverter_name=self.inverter_name,
+                dtu_ser=self.dtu_ser,
+                phases=phases,
+                strings=strings,
+                temperature=self.temperature,
+                powerfactor=self.powerfactor,
+                yield_total=yield_total,
+                yield_today=yield_today,
+                efficiency=efficiency,
+                event_count=self.event_count,
+                time=self.time_rx)
+        return self._snapshot
+
     def __dict__(self):
         """
         Get all known data
@@ -174,39 +496,15 @@ class StatusResponse(Response):
         :return: dict of properties
         :rtype: dict
         """
-        data = super().__dict__()
-        data['phases'] = self.phases
-        data['strings'] = self.strings
-        data['temperature'] = self.temperature
-        data['powerfactor'] = self.powerfactor
-
-        data['yield_total'] = 0.0
-        data['yield_today'] = 0.0
-        for string in data['strings']:
-            data['yield_total'] += string['energy_total']
-            data['yield_today'] += string['energy_daily']
-
-        ac_sum_power = 0.0
-        for phase in data['phases']:
-            ac_sum_power += phase['power']
-        dc_sum_power = 0.0
-        for string in data['strings']:
-            dc_sum_power += string['power']
-        if dc_sum_power != 0:
-           data['efficiency'] = round(ac_sum_power * 100 / dc_sum_power, 2)
-        else:
-           data['efficiency'] = 0.0
-
-        data['event_count'] = self.event_count
-        data['time'] = self.time_rx
-
-        if not self.unpack_error:
-            return data
+        snapshot = self.snapshot()
+        if snapshot is not None:
+            return snapshot.as_dict()
 
 class UnknownResponse(Response):
     """
     Debugging helper for unknown payload format
     """
+    __slots__ = ()
 
     @property
     def hex_ascii(self):
@@ -216,7 +514,7 @@ class UnknownResponse(Response):
         :return: hexlifierd byte string
         :rtype: str
         """
-        return ' '.join([f'{byte:02x}' for byte in self.response])
+        return hexify(self.response)
 
     def validate_crc8(self):
         """
@@ -245,8 +543,16 @@ class UnknownResponse(Response):
         print_table_unpack(*args)
 
 
+Event = namedtuple('Event', ['opcode', 'code', 'text', 'count', 'start', 'end'])
+Event.__doc__ = 'Alarm log record of an EventsResponse, start and end in seconds of the day'
+
 class EventsResponse(UnknownResponse):
     """ Hoymiles micro-inverter event log decode helper """
+    __slots__ = ('status', 'a_text', 'events')
+
+    # code word (opcode and alarm code), count, start, end, 4 unknown bytes,
+    # like parseAlarmLog() in src/hm/hmInverter.h
+    record = struct.Struct('>HHHH4x')
 
     alarm_codes = {
             # HM Error Codes
@@ -331,26 +637,37 @@ class EventsResponse(UnknownResponse):
 
         self.status = struct.unpack('>H', self.response[:2])[0]
         self.a_text = self.alarm_codes.get(self.status, 'N/A')
-        logging.info (f'Inverter status: {self.a_text} ({self.status})')
-
-        chunk_size = 12
-        for i_chunk in range(2, len(self.response), chunk_size):
-            chunk = self.response[i_chunk:i_chunk+chunk_size]
+        logging.info('Inverter status: %s (%s)', self.a_text, self.status)
 
-            logging.debug(' '.join([f'{byte:02x}' for byte in chunk]) + ': ')
+        self.events = self.parse_events(self.response[2:])
 
-            if (len(chunk[0:6]) < 6):
-                logging.error(f'length of chunk must be greater or equal 6 bytes: {chunk}')
-                return
+        if debug_enabled():
+            for event in self.events:
+                logging.debug(f' a_count={event.count} opcode={event.opcode} a_code={event.code} a_text={event.text} start={timedelta(seconds=event.start)} end={timedelta(seconds=event.end)}')
 
-            opcode, a_code, a_count, uptime_sec = struct.unpack('>BBHH', chunk[0:6])
-            a_text = self.alarm_codes.get(a_code, 'N/A')
-            logging.debug(f' uptime={timedelta(seconds=uptime_sec)} a_count={a_count} opcode={opcode} a_code={a_code} a_text={a_text}')
+    def parse_events(self, data):
+        """
+        Split the alarm log into records
 
-            dbg = ''
-            for fmt in ['BBHHHHH']:
-                dbg += f' {fmt:7}: ' + str(struct.unpack('>' + fmt, chunk))
-            logging.debug(dbg)
+        :param bytes data: alarm log without status and crc, 12 bytes per record
+        :return: event records in log order
+        :rtype: tuple
+        """
+        size = len(data) - len(data) % self.record.size
+        if size != len(data):
+            logging.error(f'length of chunk must be {self.record.size} bytes: {data[size:]}')
+
+        alarm_codes = self.alarm_codes
+        events = []
+        for word, count, start, end in self.record.iter_unpack(data[:size]):
+            # times count from 0:00 or 12:00, flagged in the code word
+            if (word >> 13) & 0x01:
+                start += 12 * 60 * 60
+            if (word >> 12) & 0x03:
+                end += 12 * 60 * 60
+            code = word & 0xff
+            events.append(Event(word >> 8, code, alarm_codes.get(code, 'N/A'), count, start, end))
+        return tuple(events)
 
     def __dict__(self):
         """ Base values, availabe in each __dict__ call """
@@ -358,9 +675,13 @@ class EventsResponse(UnknownResponse):
         data = super().__dict__()
         data['inv_stat_num'] = self.status
         data['inv_stat_txt'] = self.a_text
+        data['events'] = [event._asdict() for event in self.events]
         return data
 
 class HardwareInfoResponse(UnknownResponse):
+    __slots__ = ()
+    layout = struct.Struct('>8H')
+
     def __init__(self, *args, **params):
         super().__init__(*args, **params)
         """
@@ -387,8 +708,9 @@ class HardwareInfoResponse(UnknownResponse):
             logging.error(f'HardwareInfoResponse: data: {self.response}')
             return data
 
-        logging.info(f'HardwareInfoResponse: {struct.unpack(">HHHHHHHH", self.response[0:16])}')
-        fw_version, fw_build_yyyy, fw_build_mmdd, fw_build_hhmm, hw_id = struct.unpack('>HHHHH', self.response[0:10])
+        fields = self.layout.unpack_from(self.response)
+        logging.info('HardwareInfoResponse: %s', fields)
+        fw_version, fw_build_yyyy, fw_build_mmdd, fw_build_hhmm, hw_id = fields[:5]
 
         fw_version_maj = int((fw_version / 10000))
         fw_version_min = int((fw_version % 10000) / 100)
@@ -397,9 +719,9 @@ class HardwareInfoResponse(UnknownResponse):
         fw_build_dd = int(fw_build_mmdd % 100)
         fw_build_HH = int(fw_build_hhmm / 100)
         fw_build_MM = int(fw_build_hhmm % 100)
-        logging.info(f'Firmware: {fw_version_maj}.{fw_version_min}.{fw_version_pat} '\
-                      f'build at {fw_build_dd:>02}/{fw_build_mm:>02}/{fw_build_yyyy}T{fw_build_HH:>02}:{fw_build_MM:>02}, '\
-                      f'HW revision {hw_id}')
+        logging.info('Firmware: %d.%d.%d build at %02d/%02d/%dT%02d:%02d, HW revision %d',
+                fw_version_maj, fw_version_min, fw_version_pat,
+                fw_build_dd, fw_build_mm, fw_build_yyyy, fw_build_HH, fw_build_MM, hw_id)
 
         data['FW_ver_maj'] = fw_version_maj
         data['FW_ver_min'] = fw_version_min
@@ -414,6 +736,7 @@ class HardwareInfoResponse(UnknownResponse):
 
 class DebugDecodeAny(UnknownResponse):
     """Default decoder"""
+    __slots__ = ()
 
     def __init__(self, *args, **params):
         super().__init__(*args, **params)
@@ -428,6 +751,10 @@ class DebugDecodeAny(UnknownResponse):
             logging.debug(' payload has valid modbus crc')
             self.response = self.response[:-2]
 
+        # field views are for debugging only
+        if not debug_enabled():
+            return
+
         l_payload = len(self.response)
         logging.debug(f' payload has {l_payload} bytes')
 
@@ -456,363 +783,261 @@ class DebugDecodeAny(UnknownResponse):
             logging.debug(' type ascii  : ascii decode error')
 
 
+def _compile_layout(name, slots):
+    """
+    One struct for a set of fields, pad bytes in between
+
+    :param str name: decoder name for error messages
+    :param list slots: sorted (start byte, struct format) tuples
+    :return: big endian struct covering all slots
+    :rtype: struct.Struct
+    :raises ValueError: if slots overlap
+    """
+    layout = '>'
+    position = 0
+    for start, fmt in slots:
+        if start < position:
+            raise ValueError(f'{name}: field at byte {start} overlaps previous field')
+        layout += 'x' * (start - position) + fmt
+        position = start + struct.calcsize('>' + fmt)
+    return struct.Struct(layout)
+
+def _channel_fields(props, prefix, keys):
+    """
+    Property names per channel, like phases and strings walk them
+
+    :param set props: property names of a field table
+    :param str prefix: 'ac' or 'dc'
+    :param tuple keys: value keys of one channel
+    :return: per channel a tuple of property names, None where missing
+    :rtype: tuple
+    """
+    channels = []
+    while any(f'{prefix}_{key}_{len(channels)}' in props for key in keys):
+        channel = [f'{prefix}_{key}_{len(channels)}' for key in keys]
+        channels.append(tuple(prop if prop in props else None for prop in channel))
+    return tuple(channels)
+
+def compile_status_decoder(name, fields, doc=None):
+    """
+    Generate a StatusResponse class from a field table
+
+    Fields are (field, channel, start, format, div) like the ESP's
+    byteAssign_t. Each becomes a property ``{field}_{channel}``, or
+    ``{field}`` for channel None, with value unpacked / div. Fields
+    sharing a start byte are unpacked once, the whole table compiles to
+    one struct.Struct. Every string with a dc_power field also gets
+    dc_irradiation relative to its configured s_maxpower.
+
+    :param str name: class name
+    :param tuple fields: field table
+    :param doc: class docstring
+    :type doc: str or None
+    :return: decoder class
+    :rtype: type
+    :raises ValueError: if fields overlap
+    """
+    slots = sorted(set((start, fmt) for field, channel, start, fmt, div in fields))
+
+    namespace = {
+            '__doc__': doc,
+            '__slots__': (),
+            'layout': _compile_layout(name, slots),
+            'projections': {},
+            'slots': tuple((start, struct.Struct('>' + fmt)) for start, fmt in slots),
+            'fields': tuple(
+                (field if channel is None else f'{field}_{channel}', slots.index((start, fmt)), div)
+                for field, channel, start, fmt, div in fields),
+            }
+
+    namespace['field_index'] = {prop: index for index, (prop, slot, div) in enumerate(namespace['fields'])}
+    props = set(namespace['field_index'])
+    namespace['phase_fields'] = _channel_fields(props, 'ac', Phase._fields)
+    namespace['string_fields'] = _channel_fields(props, 'dc', String._fields[1:-1])
+
+    for prop, index in namespace['field_index'].items():
+        namespace[prop] = property(lambda self, index=index: self.values[index])
+
+    for field, channel, start, fmt, div in fields:
+        if field == 'dc_power':
+            index = namespace['field_index'][f'dc_power_{channel}']
+            namespace[f'dc_irradiation_{channel}'] = property(
+                    lambda self, channel=channel, index=index: self.irradiation(channel, self.values[index]))
+
+    return type(name, (StatusResponse,), namespace)
+
+# Status data field tables: field, channel, start byte, struct format, divisor
+HM300_STATUS_FIELDS = (
+        ('dc_voltage',          0,     2, 'H', 10),
+        ('dc_current',          0,     4, 'H', 100),
+        ('dc_power',            0,     6, 'H', 10),
+        ('dc_energy_total',     0,     8, 'L', 1),
+        ('dc_energy_daily',     0,    12, 'H', 1),
+        ('ac_voltage',          0,    14, 'H', 10),
+        ('ac_frequency',        0,    16, 'H', 100),
+        ('ac_power',            0,    18, 'H', 10),
+        ('ac_reactive_power',   0,    20, 'H', 10),
+        ('ac_current',          0,    22, 'H', 100),
+        ('powerfactor',         None, 24, 'H', 1000),
+        ('temperature',         None, 26, 'h', 10),
+        ('event_count',         None, 28, 'H', 1),
+        )
+
+HM600_STATUS_FIELDS = (
+        ('dc_voltage',          0,     2, 'H', 10),
+        ('dc_current',          0,     4, 'H', 100),
+        ('dc_power',            0,     6, 'H', 10),
+        ('dc_voltage',          1,     8, 'H', 10),
+        ('dc_current',          1,    10, 'H', 100),
+        ('dc_power',            1,    12, 'H', 10),
+        ('dc_energy_total',     0,    14, 'L', 1),
+        ('dc_energy_total',     1,    18, 'L', 1),
+        ('dc_energy_daily',     0,    22, 'H', 1),
+        ('dc_energy_daily',     1,    24, 'H', 1),
+        ('ac_voltage',          0,    26, 'H', 10),
+        ('ac_frequency',        0,    28, 'H', 100),
+        ('ac_power',            0,    30, 'H', 10),
+        ('ac_reactive_power',   0,    32, 'H', 10),
+        ('ac_current',          0,    34, 'H', 100),
+        ('powerfactor',         None, 36, 'H', 1000),
+        ('temperature',         None, 38, 'h', 10),
+        ('event_count',         None, 40, 'H', 1),
+        )
+
+# strings 1 & 2 and 3 & 4 share their input voltage
+HM1200_STATUS_FIELDS = (
+        ('dc_voltage',          0,     2, 'H', 10),
+        ('dc_current',          0,     4, 'H', 100),
+        ('dc_voltage',          1,     2, 'H', 10),
+        ('dc_current',          1,     6, 'H', 100),
+        ('dc_power',            0,     8, 'H', 10),
+        ('dc_power',            1,    10, 'H', 10),
+        ('dc_energy_total',     0,    12, 'L', 1),
+        ('dc_energy_total',     1,    16, 'L', 1),
+        ('dc_energy_daily',     0,    20, 'H', 1),
+        ('dc_energy_daily',     1,    22, 'H', 1),
+        ('dc_voltage',          2,    24, 'H', 10),
+        ('dc_current',          2,    26, 'H', 100),
+        ('dc_voltage',          3,    24, 'H', 10),
+        ('dc_current',          3,    28, 'H', 100),
+        ('dc_power',            2,    30, 'H', 10),
+        ('dc_power',            3,    32, 'H', 10),
+        ('dc_energy_total',     2,    34, 'L', 1),
+        ('dc_energy_total',     3,    38, 'L', 1),
+        ('dc_energy_daily',     2,    42, 'H', 1),
+        ('dc_energy_daily',     3,    44, 'H', 1),
+        ('ac_voltage',          0,    46, 'H', 10),
+        ('ac_frequency',        0,    48, 'H', 100),
+        ('ac_power',            0,    50, 'H', 10),
+        ('ac_reactive_power',   0,    52, 'H', 10),
+        ('ac_current',          0,    54, 'H', 100),
+        ('powerfactor',         None, 56, 'H', 1000),
+        ('temperature',         None, 58, 'h', 10),
+        ('event_count',         None, 60, 'H', 1),
+        )
+
+
 # 1121-Series Intervers, 1 MPPT, 1 Phase
 class Hm300Decode01(HardwareInfoResponse):
     """ 1121-series Firmware version / date """
+    __slots__ = ()
 
 class Hm300Decode02(EventsResponse):
     """ 1121-series Inverter generic events log """
+    __slots__ = ()
 
-class Hm300Decode0B(StatusResponse):
-    """ 1121-series mirco-inverters status data """
-
-    @property
-    def dc_voltage_0(self):
-        """ String 1 VDC """
-        return self.unpack('>H', 2)[0]/10
-    @property
-    def dc_current_0(self):
-        """ String 1 ampere """
-        return self.unpack('>H', 4)[0]/100
-    @property
-    def dc_power_0(self):
-        """ String 1 watts """
-        return self.unpack('>H', 6)[0]/10
-    @property
-    def dc_energy_total_0(self):
-        """ String 1 total energy in Wh """
-        return self.unpack('>L', 8)[0]
-    @property
-    def dc_energy_daily_0(self):
-        """ String 1 daily energy in Wh """
-        return self.unpack('>H', 12)[0]
-    @property
-    def dc_irradiation_0(self):
-        """ String 1 irratiation in percent """
-        if self.inv_strings is None:
-          return None
-        if self.inv_strings[0]['s_maxpower'] == 0:
-            return 0.00
-        return round(self.unpack('>H', 6)[0]/10/self.inv_strings[0]['s_maxpower']*100, 3)
-
-    @property
-    def ac_voltage_0(self):
-        """ Phase 1 VAC """
-        return self.unpack('>H', 14)[0]/10
-    @property
-    def ac_current_0(self):
-        """ Phase 1 ampere """
-        return self.unpack('>H', 22)[0]/100
-    @property
-    def ac_power_0(self):
-        """ Phase 1 watts """
-        return self.unpack('>H', 18)[0]/10
-    @property
-    def ac_frequency_0(self):
-        """ Grid frequency in Hertz """
-        return self.unpack('>H', 16)[0]/100
-    @property
-    def ac_reactive_power_0(self):
-        """ reactive power """
-        return self.unpack('>H', 20)[0]/10
-    @property
-    def powerfactor(self):
-        """ Powerfactor """
-        return self.unpack('>H', 24)[0]/1000
-    @property
-    def temperature(self):
-        """ Inverter temperature in °C """
-        return self.unpack('>h', 26)[0]/10
-    @property
-    def event_count(self):
-        """ Event counter """
-        return self.unpack('>H', 28)[0]
+Hm300Decode0B = compile_status_decoder('Hm300Decode0B', HM300_STATUS_FIELDS,
+        """ 1121-series mirco-inverters status data """)
 
 class Hm300Decode0C(Hm300Decode0B):
     """ 1121-series mirco-inverters status data """
+    __slots__ = ()
 
 class Hm300Decode11(EventsResponse):
     """ 1121-series Inverter generic events log """
+    __slots__ = ()
 
 class Hm300Decode12(EventsResponse):
     """ 1121-series Inverter major events log """
+    __slots__ = ()
 
 
 # 1141-Series Inverters, 2 MPPT, 1 Phase
 class Hm600Decode01(HardwareInfoResponse):
     """ 1141-Series Firmware version / date """
+    __slots__ = ()
 
 class Hm600Decode02(EventsResponse):
     """ 1141-Series Inverter generic events log """
+    __slots__ = ()
 
-class Hm600Decode0B(StatusResponse):
-    """ 1141-series mirco-inverters status data """
-
-    @property
-    def dc_voltage_0(self):
-        """ String 1 VDC """
-        return self.unpack('>H', 2)[0]/10
-    @property
-    def dc_current_0(self):
-        """ String 1 ampere """
-        return self.unpack('>H', 4)[0]/100
-    @property
-    def dc_power_0(self):
-        """ String 1 watts """
-        return self.unpack('>H', 6)[0]/10
-    @property
-    def dc_energy_total_0(self):
-        """ String 1 total energy in Wh """
-        return self.unpack('>L', 14)[0]
-    @property
-    def dc_energy_daily_0(self):
-        """ String 1 daily energy in Wh """
-        return self.unpack('>H', 22)[0]
-    @property
-    def dc_irradiation_0(self):
-        """ String 1 irratiation in percent """
-        if self.inv_strings is None:
-          return None
-        if self.inv_strings[0]['s_maxpower'] == 0:
-            return 0.00
-        return round(self.unpack('>H', 6)[0]/10/self.inv_strings[0]['s_maxpower']*100, 3)
-
-    @property
-    def dc_voltage_1(self):
-        """ String 2 VDC """
-        return self.unpack('>H', 8)[0]/10
-    @property
-    def dc_current_1(self):
-        """ String 2 ampere """
-        return self.unpack('>H', 10)[0]/100
-    @property
-    def dc_power_1(self):
-        """ String 2 watts """
-        return self.unpack('>H', 12)[0]/10
-    @property
-    def dc_energy_total_1(self):
-        """ String 2 total energy in Wh """
-        return self.unpack('>L', 18)[0]
-    @property
-    def dc_energy_daily_1(self):
-        """ String 2 daily energy in Wh """
-        return self.unpack('>H', 24)[0]
-    @property
-    def dc_irradiation_1(self):
-        """ String 2 irratiation in percent """
-        if self.inv_strings is None:
-          return None
-        if self.inv_strings[1]['s_maxpower'] == 0:
-            return 0.00
-        return round(self.unpack('>H', 12)[0]/10/self.inv_strings[1]['s_maxpower']*100, 3)
-
-    @property
-    def ac_voltage_0(self):
-        """ Phase 1 VAC """
-        return self.unpack('>H', 26)[0]/10
-    @property
-    def ac_current_0(self):
-        """ Phase 1 ampere """
-        return self.unpack('>H', 34)[0]/100
-    @property
-    def ac_power_0(self):
-        """ Phase 1 watts """
-        return self.unpack('>H', 30)[0]/10
-    @property
-    def ac_frequency_0(self):
-        """ Grid frequency in Hertz """
-        return self.unpack('>H', 28)[0]/100
-    @property
-    def ac_reactive_power_0(self):
-        """ reactive power """
-        return self.unpack('>H', 32)[0]/10
-    @property
-    def powerfactor(self):
-        """ Powerfactor """
-        return self.unpack('>H', 36)[0]/1000
-    @property
-    def temperature(self):
-        """ Inverter temperature in °C """
-        return self.unpack('>h', 38)[0]/10
-    @property
-    def event_count(self):
-        """ Event counter """
-        return self.unpack('>H', 40)[0]
+Hm600Decode0B = compile_status_decoder('Hm600Decode0B', HM600_STATUS_FIELDS,
+        """ 1141-series mirco-inverters status data """)
 
 class Hm600Decode0C(Hm600Decode0B):
     """ 1141-series mirco-inverters status data """
+    __slots__ = ()
 
 class Hm600Decode11(EventsResponse):
     """ 1141-Series Inverter generic events log """
+    __slots__ = ()
 
 class Hm600Decode12(EventsResponse):
     """ 1141-Series Inverter major events log """
+    __slots__ = ()
 
 
-# 1161-Series Inverters, 2 MPPT, 1 Phase
+# 1161-Series Inverters, 4 MPPT, 1 Phase
 class Hm1200Decode01(HardwareInfoResponse):
     """ 1161-Series Firmware version / date """
+    __slots__ = ()
 
 class Hm1200Decode02(EventsResponse):
     """ 1161-Series Inverter generic events log """
+    __slots__ = ()
 
-class Hm1200Decode0B(StatusResponse):
-    """ 1161-series mirco-inverters status data """
-
-    @property
-    def dc_voltage_0(self):
-        """ String 1 VDC """
-        return self.unpack('>H', 2)[0]/10
-    @property
-    def dc_current_0(self):
-        """ String 1 ampere """
-        return self.unpack('>H', 4)[0]/100
-    @property
-    def dc_power_0(self):
-        """ String 1 watts """
-        return self.unpack('>H', 8)[0]/10
-    @property
-    def dc_energy_total_0(self):
-        """ String 1 total energy in Wh """
-        return self.unpack('>L', 12)[0]
-    @property
-    def dc_energy_daily_0(self):
-        """ String 1 daily energy in Wh """
-        return self.unpack('>H', 20)[0]
-    @property
-    def dc_irradiation_0(self):
-        """ String 1 irratiation in percent """
-        if self.inv_strings is None:
-          return None
-        if self.inv_strings[0]['s_maxpower'] == 0:
-            return 0.00
-        return round(self.unpack('>H', 8)[0]/10/self.inv_strings[0]['s_maxpower']*100, 3)
-
-    @property
-    def dc_voltage_1(self):
-        """ String 2 VDC """
-        return self.unpack('>H', 2)[0]/10
-    @property
-    def dc_current_1(self):
-        """ String 2 ampere """
-        return self.unpack('>H', 6)[0]/100
-    @property
-    def dc_power_1(self):
-        """ String 2 watts """
-        return self.unpack('>H', 10)[0]/10
-    @property
-    def dc_energy_total_1(self):
-        """ String 2 total energy in Wh """
-        return self.unpack('>L', 16)[0]
-    @property
-    def dc_energy_daily_1(self):
-        """ String 2 daily energy in Wh """
-        return self.unpack('>H', 22)[0]
-    @property
-    def dc_irradiation_0(self):
-        """ String 2 irratiation in percent """
-        if self.inv_strings is None:
-          return None
-        if self.inv_strings[1]['s_maxpower'] == 0:
-            return 0.00
-        return round(self.unpack('>H', 10)[0]/10/self.inv_strings[1]['s_maxpower']*100, 3)
-
-    @property
-    def dc_voltage_2(self):
-        """ String 3 VDC """
-        return self.unpack('>H', 24)[0]/10
-    @property
-    def dc_current_2(self):
-        """ String 3 ampere """
-        return self.unpack('>H', 26)[0]/100
-    @property
-    def dc_power_2(self):
-        """ String 3 watts """
-        return self.unpack('>H', 30)[0]/10
-    @property
-    def dc_energy_total_2(self):
-        """ String 3 total energy in Wh """
-        return self.unpack('>L', 34)[0]
-    @property
-    def dc_energy_daily_2(self):
-        """ String 3 daily energy in Wh """
-        return self.unpack('>H', 42)[0]
-    @property
-    def dc_irradiation_0(self):
-        """ String 3 irratiation in percent """
-        if self.inv_strings is None:
-          return None
-        if self.inv_strings[2]['s_maxpower'] == 0:
-            return 0.00
-        return round(self.unpack('>H', 30)[0]/10/self.inv_strings[2]['s_maxpower']*100, 3)
-
-    @property
-    def dc_voltage_3(self):
-        """ String 4 VDC """
-        return self.unpack('>H', 24)[0]/10
-    @property
-    def dc_current_3(self):
-        """ String 4 ampere """
-        return self.unpack('>H', 28)[0]/100
-    @property
-    def dc_power_3(self):
-        """ String 4 watts """
-        return self.unpack('>H', 32)[0]/10
-    @property
-    def dc_energy_total_3(self):
-        """ String 4 total energy in Wh """
-        return self.unpack('>L', 38)[0]
-    @property
-    def dc_energy_daily_3(self):
-        """ String 4 daily energy in Wh """
-        return self.unpack('>H', 44)[0]
-    @property
-    def dc_irradiation_0(self):
-        """ String 4 irratiation in percent """
-        if self.inv_strings is None:
-          return None
-        if self.inv_strings[3]['s_maxpower'] == 0:
-            return 0.00
-        return round(self.unpack('>H', 32)[0]/10/self.inv_strings[3]['s_maxpower']*100, 3)
-
-    @property
-    def ac_voltage_0(self):
-        """ Phase 1 VAC """
-        return self.unpack('>H', 46)[0]/10
-    @property
-    def ac_current_0(self):
-        """ Phase 1 ampere """
-        return self.unpack('>H', 54)[0]/100
-    @property
-    def ac_power_0(self):
-        """ Phase 1 watts """
-        return self.unpack('>H', 50)[0]/10
-    @property
-    def ac_frequency_0(self):
-        """ Grid frequency in Hertz """
-        return self.unpack('>H', 48)[0]/100
-    @property
-    def ac_reactive_power_0(self):
-        """ reactive power """
-        return self.unpack('>H', 52)[0]/10
-    @property
-    def powerfactor(self):
-        """ Powerfactor """
-        return self.unpack('>H', 56)[0]/1000
-    @property
-    def temperature(self):
-        """ Inverter temperature in °C """
-        return self.unpack('>h', 58)[0]/10
-    @property
-    def event_count(self):
-        """ Event counter """
-        return self.unpack('>H', 60)[0]
+Hm1200Decode0B = compile_status_decoder('Hm1200Decode0B', HM1200_STATUS_FIELDS,
+        """ 1161-series mirco-inverters status data """)
 
 class Hm1200Decode0C(Hm1200Decode0B):
     """ 1161-series mirco-inverters status data """
+    __slots__ = ()
 
 class Hm1200Decode11(EventsResponse):
     """ 1161-Series Inverter generic events log """
+    __slots__ = ()
 
 class Hm1200Decode12(EventsResponse):
     """ 1161-Series Inverter major events log """
+    __slots__ = ()
+
+
+# Request command descriptions for log messages
+COMMAND_DESCRIPTIONS = {
+        0x00: 'Inverter Dev Inform Simple',
+        0x01: 'Firmware version / date',
+        0x02: 'Inverter generic events log',
+        0x03: 'Hardware configuration',                     # HardWareConfig
+        0x04: 'Simple Calibration Parameter',               # SimpleCalibrationPara
+        0x05: 'Inverter generic SystemConfigPara',          # SystemConfigPara
+        0x0b: 'mirco-inverters status data',                # RealTimeRunData_Debug
+        0x0c: 'mirco-inverters status data',                # RealTimeRunData_Reality
+        0x0d: 'Real-Time Run Data A Phase ',                # RealTimeRunData_A_Phase
+        0x0e: 'Real-Time Run Data B Phase ',                # RealTimeRunData_B_Phase
+        0x0f: 'Real-Time Run Data C Phase ',                # RealTimeRunData_C_Phase
+        0x11: 'Inverter generic events log',                # AlarmData
+        0x12: 'Inverter major events log',                  # AlarmUpdate
+        0x13: 'Record Data',                                # RecordData
+        0x14: 'Internal Data',                              # InternalData
+        0x15: 'Get Loss Rate',                              # GetLossRate
+        0x1e: 'Get Self Check State',                       # GetSelfCheckState
+        0xff: 'Initi Data State',                           # InitDataState
+        }
+
+# Decoder classes by (model, request command), from the {model}Decode{command} names
+DECODERS = {}
+for _name, _decoder in list(globals().items()):
+    _match = re.match(r'^(Hm\d+)Decode([0-9A-F]{2})$', _name)
+    if _match:
+        DECODERS[(_match.group(1), int(_match.group(2), 16))] = _decoder
+del _name, _decoder, _match
@@ -0,0 +1,145 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Vectorized decoding of status payloads with NumPy
+
+For backfilling archives of captured traffic: many RealTimeRunData
+payloads of one inverter model are decoded in one go into columns
+instead of one StatusResponse per payload. The NumPy record dtype is
+derived from the same field tables as the per-object decoders, so both
+decode the same values.
+
+NumPy is optional, install with: python3 -m pip install numpy
+"""
+
+from . import DECODERS, StatusResponse, Phase, String
+
+try:
+    import numpy
+except ModuleNotFoundError:
+    numpy = None
+
+# struct format characters to NumPy big endian type codes
+NUMPY_TYPES = {
+        'B': 'u1', 'b': 'i1',
+        'H': '>u2', 'h': '>i2',
+        'I': '>u4', 'i': '>i4',
+        'L': '>u4', 'l': '>i4',
+        'Q': '>u8', 'q': '>i8',
+        }
+
+def status_decoder(model, command=0x0b):
+    """
+    Status decoder class of a model
+
+    :param str model: inverter model, e.g. 'Hm600'
+    :param int command: 0x0b or 0x0c
+    :return: decoder class generated by compile_status_decoder
+    :rtype: type
+    :raises ValueError: when there is no status decoder for model and command
+    """
+    decoder = DECODERS.get((model, command))
+    if decoder is None or not issubclass(decoder, StatusResponse) or decoder.layout is None:
+        raise ValueError(f'No status decoder for {model} command {command:#04x}')
+    return decoder
+
+def status_dtype(decoder, record_size=None):
+    """
+    NumPy record type of a status decoder's payload layout
+
+    :param type decoder: decoder class generated by compile_status_decoder
+    :param record_size: bytes per payload, default the layout size
+    :type record_size: int or None
+    :return: structured dtype with one field per slot, named by start byte
+    :rtype: numpy.dtype
+    :raises ValueError: when the payloads are shorter than the layout
+    """
+    if record_size is None:
+        record_size = decoder.layout.size
+    if record_size < decoder.layout.size:
+        raise ValueError(f'{decoder.__name__} needs {decoder.layout.size} bytes per payload, got {record_size}')
+
+    names = []
+    formats = []
+    offsets = []
+    for start, slot in decoder.slots:
+        names.append(f's{start}')
+        formats.append(NUMPY_TYPES[slot.format.lstrip('>')])
+        offsets.append(start)
+    return numpy.dtype({'names': names, 'formats': formats, 'offsets': offsets, 'itemsize': record_size})
+
+def decode_status_batch(model, buffer, record_size=None, strings=None, command=0x0b):
+    """
+    Decode many status payloads of one model into columns
+
+    Columns are named like the decoder properties (ac_power_0,
+    dc_energy_total_1, temperature, ...). Scaled values are float64,
+    unscaled ones keep their integer type. With a strings config there
+    are also dc_irradiation_N, yield_total, yield_today and efficiency
+    columns, computed like StatusResponse.snapshot().
+
+    :param str model: inverter model, e.g. 'Hm600'
+    :param buffer: payloads back to back, or a sequence of equally long payloads
+    :type buffer: bytes, bytearray, memoryview or list
+    :param record_size: bytes per payload, default the layout size
+    :type record_size: int or None
+    :param strings: inverter strings config, list of dicts with s_name and s_maxpower
+    :type strings: list or None
+    :param int command: 0x0b or 0x0c
+    :return: column arrays by name, each one entry per payload
+    :rtype: dict
+    :raises ModuleNotFoundError: when NumPy is not installed
+    :raises ValueError: on an unknown model or a buffer that does not split into payloads
+    """
+    if numpy is None:
+        raise ModuleNotFoundError('Module "numpy" for batch decoding necessary. Install module with command: python3 -m pip install numpy')
+
+    decoder = status_decoder(model, command)
+
+    if isinstance(buffer, (list, tuple)):
+        sizes = set(len(payload) for payload in buffer)
+        if len(sizes) > 1:
+            raise ValueError(f'Payloads differ in size: {sorted(sizes)}')
+        if record_size is None and sizes:
+            record_size = sizes.pop()
+        buffer = b''.join(buffer)
+
+    dtype = status_dtype(decoder, record_size)
+    if len(buffer) % dtype.itemsize:
+        raise ValueError(f'Buffer of {len(buffer)} bytes is no multiple of {dtype.itemsize} byte payloads')
+    records = numpy.frombuffer(buffer, dtype=dtype)
+
+    columns = {}
+    for prop, slot, div in decoder.fields:
+        raw = records[f's{decoder.slots[slot][0]}']
+        if div != 1:
+            columns[prop] = raw / div
+        else:
+            columns[prop] = raw.astype(raw.dtype.newbyteorder('='))
+
+    if strings:
+        string_fields = decoder.string_fields[:len(strings)]
+        phase_power = Phase._fields.index('power')
+        power = String._fields.index('power') - 1
+        energy_total = String._fields.index('energy_total') - 1
+        energy_daily = String._fields.index('energy_daily') - 1
+
+        zeros = numpy.zeros(len(records))
+        for string_id, props in enumerate(string_fields):
+            maxpower = strings[string_id]['s_maxpower']
+            if maxpower == 0:
+                columns[f'dc_irradiation_{string_id}'] = zeros.copy()
+            else:
+                columns[f'dc_irradiation_{string_id}'] = numpy.round(columns[props[power]] / maxpower * 100, 3)
+
+        columns['yield_total'] = sum((columns[props[energy_total]] for props in string_fields), zeros)
+        columns['yield_today'] = sum((columns[props[energy_daily]] for props in string_fields), zeros)
+
+        ac_sum_power = sum((columns[props[phase_power]] for props in decoder.phase_fields), zeros)
+        dc_sum_power = sum((columns[props[power]] for props in string_fields), zeros)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            efficiency = numpy.round(ac_sum_power * 100 / dc_sum_power, 2)
+        columns['efficiency'] = numpy.where(dc_sum_power != 0, efficiency, 0.0)
+
+    return columns
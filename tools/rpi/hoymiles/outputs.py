@@ -5,12 +5,29 @@
 Hoymiles output plugin library
 """
 
+import re
 import socket
 import logging
 from datetime import datetime, timezone
-from hoymiles.decoders import StatusResponse, HardwareInfoResponse
+from hoymiles.decoders import StatusResponse, StatusSnapshot, HardwareInfoResponse
 from hoymiles import HOYMILES_TRANSACTION_LOGGING, HOYMILES_DEBUG_LOGGING
 
+def status_snapshot(response):
+    """
+    Snapshot to store for a status response
+
+    :param response: decoded status response or its snapshot
+    :type response: hoymiles.decoders.StatusResponse or hoymiles.decoders.StatusSnapshot
+    :return: snapshot, None if the payload could not be decoded
+    :rtype: hoymiles.decoders.StatusSnapshot or None
+    :raises ValueError: when response is neither
+    """
+    if isinstance(response, StatusSnapshot):
+        return response
+    if isinstance(response, StatusResponse):
+        return response.snapshot()
+    raise ValueError('Data needs to be instance of StatusResponse')
+
 class OutputPluginFactory:
     def __init__(self, **params):
         """
@@ -20,11 +37,27 @@ class OutputPluginFactory:
         :type inverter_ser: str
         :param inverter_name: The configured name for the inverter
         :type inverter_name: str
+        :param fields: status fields to store, e.g. ['ac_power_0', 'yield_today'] (default: all)
+        :type fields: list or None
         """
 
         self.inverter_ser = params.get('inverter_ser', '')
         self.inverter_name = params.get('inverter_name', None)
 
+        fields = params.get('fields', None)
+        self.fields = frozenset(fields) if fields is not None else None
+
+    def required_fields(self, inverter_ser):
+        """
+        Status fields this plugin stores for an inverter, the decoder
+        unpacks only those some output stores
+
+        :param inverter_ser: inverter serial
+        :return: decoder property names, derived values like yield_total or efficiency, None for all
+        :rtype: frozenset or None
+        """
+        return self.fields
+
     def store_status(self, response, **params):
         """
         Default function
@@ -89,18 +122,33 @@ class InfluxOutputPlugin(OutputPluginFactory):
         :raises ValueError: when response is not instance of StatusResponse
         """
 
-        if not isinstance(response, StatusResponse):
-            raise ValueError('Data needs to be instance of StatusResponse')
+        snapshot = status_snapshot(response)
+        if snapshot is None:
+            logging.warning('received data object is empty')
+            return
 
-        data = response.__dict__()
+        data_stack = snapshot.view(('influx', self._measurement, self.fields), self.format_lines)
 
-        measurement = self._measurement + f',location={data["inverter_ser"]}'
+        if HOYMILES_DEBUG_LOGGING:
+            #logging.debug(f'INFLUX data to DB: {data_stack}')
+            pass
+        self.api.write(self._bucket, self._org, data_stack)
+
+    def format_lines(self, snapshot):
+        """
+        Influx line protocol records of a snapshot
+
+        :param hoymiles.decoders.StatusSnapshot snapshot: status data
+        :return: records
+        :rtype: list
+        """
+        measurement = self._measurement + f',location={snapshot.inverter_ser}'
 
         data_stack = []
 
         time_rx = datetime.now()
-        if 'time' in data and isinstance(data['time'], datetime):
-            time_rx = data['time']
+        if isinstance(snapshot.time, datetime):
+            time_rx = snapshot.time
 
         # InfluxDB uses UTC
         utctime = datetime.fromtimestamp(time_rx.timestamp(), tz=timezone.utc)
@@ -111,43 +159,44 @@ class InfluxOutputPlugin(OutputPluginFactory):
         if HOYMILES_DEBUG_LOGGING:
             logging.info(f'InfluxDB: utctime: {utctime}')
 
+        fields = self.fields
+
+        def add(field, tags, value, fmt='', div=1):
+            # fields not decoded are None, see required_fields
+            if value is not None and (fields is None or field in fields):
+                if div != 1:
+                    value = value / div
+                data_stack.append(f'{measurement},{tags} value={value:{fmt}} {ctime}')
+
         # AC Data
         phase_id = 0
-        for phase in data['phases']:
-            data_stack.append(f'{measurement},phase={phase_id},type=voltage value={phase["voltage"]} {ctime}')
-            data_stack.append(f'{measurement},phase={phase_id},type=current value={phase["current"]} {ctime}')
-            data_stack.append(f'{measurement},phase={phase_id},type=power value={phase["power"]} {ctime}')
-            data_stack.append(f'{measurement},phase={phase_id},type=Q_AC value={phase["reactive_power"]} {ctime}')
-            data_stack.append(f'{measurement},phase={phase_id},type=frequency value={phase["frequency"]:.3f} {ctime}')
+        for phase in snapshot.phases:
+            add(f'ac_voltage_{phase_id}', f'phase={phase_id},type=voltage', phase.voltage)
+            add(f'ac_current_{phase_id}', f'phase={phase_id},type=current', phase.current)
+            add(f'ac_power_{phase_id}', f'phase={phase_id},type=power', phase.power)
+            add(f'ac_reactive_power_{phase_id}', f'phase={phase_id},type=Q_AC', phase.reactive_power)
+            add(f'ac_frequency_{phase_id}', f'phase={phase_id},type=frequency', phase.frequency, '.3f')
             phase_id = phase_id + 1
 
         # DC Data
         string_id = 0
-        for string in data['strings']:
-            data_stack.append(f'{measurement},string={string_id},type=voltage value={string["voltage"]:.3f} {ctime}')
-            data_stack.append(f'{measurement},string={string_id},type=current value={string["current"]:3f} {ctime}')
-            data_stack.append(f'{measurement},string={string_id},type=power value={string["power"]:.2f} {ctime}')
-            data_stack.append(f'{measurement},string={string_id},type=YieldDay value={string["energy_daily"]:.2f} {ctime}')
-            data_stack.append(f'{measurement},string={string_id},type=YieldTotal value={string["energy_total"]/1000:.4f} {ctime}')
-            data_stack.append(f'{measurement},string={string_id},type=Irradiation value={string["irradiation"]:.2f} {ctime}')
+        for string in snapshot.strings:
+            add(f'dc_voltage_{string_id}', f'string={string_id},type=voltage', string.voltage, '.3f')
+            add(f'dc_current_{string_id}', f'string={string_id},type=current', string.current, '3f')
+            add(f'dc_power_{string_id}', f'string={string_id},type=power', string.power, '.2f')
+            add(f'dc_energy_daily_{string_id}', f'string={string_id},type=YieldDay', string.energy_daily, '.2f')
+            add(f'dc_energy_total_{string_id}', f'string={string_id},type=YieldTotal', string.energy_total, '.4f', 1000)
+            add(f'dc_irradiation_{string_id}', f'string={string_id},type=Irradiation', string.irradiation, '.2f')
             string_id = string_id + 1
 
         # Global
-        if data['event_count'] is not None:
-            data_stack.append(f'{measurement},type=total_events value={data["event_count"]} {ctime}')
-        if data['powerfactor'] is not None:
-            data_stack.append(f'{measurement},type=PF_AC value={data["powerfactor"]:f} {ctime}')
-        data_stack.append(f'{measurement},type=Temp value={data["temperature"]:.2f} {ctime}')
-        if data['yield_total'] is not None:
-            data_stack.append(f'{measurement},type=YieldTotal value={data["yield_total"]/1000:.3f} {ctime}')
-        if data['yield_today'] is not None:
-            data_stack.append(f'{measurement},type=YieldToday value={data["yield_today"]/1000:.3f} {ctime}')
-        data_stack.append(f'{measurement},type=Efficiency value={data["efficiency"]:.2f} {ctime}')
-
-        if HOYMILES_DEBUG_LOGGING:
-            #logging.debug(f'INFLUX data to DB: {data_stack}')
-            pass
-        self.api.write(self._bucket, self._org, data_stack)
+        add('event_count', 'type=total_events', snapshot.event_count)
+        add('powerfactor', 'type=PF_AC', snapshot.powerfactor, 'f')
+        add('temperature', 'type=Temp', snapshot.temperature, '.2f')
+        add('yield_total', 'type=YieldTotal', snapshot.yield_total, '.3f', 1000)
+        add('yield_today', 'type=YieldToday', snapshot.yield_today, '.3f', 1000)
+        add('efficiency', 'type=Efficiency', snapshot.efficiency, '.2f')
+        return data_stack
 
 class MqttOutputPlugin(OutputPluginFactory):
     """ Mqtt output plugin """
@@ -167,6 +216,8 @@ class MqttOutputPlugin(OutputPluginFactory):
         :type password: str or None
         :param topic: Topic prefix to use (defaults to: hoymiles/{inverter_ser})
         :type topic: str
+        :param fields: status fields to publish (defaults to: all)
+        :type fields: list
 
         :param paho.mqtt.client.Client broker: mqtt-client instance
         :param str inverter_ser: inverter serial
@@ -226,7 +277,10 @@ class MqttOutputPlugin(OutputPluginFactory):
         :raises ValueError: when response is not instance of StatusResponse
         """
 
-        data = response.__dict__()
+        if isinstance(response, HardwareInfoResponse):
+            data = response.__dict__()
+        else:
+            data = status_snapshot(response)
 
         if data is None:
             logging.warn("received data object is empty")
@@ -234,63 +288,19 @@ class MqttOutputPlugin(OutputPluginFactory):
 
         topic = params.get('topic', None)
         if not topic:
-            topic = f'{data.get("inverter_name", "hoymiles")}/{data.get("inverter_ser", None)}'
+            if isinstance(data, StatusSnapshot):
+                topic = f'{data.inverter_name or "hoymiles"}/{data.inverter_ser}'
+            else:
+                topic = f'{data.get("inverter_name", "hoymiles")}/{data.get("inverter_ser", None)}'
 
         if HOYMILES_DEBUG_LOGGING:
             logging.info(f'MQTT-topic: {topic} data-type: {type(response)}')
 
-        if isinstance(response, StatusResponse):
-
-            # Global Head
-            if data['time'] is not None:
-               self.client.publish(f'{topic}/time', data['time'].strftime("%d.%m.%YT%H:%M:%S"), self.qos, self.ret)
-
-            # AC Data
-            phase_id = 0
-            phase_sum_power = 0
-            if data['phases'] is not None:
-                for phase in data['phases']:
-                    self.client.publish(f'{topic}/emeter/{phase_id}/voltage', phase['voltage'], self.qos, self.ret)
-                    self.client.publish(f'{topic}/emeter/{phase_id}/current', phase['current'], self.qos, self.ret)
-                    self.client.publish(f'{topic}/emeter/{phase_id}/power', phase['power'], self.qos, self.ret)
-                    self.client.publish(f'{topic}/emeter/{phase_id}/Q_AC', phase['reactive_power'], self.qos, self.ret)
-                    self.client.publish(f'{topic}/emeter/{phase_id}/frequency', phase['frequency'], self.qos, self.ret)
-                    phase_id = phase_id + 1
-                    phase_sum_power += phase['power']
-
-            # DC Data
-            string_id = 0
-            string_sum_power = 0
-            if data['strings'] is not None:
-                for string in data['strings']:
-                    if 'name' in string:
-                        string_name = string['name'].replace(" ","_")
-                    else:
-                        string_name = string_id
-                    self.client.publish(f'{topic}/emeter-dc/{string_name}/voltage', string['voltage'], self.qos, self.ret)
-                    self.client.publish(f'{topic}/emeter-dc/{string_name}/current', string['current'], self.qos, self.ret)
-                    self.client.publish(f'{topic}/emeter-dc/{string_name}/power', string['power'], self.qos, self.ret)
-                    self.client.publish(f'{topic}/emeter-dc/{string_name}/YieldDay', string['energy_daily'], self.qos, self.ret)
-                    self.client.publish(f'{topic}/emeter-dc/{string_name}/YieldTotal', string['energy_total']/1000, self.qos, self.ret)
-                    self.client.publish(f'{topic}/emeter-dc/{string_name}/Irradiation', string['irradiation'], self.qos, self.ret)
-                    string_id = string_id + 1
-                    string_sum_power += string['power']
-
-            # Global
-            if data['event_count'] is not None:
-               self.client.publish(f'{topic}/total_events', data['event_count'], self.qos, self.ret)
-            if data['powerfactor'] is not None:
-               self.client.publish(f'{topic}/PF_AC', data['powerfactor'], self.qos, self.ret)
-            self.client.publish(f'{topic}/Temp', data['temperature'], self.qos, self.ret)
-            if data['yield_total'] is not None:
-               self.client.publish(f'{topic}/YieldTotal', data['yield_total']/1000, self.qos, self.ret)
-            if data['yield_today'] is not None:
-               self.client.publish(f'{topic}/YieldToday', data['yield_today']/1000, self.qos, self.ret)
-            if data['efficiency'] is not None:
-                self.client.publish(f'{topic}/Efficiency', data['efficiency'], self.qos, self.ret)
-
-
-        elif isinstance(response, HardwareInfoResponse):
+        if isinstance(data, StatusSnapshot):
+            for subtopic, value in data.view(('mqtt', topic, self.fields), lambda snapshot: self.format_messages(snapshot, topic)):
+                self.client.publish(subtopic, value, self.qos, self.ret)
+
+        else:
             if data["FW_ver_maj"] is not None and data["FW_ver_min"] is not None and data["FW_ver_pat"] is not None:
                 self.client.publish(f'{topic}/Firmware/Version',\
                     f'{data["FW_ver_maj"]}.{data["FW_ver_min"]}.{data["FW_ver_pat"]}', self.qos, self.ret)
@@ -304,8 +314,58 @@ class MqttOutputPlugin(OutputPluginFactory):
                 self.client.publish(f'{topic}/Firmware/HWPartId',\
                     f'{data["FW_HW_ID"]}', self.qos, self.ret)
 
-        else:
-             raise ValueError('Data needs to be instance of StatusResponse or a instance of HardwareInfoResponse')
+    def format_messages(self, snapshot, topic):
+        """
+        Mqtt messages of a snapshot
+
+        :param hoymiles.decoders.StatusSnapshot snapshot: status data
+        :param str topic: topic prefix
+        :return: (topic, payload) tuples
+        :rtype: list
+        """
+        messages = []
+        fields = self.fields
+
+        def add(field, subtopic, value, div=1):
+            # fields not decoded are None, see required_fields
+            if value is not None and (fields is None or field in fields):
+                messages.append((f'{topic}/{subtopic}', value / div if div != 1 else value))
+
+        # Global Head
+        if snapshot.time is not None:
+            messages.append((f'{topic}/time', snapshot.time.strftime("%d.%m.%YT%H:%M:%S")))
+
+        # AC Data
+        phase_id = 0
+        for phase in snapshot.phases:
+            add(f'ac_voltage_{phase_id}', f'emeter/{phase_id}/voltage', phase.voltage)
+            add(f'ac_current_{phase_id}', f'emeter/{phase_id}/current', phase.current)
+            add(f'ac_power_{phase_id}', f'emeter/{phase_id}/power', phase.power)
+            add(f'ac_reactive_power_{phase_id}', f'emeter/{phase_id}/Q_AC', phase.reactive_power)
+            add(f'ac_frequency_{phase_id}', f'emeter/{phase_id}/frequency', phase.frequency)
+            phase_id = phase_id + 1
+
+        # DC Data
+        for string_id, string in enumerate(snapshot.strings):
+            string_name = string.name.replace(" ","_")
+            add(f'dc_voltage_{string_id}', f'emeter-dc/{string_name}/voltage', string.voltage)
+            add(f'dc_current_{string_id}', f'emeter-dc/{string_name}/current', string.current)
+            add(f'dc_power_{string_id}', f'emeter-dc/{string_name}/power', string.power)
+            add(f'dc_energy_daily_{string_id}', f'emeter-dc/{string_name}/YieldDay', string.energy_daily)
+            add(f'dc_energy_total_{string_id}', f'emeter-dc/{string_name}/YieldTotal', string.energy_total, 1000)
+            add(f'dc_irradiation_{string_id}', f'emeter-dc/{string_name}/Irradiation', string.irradiation)
+
+        # Global
+        add('event_count', 'total_events', snapshot.event_count)
+        add('powerfactor', 'PF_AC', snapshot.powerfactor)
+        add('temperature', 'Temp', snapshot.temperature)
+        add('yield_total', 'YieldTotal', snapshot.yield_total, 1000)
+        add('yield_today', 'YieldToday', snapshot.yield_today, 1000)
+        add('efficiency', 'Efficiency', snapshot.efficiency)
+        return messages
+
+# volkszaehler channel type to status field, ac_power0 -> ac_power_0
+VZ_CHANNEL_FIELD = re.compile(r'^(\w+?)_?(\d+)$')
 
 class VzInverterOutput:
     def __init__(self, config, session):
@@ -321,55 +381,85 @@ class VzInverterOutput:
             if ctype:
                 self.channels[ctype] = uid
 
-    def store_status(self, data, session):
+    def required_fields(self):
         """
-        Publish StatusResponse object
+        Status fields of the channels with a uid
 
-        :param hoymiles.decoders.StatusResponse response: StatusResponse object
+        :return: field names
+        :rtype: frozenset
+        """
+        fields = set()
+        for ctype, uid in self.channels.items():
+            if uid is None:
+                continue
+            match = VZ_CHANNEL_FIELD.match(ctype)
+            fields.add(f'{match.group(1)}_{match.group(2)}' if match else ctype)
+        return frozenset(fields)
+
+    def store_status(self, snapshot, session):
+        """
+        Publish StatusSnapshot object
 
-        :raises ValueError: when response is not instance of StatusResponse
+        :param hoymiles.decoders.StatusSnapshot snapshot: status data
         """
         if len(self.channels) == 0:
             return
 
-        ts = int(round(data['time'].timestamp() * 1000))
+        ts, values = snapshot.view('volkszaehler', self.format_values)
 
         if HOYMILES_DEBUG_LOGGING:
             logging.info(f'Volkszaehler-Timestamp: {ts}')
 
+        for ctype, value in values:
+            self.try_publish(ts, ctype, value)
+        return
+
+    @staticmethod
+    def format_values(snapshot):
+        """
+        Channel values of a snapshot
+
+        :param hoymiles.decoders.StatusSnapshot snapshot: status data
+        :return: timestamp in ms and (channel type, value) tuples
+        :rtype: tuple
+        """
+        ts = int(round(snapshot.time.timestamp() * 1000))
+        values = []
+
+        def add(ctype, value):
+            # fields not decoded are None, see required_fields
+            if value is not None:
+                values.append((ctype, value))
+
         # AC Data
         phase_id = 0
-        for phase in data['phases']:
-            self.try_publish(ts, f'ac_voltage{phase_id}', phase['voltage'])
-            self.try_publish(ts, f'ac_current{phase_id}', phase['current'])
-            self.try_publish(ts, f'ac_power{phase_id}', phase['power'])
-            self.try_publish(ts, f'ac_reactive_power{phase_id}', phase['reactive_power'])
-            self.try_publish(ts, f'ac_frequency{phase_id}', phase['frequency'])
+        for phase in snapshot.phases:
+            add(f'ac_voltage{phase_id}', phase.voltage)
+            add(f'ac_current{phase_id}', phase.current)
+            add(f'ac_power{phase_id}', phase.power)
+            add(f'ac_reactive_power{phase_id}', phase.reactive_power)
+            add(f'ac_frequency{phase_id}', phase.frequency)
             phase_id = phase_id + 1
 
         # DC Data
         string_id = 0
-        for string in data['strings']:
-            self.try_publish(ts, f'dc_voltage{string_id}', string['voltage'])
-            self.try_publish(ts, f'dc_current{string_id}', string['current'])
-            self.try_publish(ts, f'dc_power{string_id}', string['power'])
-            self.try_publish(ts, f'dc_energy_daily{string_id}', string['energy_daily'])
-            self.try_publish(ts, f'dc_energy_total{string_id}', string['energy_total'])
-            self.try_publish(ts, f'dc_irradiation{string_id}', string['irradiation'])
+        for string in snapshot.strings:
+            add(f'dc_voltage{string_id}', string.voltage)
+            add(f'dc_current{string_id}', string.current)
+            add(f'dc_power{string_id}', string.power)
+            add(f'dc_energy_daily{string_id}', string.energy_daily)
+            add(f'dc_energy_total{string_id}', string.energy_total)
+            add(f'dc_irradiation{string_id}', string.irradiation)
             string_id = string_id + 1
 
         # Global
-        if data['event_count'] is not None:
-            self.try_publish(ts, f'event_count', data['event_count'])
-        if data['powerfactor'] is not None:
-            self.try_publish(ts, f'powerfactor', data['powerfactor'])
-        self.try_publish(ts, f'temperature', data['temperature'])
-        if data['yield_total'] is not None:
-            self.try_publish(ts, f'yield_total', data['yield_total'])
-        if data['yield_today'] is not None:
-            self.try_publish(ts, f'yield_today', data['yield_today'])
-        self.try_publish(ts, f'efficiency', data['efficiency'])
-        return
+        add('event_count', snapshot.event_count)
+        add('powerfactor', snapshot.powerfactor)
+        add('temperature', snapshot.temperature)
+        add('yield_total', snapshot.yield_total)
+        add('yield_today', snapshot.yield_today)
+        add('efficiency', snapshot.efficiency)
+        return ts, values
 
     def try_publish(self, ts, ctype, value):
         if not ctype in self.channels:
@@ -429,6 +519,19 @@ class VolkszaehlerOutputPlugin(OutputPluginFactory):
         self.session.close()            # closing the connection
         return
 
+    def required_fields(self, inverter_ser):
+        """
+        Status fields of the configured channels of an inverter
+
+        :param inverter_ser: inverter serial
+        :return: field names, empty if the inverter has no channels
+        :rtype: frozenset
+        """
+        output = self.inverters.get(inverter_ser, None)
+        if output is None:
+            return frozenset()
+        return output.required_fields()
+
     def store_status(self, response, **params):
         """
         Publish StatusResponse object
@@ -439,18 +542,16 @@ class VolkszaehlerOutputPlugin(OutputPluginFactory):
         """
 
         # check decoder object for output
-        if not isinstance(response, StatusResponse):
-            raise ValueError('Data needs to be instance of StatusResponse')
+        snapshot = status_snapshot(response)
 
-        if len(self.inverters) == 0:
+        if len(self.inverters) == 0 or snapshot is None:
             return
 
-        data = response.__dict__()
-        serial = data["inverter_ser"]
+        serial = snapshot.inverter_ser
         if serial in self.inverters:
             output = self.inverters[serial]
             try:
-                output.store_status(data, self.session)
+                output.store_status(snapshot, self.session)
             except ValueError as e:
                 logging.warning('Could not send data to volkszaehler instance: %s' % e)
         return
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Hoymiles micro-inverters radio simulator
+
+Replays inverter responses recorded in transaction logs, like
+example-logs/example.log, instead of talking to nRF24 hardware.
+"""
+
+import re
+import time
+import random
+import logging
+from datetime import datetime
+from hoymiles import RadioTransport, InverterPacketFragment, f_crc8, ser_to_hm_addr
+
+LOG_LINE = re.compile(r'(Transmit|Received)\b[^|:]*[|:]\s*((?:[0-9a-fA-F]{2}\s?)+)$')
+
+def load_capture(filename):
+    """
+    Collect complete responses from a transaction log
+
+    Fragments are grouped by sequence number until an end frame arrives,
+    only responses with all fragments present are kept.
+
+    :param str filename: transaction log, lines 'Transmit ...: <hex>' and 'Received ...: <hex>'
+    :return: lists of response fragments per request command byte
+    :rtype: dict
+    """
+    responses = {}
+    command = None
+    fragments = {}
+
+    with open(filename, 'r') as fh_capture:
+        for line in fh_capture:
+            match = LOG_LINE.search(line.strip())
+            if not match:
+                continue
+            frame = bytes.fromhex(match.group(2))
+
+            if match.group(1) == 'Transmit':
+                if len(frame) > 10 and frame[9] == 0x80:
+                    command = frame[10]
+                continue
+
+            if len(frame) < 11 or f_crc8(frame[:-1]) != frame[-1]:
+                continue
+
+            seq = frame[9]
+            if seq in fragments:
+                fragments = {}
+            fragments[seq] = frame
+
+            if seq > 0x80:
+                if all(frame_id in fragments for frame_id in range(1, seq - 0x80)):
+                    response = [fragments[frame_id] for frame_id in range(1, seq - 0x80)] + [frame]
+                    responses.setdefault(command, []).append(response)
+                fragments = {}
+
+    return responses
+
+class SimulatorRadio(RadioTransport):
+    """
+    Simulated radio, answers requests with recorded responses
+
+    Responses are re-addressed to the requested inverter, so one capture
+    serves any number of configured inverters. Retransmit requests get the
+    requested fragment of the last response.
+    """
+    channels = [3,23,40,61,75]
+
+    def __init__(self, capture='example-logs/example.log', loss=0.0, reorder=0.0,
+            latency=0.0, realtime=True, seed=None, silent=(), **params):
+        """
+        :param str capture: transaction log to replay
+        :param float loss: probability to lose a fragment
+        :param float reorder: probability to swap a fragment with its successor
+        :param float latency: seconds on air per fragment
+        :param bool realtime: sleep for latency and receive timeouts like a real radio
+        :param seed: random seed for reproducible loss and reordering
+        :type seed: int or None
+        :param silent: serials of inverters which never answer
+        :type silent: list
+        """
+        self.responses = load_capture(capture)
+        if not self.responses:
+            raise ValueError(f'No complete responses found in {capture}')
+
+        self.loss = loss
+        self.reorder = reorder
+        self.latency = latency
+        self.realtime = realtime
+        self.random = random.Random(seed)
+        self.silent = [ser_to_hm_addr(inverter_ser) for inverter_ser in silent]
+
+        self.response_id = {}
+        self.last_response = {}
+        self.pending = []
+        self.tx_channel_id = 0
+        self.transmissions = 0
+
+        logging.info(f'Simulator: {sum(len(r) for r in self.responses.values())} responses loaded from {capture}')
+
+    @property
+    def tx_channel(self):
+        """Channel of the last transmission"""
+        return self.channels[self.tx_channel_id]
+
+    def readdress(self, fragment, inverter_addr):
+        """
+        Rewrite recorded fragment as sent by another inverter
+
+        :param bytes fragment: recorded fragment
+        :param bytes inverter_addr: 4 bytes hm address of the requested inverter
+        :return: fragment with inverter address and crc8 replaced
+        :rtype: bytes
+        """
+        frame = bytearray(fragment)
+        src = bytes(frame[1:5])
+        frame[1:5] = inverter_addr
+        if frame[5:9] == src:
+            frame[5:9] = inverter_addr
+        frame[-1] = f_crc8(bytes(frame[:-1]))
+        return bytes(frame)
+
+    def transmit(self, packet, txpower=None):
+        """
+        Queue response to a request
+
+        :param bytes packet: ESB packet to send
+        :return: always True, like an ACK
+        :rtype: bool
+        """
+        self.transmissions += 1
+        self.tx_channel_id = (self.tx_channel_id + 1) % len(self.channels)
+
+        inverter_addr = packet[1:5]
+        seq = packet[9]
+
+        # inverters answer the latest request only
+        self.pending = []
+
+        if inverter_addr in self.silent:
+            return False
+
+        if seq == 0x80:
+            command = packet[10]
+            recorded = self.responses.get(command, [])
+            if not recorded:
+                return True
+            key = (inverter_addr, command)
+            response_id = self.response_id.get(key, 0)
+            self.response_id[key] = (response_id + 1) % len(recorded)
+            response = [self.readdress(fragment, inverter_addr) for fragment in recorded[response_id]]
+            self.last_response[inverter_addr] = response
+        else:
+            # retransmit request for fragment seq - 0x80
+            response = self.last_response.get(inverter_addr, [])
+            frame_id = seq - 0x80
+            response = [fragment for fragment in response if fragment[9] & 0x7f == frame_id]
+
+        pending = [fragment for fragment in response if self.random.random() >= self.loss]
+        for i_fragment in range(len(pending) - 1):
+            if self.random.random() < self.reorder:
+                pending[i_fragment], pending[i_fragment + 1] = pending[i_fragment + 1], pending[i_fragment]
+        self.pending = pending
+
+        return True
+
+    def receive(self, timeout=None, frame_timeout=None):
+        """
+        Receive queued fragments
+
+        :param timeout: timeout for the first fragment in nanoseconds (default: 5e8)
+        :type timeout: int
+        :param frame_timeout: timeout after each fragment in nanoseconds (default: 5e8)
+        :type frame_timeout: int
+        :yields: fragment
+        :raises TimeoutError: if nothing was received
+        """
+        if not timeout:
+            timeout = 5e8
+        if not frame_timeout:
+            frame_timeout = 5e8
+
+        received_sth = False
+        while self.pending:
+            payload = self.pending.pop(0)
+            if self.realtime and self.latency:
+                time.sleep(self.latency)
+            ch_rx = self.channels[self.random.randrange(len(self.channels))]
+            received_sth = True
+            yield InverterPacketFragment(
+                    payload=payload,
+                    ch_rx=ch_rx, ch_tx=self.tx_channel,
+                    time_rx=datetime.now())
+
+        # listen until timeout after the last fragment
+        if self.realtime:
+            time.sleep((frame_timeout if received_sth else timeout) / 1e9)
+
+        if not received_sth:
+            raise TimeoutError
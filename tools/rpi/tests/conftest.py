@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+"""
+Shared fixtures of the hoymiles tests
+
+Run from tools/rpi:
+    python3 -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+RPI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, RPI_DIR)
+
+import hoymiles
+from hoymiles.simulator import SimulatorRadio
+
+CAPTURE = os.path.join(RPI_DIR, 'example-logs', 'example.log')
+DTU_SER = 99978563412
+STRINGS = [{'s_name': 'String 1', 's_maxpower': 400}, {'s_name': 'String 2', 's_maxpower': 400}]
+
+@pytest.fixture
+def radio():
+    """Simulated radio replaying example.log without sleeping"""
+    return SimulatorRadio(CAPTURE, realtime=False, seed=1)
+
+@pytest.fixture
+def session():
+    """Session of an HM-600 inverter"""
+    return hoymiles.InverterSession({'serial': 114172220143, 'name': 'hm600', 'strings': STRINGS}, DTU_SER)
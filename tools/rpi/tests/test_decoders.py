@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+"""Compiled status decoders, snapshots and field projection"""
+
+import random
+import struct
+import threading
+from datetime import datetime
+
+import pytest
+
+from hoymiles.decoders import (DECODERS, HM300_STATUS_FIELDS, HM600_STATUS_FIELDS, HM1200_STATUS_FIELDS,
+        StatusSnapshot)
+
+MODELS = {
+        'Hm300': HM300_STATUS_FIELDS,
+        'Hm600': HM600_STATUS_FIELDS,
+        'Hm1200': HM1200_STATUS_FIELDS,
+        }
+
+TIME_RX = datetime(2024, 6, 1, 12, 0, 0)
+
+def strings_config(count):
+    return [{'s_name': f'String {string_id + 1}', 's_maxpower': 400} for string_id in range(count)]
+
+def payloads(size, count=20, seed=1):
+    rnd = random.Random(seed)
+    return [bytes(rnd.randrange(256) for _ in range(size)) for _ in range(count)]
+
+def reference_values(table, payload):
+    """Field by field unpack of a field table"""
+    values = {}
+    for field, channel, start, fmt, div in table:
+        prop = field if channel is None else f'{field}_{channel}'
+        raw = struct.unpack_from('>' + fmt, payload, start)[0]
+        values[prop] = raw / div if div != 1 else raw
+    return values
+
+def decode(model, payload, **params):
+    decoder = DECODERS[(model, 0x0b)]
+    strings = strings_config(len(decoder.string_fields))
+    return decoder(payload, time_rx=TIME_RX, inverter_ser='114172220143', strings=strings, **params)
+
+@pytest.mark.parametrize('model', MODELS)
+def test_compiled_decoder_matches_field_table(model):
+    table = MODELS[model]
+    for payload in payloads(DECODERS[(model, 0x0b)].layout.size + 2):
+        result = decode(model, payload)
+        for prop, value in reference_values(table, payload).items():
+            assert getattr(result, prop) == value, prop
+
+def test_shared_input_voltage():
+    payload = payloads(DECODERS[('Hm1200', 0x0b)].layout.size + 2, count=1)[0]
+    result = decode('Hm1200', payload)
+    assert result.dc_voltage_0 == result.dc_voltage_1
+    assert result.dc_voltage_2 == result.dc_voltage_3
+
+def test_short_payload():
+    result = decode('Hm600', b'\x00' * 10)
+    assert result.unpack_error
+    assert result.snapshot() is None
+
+@pytest.mark.parametrize('model', MODELS)
+def test_snapshot_matches_properties(model):
+    payload = payloads(DECODERS[(model, 0x0b)].layout.size + 2, count=1)[0]
+    result = decode(model, payload)
+    snapshot = result.snapshot()
+
+    for phase_id, phase in enumerate(snapshot.phases):
+        assert phase.power == getattr(result, f'ac_power_{phase_id}')
+        assert phase.voltage == getattr(result, f'ac_voltage_{phase_id}')
+    for string_id, string in enumerate(snapshot.strings):
+        assert string.power == getattr(result, f'dc_power_{string_id}')
+        assert string.irradiation == getattr(result, f'dc_irradiation_{string_id}')
+    assert snapshot.yield_total == sum(string.energy_total for string in snapshot.strings)
+    assert snapshot.temperature == result.temperature
+    assert snapshot.event_count == result.event_count
+    assert snapshot.time == TIME_RX
+    assert result.__dict__() == snapshot.as_dict()
+
+def test_snapshot_immutable():
+    snapshot = decode('Hm600', payloads(44, count=1)[0]).snapshot()
+    assert isinstance(snapshot, StatusSnapshot)
+    with pytest.raises(AttributeError):
+        snapshot.temperature = 0
+
+def test_snapshot_view_built_once():
+    snapshot = decode('Hm600', payloads(44, count=1)[0]).snapshot()
+    builds = []
+    build = lambda snapshot: builds.append(snapshot) or len(builds)
+    assert snapshot.view('key', build) == 1
+    assert snapshot.view('key', build) == 1
+    assert snapshot.view('other', build) == 2
+
+@pytest.mark.parametrize('model', MODELS)
+def test_batch_matches_decoder(model):
+    batch = pytest.importorskip('hoymiles.decoders.batch')
+    pytest.importorskip('numpy')
+
+    decoder = DECODERS[(model, 0x0b)]
+    strings = strings_config(len(decoder.string_fields))
+    records = payloads(decoder.layout.size + 2)
+    columns = batch.decode_status_batch(model, records, strings=strings)
+
+    for row, payload in enumerate(records):
+        result = decode(model, payload)
+        snapshot = result.snapshot()
+        for prop, slot, div in decoder.fields:
+            assert columns[prop][row] == getattr(result, prop), prop
+        assert columns['yield_today'][row] == snapshot.yield_today
+        assert columns['efficiency'][row] == snapshot.efficiency
+
+@pytest.mark.parametrize('model', MODELS)
+def test_projection_decodes_only_requested(model):
+    fields = frozenset(['ac_power_0', 'temperature'])
+    for payload in payloads(DECODERS[(model, 0x0b)].layout.size + 2):
+        full = decode(model, payload)
+        projected = decode(model, payload, fields=fields)
+        snapshot = projected.snapshot()
+
+        assert projected.ac_power_0 == full.ac_power_0
+        assert projected.temperature == full.temperature
+        assert projected.ac_voltage_0 is None
+        assert projected.dc_power_0 is None
+        assert snapshot.phases[0].power == full.ac_power_0
+        assert snapshot.phases[0].voltage is None
+        assert snapshot.event_count is None
+        assert snapshot.efficiency is None
+
+def test_projection_derived_values():
+    payload = payloads(44, count=1)[0]
+    full = decode('Hm600', payload).snapshot()
+    snapshot = decode('Hm600', payload, fields=frozenset(['efficiency', 'yield_today', 'dc_irradiation_1'])).snapshot()
+
+    assert snapshot.efficiency == full.efficiency
+    assert snapshot.yield_today == full.yield_today
+    assert snapshot.strings[1].irradiation == full.strings[1].irradiation
+    # inputs of derived values are not stored
+    assert snapshot.strings[1].power is None
+    assert snapshot.phases[0].power is None
+    assert snapshot.yield_total is None
+
+def test_projection_compiled_once_concurrently():
+    decoder = DECODERS[('Hm600', 0x0b)]
+    fields = frozenset(['ac_power_0', 'dc_power_1'])
+    barrier = threading.Barrier(8)
+    projections = []
+
+    def project():
+        barrier.wait()
+        projections.append(decoder.projection(fields))
+
+    threads = [threading.Thread(target=project) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(projection is projections[0] for projection in projections)
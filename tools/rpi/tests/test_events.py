@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+"""Alarm log records"""
+
+import struct
+
+import hoymiles
+from hoymiles.decoders import Event
+
+def alarm_payload(status, records):
+    """AlarmData response payload: status, 12 byte records, Modbus CRC"""
+    data = struct.pack('>H', status)
+    for word, count, start, end in records:
+        data += struct.pack('>HHHH', word, count, start, end) + b'\x00\x00\x00\x00'
+    return hoymiles.frame_payload(data)
+
+def hours(hour, minute=0):
+    return hour * 3600 + minute * 60
+
+def test_alarm_times():
+    # record layout and AM/PM flags like parseAlarmLog() in src/hm/hmInverter.h
+    payload = alarm_payload(1, [
+            (0x0193, 1, hours(9), hours(9, 5)),         # morning
+            (0x3191, 2, hours(1), hours(1, 5)),         # afternoon
+            (0x1191, 3, hours(11, 50), hours(0, 10)),   # ends after noon
+            ])
+    decoder = hoymiles.find_decoder('Hm600', hoymiles.InfoCommands.AlarmData)
+    events = decoder(payload, inverter_ser='114172220143').events
+
+    assert events == (
+            Event(0x01, 147, 'Power grid outage', 1, hours(9), hours(9, 5)),
+            Event(0x31, 145, 'Grid underfrequency', 2, hours(13), hours(13, 5)),
+            Event(0x11, 145, 'Grid underfrequency', 3, hours(11, 50), hours(12, 10)),
+            )
+
+def test_alarm_status():
+    payload = alarm_payload(130, [])
+    result = hoymiles.find_decoder('Hm600', hoymiles.InfoCommands.AlarmData)(payload, inverter_ser='114172220143')
+
+    assert result.events == ()
+    assert result.__dict__()['inv_stat_txt'] == 'Offline'
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+"""Payloads injected via the mqtt command topic"""
+
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+import hoymiles
+import hoymiles.__main__ as main
+
+TOPIC = 'hm600/command'
+
+@pytest.fixture
+def scheduler(monkeypatch, session):
+    scheduler = hoymiles.CommandScheduler()
+    monkeypatch.setattr(main, 'command_scheduler', scheduler, raising=False)
+    monkeypatch.setattr(main, 'inverter_sessions', {str(session.serial): session}, raising=False)
+    monkeypatch.setattr(main, 'mqtt_command_topic_subs', [(str(session.serial), TOPIC)], raising=False)
+    return scheduler
+
+def command(payload, topic=TOPIC):
+    main.mqtt_on_command(None, None, SimpleNamespace(topic=topic, payload=payload.encode('utf-8')))
+
+def test_command_queued(scheduler, session):
+    command('800b00tttttttt0000000500000000')
+
+    entry = scheduler.get(session.serial)
+    assert entry.priority == hoymiles.CommandScheduler.CONTROL
+    assert entry.request[10] == 0x0b
+    assert len(entry.request) == 10 + 14 + 2 + 1
+
+def test_command_too_long_rejected(scheduler, session, caplog):
+    with caplog.at_level(logging.WARNING):
+        command('80' + '00' * 16)
+    assert scheduler.depth(session.serial) == 0
+    assert 'rejected' in caplog.text
+
+def test_command_no_hex_rejected(scheduler, session, caplog):
+    with caplog.at_level(logging.WARNING):
+        command('80zz')
+    assert scheduler.depth(session.serial) == 0
+    assert 'no hexlified payload' in caplog.text
+
+def test_command_unknown_topic(scheduler, caplog):
+    with caplog.at_level(logging.WARNING):
+        command('800b', topic='other/command')
+    assert scheduler.depth() == 0
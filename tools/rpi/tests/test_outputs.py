@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+"""Output plugins store only their configured fields"""
+
+from datetime import datetime
+
+from hoymiles.outputs import OutputPluginFactory, MqttOutputPlugin, InfluxOutputPlugin
+from hoymiles.__main__ import required_fields
+from conftest import STRINGS
+import hoymiles
+
+PAYLOAD = bytes(range(1, 45))
+SERIAL = '114172220143'
+
+class Recorder:
+    """Stands in for the mqtt client and the influx write api"""
+    def __init__(self):
+        self.records = []
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.records.append(topic)
+
+    def write(self, bucket, org, records):
+        self.records.extend(records)
+
+def mqtt_output(fields=None):
+    output = MqttOutputPlugin.__new__(MqttOutputPlugin)
+    OutputPluginFactory.__init__(output, fields=fields)
+    output.client = Recorder()
+    output.qos = 0
+    output.ret = True
+    return output
+
+def influx_output(fields=None):
+    output = InfluxOutputPlugin.__new__(InfluxOutputPlugin)
+    OutputPluginFactory.__init__(output, fields=fields)
+    output._bucket = 'test'
+    output._org = ''
+    output._measurement = 'hoymiles'
+    output.api = Recorder()
+    return output
+
+def store(outputs):
+    """Decode like poll_inverter and store one snapshot in all outputs"""
+    fields = required_fields(SERIAL, outputs)
+    decoder = hoymiles.find_decoder('Hm600', 0x0b)
+    snapshot = decoder(PAYLOAD, time_rx=datetime(2024, 6, 1, 12), inverter_ser=SERIAL,
+            strings=STRINGS, fields=fields).snapshot()
+    for output in outputs:
+        output.store_status(snapshot, topic='hm600')
+
+def test_sinks_with_own_fields():
+    mqtt = mqtt_output(['ac_power_0'])
+    influx = influx_output(['temperature', 'yield_today'])
+    store([mqtt, influx])
+
+    assert mqtt.client.records == ['hm600/time', 'hm600/emeter/0/power']
+    assert [record.split(' ')[0] for record in influx.api.records] == \
+            ['hoymiles,location=114172220143,type=Temp', 'hoymiles,location=114172220143,type=YieldToday']
+
+def test_sink_fields_next_to_default_sink():
+    mqtt = mqtt_output(['ac_power_0'])
+    influx = influx_output()
+    store([mqtt, influx])
+
+    # everything is decoded for the default sink, mqtt still publishes its field only
+    assert mqtt.client.records == ['hm600/time', 'hm600/emeter/0/power']
+    assert len(influx.api.records) == 5 + 2 * 6 + 6
+    assert any('type=total_events' in record for record in influx.api.records)
+
+def test_event_count_published_only_if_listed():
+    mqtt = mqtt_output(['ac_power_0'])
+    store([mqtt])
+    assert 'hm600/total_events' not in mqtt.client.records
+
+    mqtt = mqtt_output(['event_count'])
+    store([mqtt])
+    assert mqtt.client.records == ['hm600/time', 'hm600/total_events']
+
+def test_default_sink_publishes_all():
+    mqtt = mqtt_output()
+    store([mqtt])
+    assert len(mqtt.client.records) == 1 + 5 + 2 * 6 + 6
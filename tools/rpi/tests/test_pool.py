@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+"""Radio pool: inverter assignment and parallel polling"""
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from hoymiles import RadioPool
+
+def inverters(*radio_ids):
+    return [SimpleNamespace(serial=str(1000 + n), radio_id=radio_id) for n, radio_id in enumerate(radio_ids)]
+
+def test_pinned_inverters_stay_on_their_radio():
+    pool = RadioPool(['nrf0', 'nrf1'])
+    pinned = inverters(1, 1, 1)
+    assert pool.assign(pinned) == [[], pinned]
+
+def test_balanced_by_success_rate():
+    pool = RadioPool(['nrf0', 'nrf1'], retries=9)
+    flaky, good_a, good_b = inverters(None, None, None)
+    for answered in (True, False) * 5:
+        pool.report(flaky.serial, answered)
+    assert pool.cost(flaky.serial) == 3
+    assigned = pool.assign([good_a, good_b, flaky])
+    assert assigned[0] == [flaky]
+    assert assigned[1] == [good_a, good_b]
+
+def test_unknown_radio_balanced(caplog):
+    pool = RadioPool(['nrf0', 'nrf1'])
+    assigned = pool.assign(inverters(7, None))
+    assert sorted(len(radio_inverters) for radio_inverters in assigned) == [1, 1]
+    assert 'radio 7 not configured' in caplog.text
+
+def test_poll_on_all_radios():
+    pool = RadioPool(['nrf0', 'nrf1'])
+    polled = {}
+
+    def poll(inverter, radio):
+        polled[inverter.serial] = (radio, threading.current_thread().name)
+        return True
+
+    pool.poll(inverters(None, None, None, None), poll)
+    assert sorted(polled.values()) == [('nrf0', 'radio0')] * 2 + [('nrf1', 'radio1')] * 2
+    assert pool.success_rate('1000') == 1.0
+
+def test_poll_raises_callback_error():
+    pool = RadioPool(['nrf0'])
+
+    def poll(inverter, radio):
+        raise RuntimeError('radio gone')
+
+    with pytest.raises(RuntimeError):
+        pool.poll(inverters(None), poll)
+
+def test_empty_pool_rejected():
+    with pytest.raises(ValueError):
+        RadioPool([])
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+"""Command scheduler, poll deadlines, airtime budget and the gateway module import"""
+
+import subprocess
+import sys
+
+import hoymiles
+from hoymiles import InfoCommands, CommandScheduler, PollSchedule, AirtimeBudget, RadioPool
+from hoymiles.__main__ import create_airtime_budget
+from conftest import RPI_DIR, DTU_SER
+
+def test_commands_by_priority():
+    scheduler = CommandScheduler()
+    scheduler.put('1', InfoCommands.AlarmData)
+    scheduler.put('1', InfoCommands.RealTimeRunData_Debug)
+    scheduler.put('1', request=b'\x15injected')
+
+    assert scheduler.get('1').priority == CommandScheduler.CONTROL
+    assert scheduler.get('1').command == InfoCommands.RealTimeRunData_Debug
+    assert scheduler.get('1').command == InfoCommands.AlarmData
+    assert scheduler.get('1') is None
+
+def test_commands_fifo_within_priority():
+    scheduler = CommandScheduler()
+    scheduler.put('1', InfoCommands.InverterDevInform_All)
+    scheduler.put('1', InfoCommands.AlarmData)
+
+    assert scheduler.get('1').command == InfoCommands.InverterDevInform_All
+    assert scheduler.get('1').command == InfoCommands.AlarmData
+
+def test_pending_duplicates_merged():
+    scheduler = CommandScheduler()
+    assert scheduler.put('1', InfoCommands.AlarmData, alarm_id=3)
+    assert not scheduler.put('1', InfoCommands.AlarmData, alarm_id=7)
+    assert scheduler.depth('1') == 1
+
+    entry = scheduler.get('1')
+    assert entry.alarm_id == 7
+    assert scheduler.report()['1']['merged'] == 1
+
+def test_commands_per_inverter():
+    scheduler = CommandScheduler()
+    scheduler.put('1', InfoCommands.RealTimeRunData_Debug)
+    scheduler.put('2', InfoCommands.RealTimeRunData_Debug)
+
+    assert scheduler.depth() == 2
+    assert scheduler.get('3') is None
+    assert scheduler.get('1') is not None
+    assert scheduler.depth('1') == 0
+    assert scheduler.depth('2') == 1
+
+def test_commands_filtered_by_priority():
+    scheduler = CommandScheduler()
+    scheduler.put('1', InfoCommands.RealTimeRunData_Debug)
+    scheduler.put('1', InfoCommands.AlarmData)
+
+    assert scheduler.get('1', [CommandScheduler.INFO]).command == InfoCommands.AlarmData
+    assert scheduler.get('1', [CommandScheduler.INFO]) is None
+    assert scheduler.get('1').command == InfoCommands.RealTimeRunData_Debug
+
+def test_import_keeps_signal_handlers():
+    check = ('import signal, hoymiles.__main__; '
+            'assert signal.getsignal(signal.SIGTERM) is signal.SIG_DFL')
+    subprocess.run([sys.executable, '-c', check], cwd=RPI_DIR, check=True)
+
+def test_deadlines_drift_free():
+    schedule = PollSchedule()
+    schedule.add('1', InfoCommands.RealTimeRunData_Debug, 10, now=100.0)
+
+    assert [task.command for task in schedule.due(100.0)] == [InfoCommands.RealTimeRunData_Debug]
+    assert schedule.due(105.0) == []
+    assert schedule.wait(105.0) == 5.0
+
+    # a late cycle does not shift later deadlines
+    assert len(schedule.due(113.0)) == 1
+    assert schedule.wait(113.0) == 7.0
+
+def test_missed_deadlines_counted():
+    schedule = PollSchedule()
+    schedule.add('1', InfoCommands.RealTimeRunData_Debug, 10, now=0.0)
+    schedule.due(0.0)
+
+    assert len(schedule.due(35.0)) == 1
+    stats = schedule.report(35.0)['1'][InfoCommands.RealTimeRunData_Debug]
+    assert stats['missed'] == 2
+    assert stats['runs'] == 2
+    assert stats['jitter_max'] == 5.0
+    assert schedule.wait(35.0) == 5.0
+
+def test_due_realtime_first():
+    schedule = PollSchedule()
+    schedule.add('1', InfoCommands.InverterDevInform_All, 3600, now=0.0)
+    schedule.add('1', InfoCommands.RealTimeRunData_Debug, 10, now=0.0)
+
+    assert [task.command for task in schedule.due(0.0)] == \
+            [InfoCommands.RealTimeRunData_Debug, InfoCommands.InverterDevInform_All]
+
+def test_sample_age():
+    schedule = PollSchedule()
+    schedule.add('1', InfoCommands.RealTimeRunData_Debug, 10, now=0.0)
+    assert schedule.report(0.0)['1'][InfoCommands.RealTimeRunData_Debug]['age'] is None
+
+    schedule.sampled('1', InfoCommands.RealTimeRunData_Debug, now=2.0)
+    assert schedule.report(12.0)['1'][InfoCommands.RealTimeRunData_Debug]['age'] == 10.0
+
+def test_low_priority_stretched_over_budget():
+    schedule = PollSchedule()
+    schedule.add('1', InfoCommands.RealTimeRunData_Debug, 10, now=0.0)
+    schedule.add('1', InfoCommands.InverterDevInform_All, 100, now=0.0)
+
+    # radios busy 9 of 10 seconds, load is measured over a realtime cadence
+    assert schedule.cycle(9.0, now=9.0) is None
+    assert schedule.cycle(9.0, now=19.0) == 2
+    report = schedule.report(19.0)['1']
+    assert report[InfoCommands.RealTimeRunData_Debug]['cadence'] == 10
+    assert report[InfoCommands.InverterDevInform_All]['cadence'] == 200
+
+    # idle radios halve the stretch again
+    assert schedule.cycle(1.0, now=29.0) == 1
+
+def test_restart_makes_all_due():
+    schedule = PollSchedule()
+    schedule.add('1', InfoCommands.RealTimeRunData_Debug, 10, now=0.0)
+    schedule.add('1', InfoCommands.InverterDevInform_All, 3600, now=0.0)
+    schedule.due(0.0)
+
+    schedule.restart(now=50000.0)
+    assert len(schedule.due(50000.0)) == 2
+    assert schedule.report(50000.0)['1'][InfoCommands.InverterDevInform_All]['missed'] == 0
+
+def test_airtime_split_across_inverters_and_classes():
+    budget = AirtimeBudget(packets=40)
+    budget.start_cycle(['1', '2'])
+
+    realtime = budget.account('1', CommandScheduler.REALTIME)
+    info = budget.account('1', CommandScheduler.INFO)
+    assert realtime.remaining() == 15
+    assert info.remaining() == 5
+
+    assert realtime.grant(10) == 10
+    realtime.spend(10, 0.1)
+    assert realtime.grant(10) == 5
+    assert budget.report()['1']['exhausted'] == 1
+
+def test_airtime_used_up_class_not_offered():
+    budget = AirtimeBudget(packets=4)
+    budget.start_cycle(['1'])
+    budget.account('1', CommandScheduler.REALTIME).spend(3, 0.1)
+
+    assert budget.priorities('1') == [CommandScheduler.CONTROL, CommandScheduler.INFO]
+
+def test_airtime_unlimited():
+    budget = AirtimeBudget()
+    budget.start_cycle(['1'])
+    account = budget.account('1', CommandScheduler.REALTIME)
+
+    assert account.remaining() is None
+    assert account.grant(100) == 100
+    assert budget.report()['1']['used'] is None
+
+def test_retries_weighted_by_success_rate():
+    rates = {'1': 1.0, '2': 0.5, '3': 0.0}
+    budget = AirtimeBudget(success_rate=rates.get)
+
+    assert budget.retries('1', 5) == 5
+    assert budget.retries('2', 5) == 3
+    assert budget.retries('3', 5) == 1
+
+def sessions(count, **config):
+    return [hoymiles.InverterSession(dict(config, serial=114172220000 + i), DTU_SER) for i in range(count)]
+
+def test_airtime_unlimited_without_config():
+    inverters = sessions(4)
+    budget = create_airtime_budget({'interval': 5}, inverters, 1)
+    budget.start_cycle([inverter.serial for inverter in inverters])
+
+    for inverter in inverters:
+        account = budget.account(inverter.serial, CommandScheduler.REALTIME)
+        account.spend(50, 10.0)
+        assert account.remaining() is None
+        assert account.grant(10) == 10
+
+def test_airtime_from_config():
+    inverters = sessions(2)
+    budget = create_airtime_budget({'interval': 5, 'airtime': {'packets': 40}}, inverters, 2)
+    assert budget.packets == 40
+    assert budget.seconds == PollSchedule.budget * 5 * 2
+
+    budget = create_airtime_budget({'interval': 5, 'airtime': {'seconds': 1.5}}, inverters, 2)
+    assert budget.packets is None
+    assert budget.seconds == 1.5
+
+def test_radio_cost_matches_weighted_retries():
+    pool = RadioPool([object()], retries=5)
+    rates = {'1': 1.0, '2': 0.5, '3': 0.0}
+    for inverter_ser, success_rate in rates.items():
+        for _ in range(RadioPool.history):
+            pool.report(inverter_ser, False)
+        for success in range(int(success_rate * RadioPool.history)):
+            pool.report(inverter_ser, True)
+
+    budget = AirtimeBudget(success_rate=pool.success_rate)
+    assert pool.cost('1') == 1
+    # 3 transmissions, the last two only if the inverter did not answer
+    assert pool.cost('2') == 1 + 0.5 * (budget.retries('2', 5) - 1) == 2
+    assert pool.cost('3') == budget.retries('3', 5) == 1
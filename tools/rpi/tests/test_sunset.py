@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+"""Night, dawn and dusk modes of the main loop and dawn probes"""
+
+import logging
+from datetime import datetime, timedelta
+
+import pytest
+
+import hoymiles
+import hoymiles.__main__ as main
+from hoymiles import InverterHealth
+from hoymiles.__main__ import SunsetHandler, probe_inverter
+from hoymiles.simulator import SimulatorRadio
+from conftest import CAPTURE
+
+DAY = datetime(2024, 6, 1)
+
+class FixedSunTimes:
+    """Sunrise at 04:00 and sunset at 20:00 UTC every day"""
+    def riseutc(self, day):
+        return datetime(day.year, day.month, day.day, 4, 0)
+
+    def setutc(self, day):
+        return datetime(day.year, day.month, day.day, 20, 0)
+
+@pytest.fixture
+def sunset():
+    handler = SunsetHandler({'disabled': False, 'latitude': 52.5, 'longitude': 13.4, 'altitude': 0,
+            'twilight': 1800, 'probe_interval': 60, 'wakeup': 300})
+    handler.suntimes = FixedSunTimes()
+    handler.sun_days = {}
+    return handler
+
+def at(hour, minute=0):
+    return DAY + timedelta(hours=hour, minutes=minute)
+
+def test_disabled_always_day():
+    handler = SunsetHandler({'disabled': True})
+    assert handler.mode(False, at(0)) == SunsetHandler.DAY
+
+def test_phases(sunset):
+    assert sunset.phase(at(1)) == SunsetHandler.NIGHT
+    assert sunset.phase(at(3, 45)) == SunsetHandler.DAWN
+    assert sunset.phase(at(12)) == SunsetHandler.DAY
+    assert sunset.phase(at(19, 45)) == SunsetHandler.DUSK
+    assert sunset.phase(at(23)) == SunsetHandler.NIGHT
+
+def test_night_wakes_on_timer(sunset):
+    assert sunset.mode(False, at(1)) == SunsetHandler.NIGHT
+    assert sunset.wait(at(1)) == 300
+    # wakes up at the start of dawn
+    assert sunset.wait(at(3, 28)) == 120
+    assert sunset.next_dawn(at(23)) == DAY + timedelta(days=1, hours=3, minutes=30)
+
+def test_dawn_probes_until_online(sunset):
+    assert sunset.mode(False, at(3, 40)) == SunsetHandler.DAWN
+    assert sunset.wait(at(3, 40)) == 60
+    assert sunset.mode(True, at(3, 41)) == SunsetHandler.DAY
+
+def test_dusk_polls_until_offline(sunset):
+    assert sunset.mode(True, at(19, 50)) == SunsetHandler.DAY
+    assert sunset.mode(False, at(19, 55)) == SunsetHandler.NIGHT
+    # no polling again before dawn, even if an inverter still shows online
+    assert sunset.mode(True, at(19, 56)) == SunsetHandler.NIGHT
+
+def test_day_after_dawn_without_answer(sunset):
+    assert sunset.mode(False, at(4, 40)) == SunsetHandler.DAY
+
+class PolarSunTimes:
+    """Polar night in December and January, polar day in June and July"""
+    def riseutc(self, day):
+        if day.month in (12, 1):
+            return 'PN'
+        if day.month in (6, 7):
+            return 'PD'
+        return datetime(day.year, day.month, day.day, 4, 0)
+
+    setutc = riseutc
+
+def test_polar_night_is_night(sunset, caplog):
+    sunset.suntimes = PolarSunTimes()
+    noon = datetime(2024, 12, 20, 12, 0)
+
+    with caplog.at_level(logging.WARNING):
+        assert sunset.mode(False, noon) == SunsetHandler.NIGHT
+        assert sunset.mode(True, noon + timedelta(hours=1)) == SunsetHandler.NIGHT
+    assert caplog.text.count('No sunrise') == 1
+
+    assert sunset.next_dawn(noon) is None
+    assert sunset.wait(noon) == 60
+
+def test_polar_day_is_day(sunset):
+    sunset.suntimes = PolarSunTimes()
+    midnight = datetime(2024, 6, 20, 0, 0)
+
+    assert sunset.mode(False, midnight) == SunsetHandler.DAY
+
+def test_polar_night_ends(sunset):
+    sunset.suntimes = PolarSunTimes()
+    last_night = datetime(2024, 1, 31, 12, 0)
+
+    assert sunset.mode(False, last_night) == SunsetHandler.NIGHT
+    # first sunrise within the coming days, sleep until then
+    assert sunset.next_dawn(last_night) == datetime(2024, 2, 1, 3, 30)
+    assert sunset.wait(last_night) == 300
+
+@pytest.fixture
+def probes(monkeypatch):
+    monkeypatch.setattr(main, 'airtime_budget', hoymiles.AirtimeBudget(), raising=False)
+    monkeypatch.setattr(main, 'command_scheduler', hoymiles.CommandScheduler(), raising=False)
+    monkeypatch.setattr(main, 'mqtt_client', None, raising=False)
+
+def go_offline(health):
+    for _ in range(InverterHealth.offline_after + 2):
+        health.record(False)
+    assert health.offline
+
+def test_silent_dawn_probe_keeps_backoff(probes, session):
+    go_offline(session.health)
+    backoff = session.health.backoff
+    radio = SimulatorRadio(CAPTURE, realtime=False, silent=[session.serial])
+
+    assert probe_inverter(session, radio, dawn=True) is None
+    assert session.health.backoff == backoff
+    assert probe_inverter(session, radio) is False
+    assert session.health.backoff == 2 * backoff
+
+def test_dawn_probe_answer_online(probes, session, radio):
+    go_offline(session.health)
+    assert probe_inverter(session, radio, dawn=True) is True
+    assert not session.health.offline
+
+def test_backoff_reset_at_sunrise():
+    health = InverterHealth('test')
+    go_offline(health)
+    assert not health.due()
+
+    health.reset_backoff()
+    assert health.due()
+    assert health.backoff == InverterHealth.min_backoff
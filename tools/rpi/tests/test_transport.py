@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+"""Fragment reassembly, transactions on the simulated radio and inverter health"""
+
+import sys
+import struct
+import threading
+
+import pytest
+
+import hoymiles
+from hoymiles import InverterPacketFragment, ReassemblyBuffer, InverterHealth, InverterTransaction
+from hoymiles.simulator import SimulatorRadio
+from conftest import CAPTURE, DTU_SER
+
+def response_fragments(radio, session):
+    """Fragments of one recorded realtime data response"""
+    radio.transmit(session.time_request(hoymiles.InfoCommands.RealTimeRunData_Debug))
+    return list(radio.receive())
+
+def test_transaction_payload(radio, session):
+    request = session.time_request(hoymiles.InfoCommands.RealTimeRunData_Debug)
+    com = InverterTransaction(radio=radio, session=session, request=request)
+
+    assert com.rxtx()
+    result = session.decode(com.get_payload(), request, time_rx=com.time_rx)
+    assert isinstance(result, hoymiles.decoders.StatusResponse)
+    assert result.snapshot() is not None
+
+def test_silent_inverter_no_contact(session):
+    radio = SimulatorRadio(CAPTURE, realtime=False, silent=[session.serial])
+    com = InverterTransaction(radio=radio, session=session,
+            request=session.time_request(hoymiles.InfoCommands.RealTimeRunData_Debug))
+    assert not com.rxtx()
+
+def test_corrupt_fragment_rejected(radio, session):
+    frame = bytearray(response_fragments(radio, session)[0].frame)
+    frame[12] ^= 0xff
+    with pytest.raises(BufferError):
+        InverterPacketFragment(payload=bytes(frame))
+
+def test_reassembly_in_order(radio, session):
+    fragments = response_fragments(radio, session)
+    buffer = ReassemblyBuffer()
+    for fragment in fragments:
+        assert not buffer.complete
+        assert buffer.add(fragment)
+
+    assert buffer.complete
+    assert buffer.missing() == []
+    assert buffer.crc_valid()
+    assert buffer.payload() == b''.join(bytes(fragment.data) for fragment in fragments)
+
+def test_reassembly_out_of_order(radio, session):
+    fragments = response_fragments(radio, session)
+    buffer = ReassemblyBuffer()
+    for fragment in reversed(fragments):
+        buffer.add(fragment)
+
+    assert buffer.complete
+    assert buffer.crc_valid()
+
+def test_reassembly_duplicate_ignored(radio, session):
+    fragments = response_fragments(radio, session)
+    buffer = ReassemblyBuffer()
+    assert buffer.add(fragments[0])
+    assert not buffer.add(fragments[0])
+    assert buffer.count == 1
+
+def test_reassembly_missing(radio, session):
+    first, middle, end = response_fragments(radio, session)
+
+    buffer = ReassemblyBuffer()
+    buffer.add(first)
+    assert buffer.missing() == [2]
+
+    buffer.add(end)
+    assert not buffer.complete
+    assert buffer.missing() == [2]
+
+    buffer.add(middle)
+    assert buffer.complete
+
+def renumber(fragment, seq):
+    """Fragment with another sequence byte"""
+    frame = bytearray(fragment.frame)
+    frame[9] = seq
+    frame[-1] = hoymiles.f_crc8(bytes(frame[:-1]))
+    return InverterPacketFragment(payload=bytes(frame))
+
+def test_reassembly_stray_frame_after_end(radio, session):
+    first, middle, end = response_fragments(radio, session)
+    buffer = ReassemblyBuffer()
+    buffer.add(first)
+    buffer.add(end)
+    assert not buffer.add(renumber(middle, 0x05))
+    buffer.add(middle)
+
+    assert buffer.complete
+    assert buffer.crc_valid()
+
+def test_reassembly_stray_frame_before_end(radio, session):
+    first, middle, end = response_fragments(radio, session)
+    buffer = ReassemblyBuffer()
+    buffer.add(renumber(middle, 0x05))
+    buffer.add(first)
+    assert buffer.missing() == [2, 3, 4, 6]
+
+    buffer.add(end)
+    assert buffer.missing() == [2]
+    buffer.add(middle)
+    assert buffer.complete
+    assert buffer.crc_valid()
+    assert buffer.payload() == b''.join(bytes(fragment.data) for fragment in (first, middle, end))
+
+def test_reassembly_missing_ids_below_retransmit_flag(radio, session):
+    first = response_fragments(radio, session)[0]
+    buffer = ReassemblyBuffer()
+    buffer.add(renumber(first, 0x7e))
+    assert max(buffer.missing()) == 0x7e - 1
+
+    buffer.add(renumber(first, 0x7f))
+    assert max(buffer.missing()) < 0x7f
+
+def test_transaction_retransmits_lost_fragment(session):
+    radio = SimulatorRadio(CAPTURE, realtime=False, seed=1)
+    request = session.time_request(hoymiles.InfoCommands.RealTimeRunData_Debug)
+    radio.transmit(request)
+    first, middle, end = radio.receive()
+
+    com = InverterTransaction(radio=radio, session=session, request=request, scratch=[first, end])
+    com.tx_queue = []
+    with pytest.raises(BufferError):
+        com.get_payload()
+    assert [packet[9] for packet in com.tx_queue] == [0x82]
+
+    # the simulator answers with the requested fragment of the last response
+    assert com.rxtx()
+    assert com.get_payload() == b''.join(bytes(fragment.data) for fragment in (first, middle, end))
+
+def test_transaction_retransmits_all_lost_fragments(session):
+    radio = SimulatorRadio(CAPTURE, realtime=False, seed=1)
+    request = session.time_request(hoymiles.InfoCommands.RealTimeRunData_Debug)
+    radio.transmit(request)
+    first, middle, end = radio.receive()
+
+    com = InverterTransaction(radio=radio, session=session, request=request, scratch=[end])
+    com.tx_queue = []
+    with pytest.raises(BufferError):
+        com.get_payload()
+    assert [packet[9] for packet in com.tx_queue] == [0x81, 0x82]
+
+    # one receive window per retransmit request
+    assert com.rxtx()
+    assert radio.transmissions == 3
+    assert com.get_payload() == b''.join(bytes(fragment.data) for fragment in (first, middle, end))
+
+def test_simulator_answers_latest_request(session):
+    radio = SimulatorRadio(CAPTURE, realtime=False, seed=1)
+    radio.transmit(session.time_request(hoymiles.InfoCommands.RealTimeRunData_Debug))
+    first, middle, end = radio.receive()
+
+    radio.transmit(session.retransmit_request(1))
+    radio.transmit(session.retransmit_request(2))
+    assert [bytes(fragment.frame) for fragment in radio.receive()] == [bytes(middle.frame)]
+
+def test_transaction_uses_session_addresses(session):
+    request = session.time_request(hoymiles.InfoCommands.RealTimeRunData_Debug)
+    com = InverterTransaction(session=session, request=request)
+    assert (com.inverter_addr, com.dtu_addr) == struct.unpack('>LL', request[1:9])
+    assert com.req_type == 0x0b
+
+def test_health_offline_after_failures():
+    health = InverterHealth('test')
+    assert health.record(False, now=0.0) == InverterHealth.DEGRADED
+    assert health.record(False, now=1.0) is None
+    assert health.record(False, now=2.0) == InverterHealth.OFFLINE
+    assert health.offline
+    assert not health.due(now=2.0 + InverterHealth.min_backoff - 1)
+    assert health.due(now=2.0 + InverterHealth.min_backoff)
+
+def test_health_backoff_doubles_up_to_max():
+    health = InverterHealth('test')
+    for _ in range(InverterHealth.offline_after):
+        health.record(False, now=0.0)
+    assert health.backoff == InverterHealth.min_backoff
+
+    health.record(False, now=0.0)
+    assert health.backoff == 2 * InverterHealth.min_backoff
+    for _ in range(10):
+        health.record(False, now=0.0)
+    assert health.backoff == InverterHealth.max_backoff
+
+def test_health_online_on_answer():
+    health = InverterHealth('test')
+    for _ in range(InverterHealth.offline_after):
+        health.record(False, now=0.0)
+
+    assert health.record(True, now=1.0) == InverterHealth.ONLINE
+    assert health.backoff == 0
+    assert health.due(now=1.0)
+
+def test_requests_built_concurrently(session):
+    # radio workers and the mqtt thread build requests of one session at the same time
+    expected = {
+            'time': session.time_request(hoymiles.InfoCommands.RealTimeRunData_Debug, alarm_id=7),
+            'raw': session.request(hoymiles.frame_payload(b'\x0b\x00\x01\x02\x03\x04\x05\x06\x07\x08\x09')),
+            'retransmit': session.retransmit_request(3),
+            }
+    builders = {
+            'time': lambda: session.time_request(hoymiles.InfoCommands.RealTimeRunData_Debug, alarm_id=7),
+            'raw': lambda: session.request(hoymiles.frame_payload(b'\x0b\x00\x01\x02\x03\x04\x05\x06\x07\x08\x09')),
+            'retransmit': lambda: session.retransmit_request(3),
+            }
+    errors = []
+
+    def build(kind):
+        for _ in range(5000):
+            packet = builders[kind]()
+            # time requests differ in the timestamp only
+            if packet[:11] != expected[kind][:11] or hoymiles.f_crc8(packet[:-1]) != packet[-1]:
+                errors.append((kind, packet))
+
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=build, args=(kind,)) for kind in builders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+    assert errors == []
+
+def test_session_requests_match_compose(session):
+    assert session.request(b'\x0b\x00') == hoymiles.compose_esb_fragment(b'\x0b\x00', src=DTU_SER, dst=session.serial)
+    assert session.retransmit_request(2) == hoymiles.compose_esb_fragment(b'', seq=b'\x82', src=DTU_SER, dst=session.serial)